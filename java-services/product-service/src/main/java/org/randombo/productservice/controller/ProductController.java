@@ -53,6 +53,13 @@ public class ProductController {
         return ResponseEntity.ok(products);
     }
 
+    // 4.1 根据ID批量获取商品：GET /api/products/batch?ids=id1,id2（不存在的ID不出现在结果中）
+    @GetMapping("/batch")
+    public ResponseEntity<List<Product>> getProductsByIds(@RequestParam List<String> ids) {
+        List<Product> products = productService.getProductsByIds(ids);
+        return ResponseEntity.ok(products);
+    }
+
     // 5. 根据ID获取商品：GET /api/products/{id}
     @GetMapping("/{id}")
     public ResponseEntity<Product> getProductById(@PathVariable String id) {
@@ -16,6 +16,9 @@ public interface ProductService {
     // 根据ID获取商品
     Optional<Product> getProductById(String id);
 
+    // 根据ID批量获取商品（不存在的ID忽略）
+    List<Product> getProductsByIds(List<String> ids);
+
     // 根据SKU获取商品
     Optional<Product> getProductBySku(String sku);
 
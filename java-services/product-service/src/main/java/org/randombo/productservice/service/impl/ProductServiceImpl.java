@@ -49,6 +49,16 @@ public class ProductServiceImpl implements ProductService {
         return productRepository.findById(id);
     }
 
+    @Override
+    public List<Product> getProductsByIds(List<String> ids) {
+        if (ids == null || ids.isEmpty()) {
+            return new ArrayList<>();
+        }
+        Iterable<Product> products = productRepository.findAllById(ids);
+        return StreamSupport.stream(products.spliterator(), false)
+                .collect(Collectors.toList());
+    }
+
     @Override
     public Optional<Product> getProductBySku(String sku) {
         return Optional.ofNullable(productRepository.findBySku(sku));
@@ -124,6 +124,20 @@ public class ProductControllerTest {
                 .andExpect(MockMvcResultMatchers.jsonPath("$.price").value(99.99));
     }
 
+    @Test
+    public void testGetProductsByIds() throws Exception {
+        Product product = createTestProduct();
+
+        Mockito.when(productService.getProductsByIds(Arrays.asList("prod-123", "unknown-id")))
+                .thenReturn(Collections.singletonList(product));
+
+        mockMvc.perform(MockMvcRequestBuilders.get("/api/products/batch")
+                        .param("ids", "prod-123,unknown-id"))
+                .andExpect(MockMvcResultMatchers.status().isOk())
+                .andExpect(MockMvcResultMatchers.jsonPath("$.length()").value(1))
+                .andExpect(MockMvcResultMatchers.jsonPath("$[0].id").value("prod-123"));
+    }
+
     @Test
     public void testGetProductById_NotFound() throws Exception {
         Mockito.when(productService.getProductById("unknown-id"))
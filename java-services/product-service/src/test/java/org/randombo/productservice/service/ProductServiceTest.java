@@ -112,6 +112,23 @@ public class ProductServiceTest {
         assertTrue(result.isEmpty(), "不存在的ID应返回空Optional");
     }
 
+    @Test
+    public void testGetProductsByIds() {
+        List<String> ids = Arrays.asList("1", "unknown");
+        when(productRepository.findAllById(ids))
+                .thenReturn(Collections.singletonList(createFullProduct("1", "ProductA", "SKU-A")));
+
+        List<Product> results = productService.getProductsByIds(ids);
+        assertEquals(1, results.size(), "不存在的ID应被忽略");
+        assertEquals("1", results.get(0).getId());
+    }
+
+    @Test
+    public void testGetProductsByIds_Empty() {
+        assertTrue(productService.getProductsByIds(Collections.emptyList()).isEmpty());
+        verify(productRepository, never()).findAllById(anyIterable());
+    }
+
     @Test
     public void testGetProductBySku_Found() {
         Product p = createFullProduct("1", "TestProduct", "SKU-789");
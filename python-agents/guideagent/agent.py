@@ -6,9 +6,10 @@ from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain.memory import ConversationBufferWindowMemory
-from langchain_community.chat_message_histories import RedisChatMessageHistory
 
 from config import Config
+from executor_cache import ExecutorCache
+from windowed_history import WindowedRedisChatMessageHistory
 from tools import search_products, format_final_response  # 导入工具
 
 # --- 配置LLM ---
@@ -38,7 +39,10 @@ agent_tools = [search_products, format_final_response]
 
 # 【修改类名】
 class GuideAgent:
-    _agent_executors_cache: Dict[str, AgentExecutor] = {}  # 类级别的缓存
+    # 类级别的缓存：有界 LRU + 空闲过期，避免内存随历史会话数线性增长
+    _agent_executors_cache: ExecutorCache[str, AgentExecutor] = ExecutorCache(
+        Config.EXECUTOR_CACHE_MAX_SESSIONS, Config.EXECUTOR_CACHE_IDLE_SECONDS
+    )
 
     def __init__(self):
         # 构建基础 Agent (不带记忆，记忆在 AgentExecutor 层面管理)
@@ -53,17 +57,21 @@ class GuideAgent:
         """
         根据 session_id 获取或创建 AgentExecutor 实例。
         """
-        if session_id not in self._agent_executors_cache:
+        executor = self._agent_executors_cache.get(session_id)
+        if executor is None:
             print(f"--- 为新会话创建 AgentExecutor: {session_id} ---")
-            message_history = RedisChatMessageHistory(
+            # 只读取窗口内的消息，每轮 Redis 开销与对话长度无关
+            message_history = WindowedRedisChatMessageHistory(
                 session_id=session_id,
-                url=Config.REDIS_URL
+                window=2 * Config.HISTORY_WINDOW_TURNS,
+                retention=Config.HISTORY_RETENTION_MESSAGES,
+                ttl=Config.HISTORY_TTL_SECONDS
             )
             memory = ConversationBufferWindowMemory(
                 chat_memory=message_history,
                 memory_key="chat_history",
                 return_messages=True,
-                k=5
+                k=Config.HISTORY_WINDOW_TURNS
             )
             executor = AgentExecutor(
                 agent=self.base_agent,  # 使用类的基础 Agent
@@ -71,10 +79,10 @@ class GuideAgent:
                 verbose=True,  # 生产环境通常设置为False
                 memory=memory
             )
-            self._agent_executors_cache[session_id] = executor
+            self._agent_executors_cache.put(session_id, executor)
         else:
             print(f"--- 使用现有 AgentExecutor: {session_id} ---")
-        return self._agent_executors_cache[session_id]
+        return executor
 
     async def process_message(self, user_input: str, session_id: str) -> str:
         """
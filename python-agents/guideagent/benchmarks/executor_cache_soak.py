@@ -0,0 +1,72 @@
+# executor_cache_soak.py
+"""
+导购 Agent 会话缓存的内存浸泡测试：依次为 N 个不同会话获取 AgentExecutor（不调用 LLM，
+会话历史只在读写消息时才连接 Redis），每隔一段采样一次进程 RSS。
+
+用法（在 guideagent 目录下）:
+    SILICONFLOW_API_KEY=x python benchmarks/executor_cache_soak.py --sessions 1000000
+    SILICONFLOW_API_KEY=x python benchmarks/executor_cache_soak.py --sessions 20000 --unbounded
+
+--unbounded 把缓存上限设为会话数（等价于改动前的普通 dict），用于对比 RSS 随会话数的增长斜率。
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def soak(args):
+    from config import Config
+    from agent import GuideAgent
+    from executor_cache import ExecutorCache
+
+    max_sessions = args.sessions if args.unbounded else Config.EXECUTOR_CACHE_MAX_SESSIONS
+    GuideAgent._agent_executors_cache = ExecutorCache(max_sessions, Config.EXECUTOR_CACHE_IDLE_SECONDS)
+    agent = GuideAgent()
+    gc.collect()
+    baseline = rss_mb()
+    step = max(1, args.sessions // args.samples)
+
+    print(f"会话数: {args.sessions}  缓存上限: {max_sessions}  空闲过期: {Config.EXECUTOR_CACHE_IDLE_SECONDS}s")
+    print(f"基线 RSS: {baseline:.1f} MB")
+    print(f"{'会话数':>10} {'缓存条目':>10} {'RSS(MB)':>10} {'增量(MB)':>10} {'耗时(s)':>8}")
+    start = time.perf_counter()
+    sink = io.StringIO()
+    for i in range(1, args.sessions + 1):
+        with contextlib.redirect_stdout(sink):
+            await agent._get_agent_executor(f"soak-{i}")
+        sink.seek(0)
+        sink.truncate()
+        if i % step == 0 or i == args.sessions:
+            gc.collect()
+            rss = rss_mb()
+            print(f"{i:>10} {len(GuideAgent._agent_executors_cache):>10} {rss:>10.1f} "
+                  f"{rss - baseline:>10.1f} {time.perf_counter() - start:>8.1f}", flush=True)
+    stats = GuideAgent._agent_executors_cache.stats()
+    print(f"缓存统计: 命中 {stats['hits']}  未命中 {stats['misses']}  淘汰 {stats['evictions']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导购 Agent 会话缓存 RSS 浸泡测试")
+    parser.add_argument("--sessions", type=int, default=1_000_000, help="依次访问的会话数")
+    parser.add_argument("--samples", type=int, default=10, help="RSS 采样次数")
+    parser.add_argument("--unbounded", action="store_true", help="不限制缓存大小（改动前的行为）")
+    asyncio.run(soak(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
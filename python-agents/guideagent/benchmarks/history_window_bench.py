@@ -0,0 +1,82 @@
+# history_window_bench.py
+"""
+会话历史读写开销随对话长度的变化：对比 RedisChatMessageHistory（每轮 LRANGE 0 -1 读取并反序列化整段历史）
+与 WindowedRedisChatMessageHistory（只读取最近窗口，写入时按保留策略裁剪）。
+
+每个长度档位先写入对应条数的历史，再模拟若干轮“读取窗口 + 追加一问一答”，统计每轮耗时与读取的消息数。
+默认使用 fakeredis 在进程内运行；--redis-url 指定真实 Redis 时结果包含网络往返。
+
+用法（在 guideagent 目录下）:
+    SILICONFLOW_API_KEY=x python benchmarks/history_window_bench.py --lengths 10,100,1000,5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_community.chat_message_histories import RedisChatMessageHistory
+
+from config import Config
+from windowed_history import WindowedRedisChatMessageHistory
+
+
+def make_client(url):
+    if url:
+        import redis
+        return redis.Redis.from_url(url)
+    import fakeredis
+    return fakeredis.FakeRedis()
+
+
+def seed(client, key: str, length: int):
+    client.delete(key)
+    message = '{"type": "human", "data": {"content": "' + "推荐一款降噪耳机" * 8 + '", "type": "human"}}'
+    with client.pipeline(transaction=False) as pipe:
+        for _ in range(length):
+            pipe.lpush(key, message)
+        pipe.execute()
+
+
+def run_turns(history, window: int, turns: int):
+    timings, loaded = [], 0
+    for i in range(turns):
+        start = time.perf_counter()
+        messages = history.messages[-window:]
+        history.add_messages([HumanMessage(content=f"问题 {i}"), AIMessage(content=f"回答 {i}")])
+        timings.append(time.perf_counter() - start)
+        loaded = len(messages)
+    return statistics.median(timings) * 1000, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="会话历史窗口读取基准")
+    parser.add_argument("--lengths", default="10,100,1000,5000", help="已有历史消息数，逗号分隔")
+    parser.add_argument("--turns", type=int, default=50, help="每个档位模拟的轮数")
+    parser.add_argument("--redis-url", default=None, help="使用真实 Redis（默认 fakeredis）")
+    args = parser.parse_args()
+
+    client = make_client(args.redis_url)
+    window = 2 * Config.HISTORY_WINDOW_TURNS
+    retention = Config.HISTORY_RETENTION_MESSAGES
+    print(f"窗口: {window} 条  保留: {retention} 条  每档 {args.turns} 轮")
+    print(f"{'历史条数':>8} {'全量读取(ms)':>14} {'窗口读取(ms)':>14} {'列表长度':>14}")
+    for length in (int(x) for x in args.lengths.split(",")):
+        full = RedisChatMessageHistory(session_id="bench-full")
+        full.redis_client = client
+        seed(client, full.key, length)
+        full_ms, _ = run_turns(full, window, args.turns)
+
+        windowed = WindowedRedisChatMessageHistory("bench-window", window=window, retention=retention,
+                                                   ttl=Config.HISTORY_TTL_SECONDS, redis_client=client)
+        seed(client, windowed.key, length)
+        windowed_ms, _ = run_turns(windowed, window, args.turns)
+        print(f"{length:>8} {full_ms:>14.3f} {windowed_ms:>14.3f} {client.llen(windowed.key):>14}")
+    client.delete("message_store:bench-full", "message_store:bench-window")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,16 @@ class Config:
     # Redis 配置
     REDIS_URL: str = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
 
+    # 会话历史：提示中保留的轮数（每轮一问一答两条消息）、Redis 中每个会话最多保留的消息数、
+    # 过期时间（秒，每次写入时刷新，0 表示不过期）
+    HISTORY_WINDOW_TURNS: int = int(os.environ.get("HISTORY_WINDOW_TURNS", 5))
+    HISTORY_RETENTION_MESSAGES: int = int(os.environ.get("HISTORY_RETENTION_MESSAGES", 100))
+    HISTORY_TTL_SECONDS: int = int(os.environ.get("HISTORY_TTL_SECONDS", 7 * 24 * 3600))
+
+    # 按会话缓存 AgentExecutor 的上限与空闲过期时间（秒），会话记忆保存在 Redis 中，淘汰后按需重建
+    EXECUTOR_CACHE_MAX_SESSIONS: int = int(os.environ.get("EXECUTOR_CACHE_MAX_SESSIONS", 1024))
+    EXECUTOR_CACHE_IDLE_SECONDS: float = float(os.environ.get("EXECUTOR_CACHE_IDLE_SECONDS", 1800))
+
     # 外部商品 API 配置 (可选)
     PRODUCT_API_BASE_URL: Optional[str] = os.environ.get("PRODUCT_API_BASE_URL")
     # 根据 PRODUCT_API_BASE_URL 是否设置来决定是否使用外部API
@@ -30,6 +40,12 @@ class Config:
         # 如果使用外部API，则 PRODUCT_API_BASE_URL 必须设置
         if cls.USE_EXTERNAL_PRODUCT_API and not cls.PRODUCT_API_BASE_URL:
             raise ValueError("PRODUCT_API_BASE_URL 环境变量未设置，但 USE_EXTERNAL_PRODUCT_API 为 True。")
+        if cls.HISTORY_WINDOW_TURNS < 0 or cls.HISTORY_RETENTION_MESSAGES < 2 * cls.HISTORY_WINDOW_TURNS:
+            raise ValueError("HISTORY_RETENTION_MESSAGES 不能小于 2 * HISTORY_WINDOW_TURNS。")
+        if cls.HISTORY_TTL_SECONDS < 0:
+            raise ValueError("HISTORY_TTL_SECONDS 不能为负数。")
+        if cls.EXECUTOR_CACHE_MAX_SESSIONS < 1 or cls.EXECUTOR_CACHE_IDLE_SECONDS <= 0:
+            raise ValueError("EXECUTOR_CACHE_MAX_SESSIONS 至少为 1，EXECUTOR_CACHE_IDLE_SECONDS 必须大于 0。")
 
 # 在应用启动时调用验证
 Config.validate()
@@ -0,0 +1,65 @@
+# executor_cache.py
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class ExecutorCache(Generic[K, V]):
+    """
+    按会话缓存 AgentExecutor 的有界 LRU，兼顾空闲过期。
+    - 条目数超过 max_entries 时淘汰最久未使用的会话；
+    - 超过 idle_seconds 未被访问的会话在下次读写时被清理。
+    条目按最近访问时间排序，过期条目总是位于队首，因此每次清理只检查队首，均摊 O(1)。
+    会话记忆保存在 Redis 中，被淘汰的会话再次访问时重新创建 Executor，不会丢失上下文。
+    """
+
+    def __init__(self, max_entries: int, idle_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.idle_seconds = idle_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[K, tuple]" = OrderedDict()  # key -> (value, last_access)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def _expire(self, now: float) -> None:
+        while self._entries:
+            key, (_, last_access) = next(iter(self._entries.items()))
+            if now - last_access < self.idle_seconds:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def get(self, key: K) -> Optional[V]:
+        now = self._clock()
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries[key] = (entry[0], now)
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        now = self._clock()
+        self._expire(now)
+        self._entries[key] = (value, now)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_entries": self.max_entries, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
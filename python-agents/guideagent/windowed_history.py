@@ -0,0 +1,70 @@
+# windowed_history.py
+import json
+from typing import List, Optional, Sequence
+
+import redis
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from config import Config
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def get_redis_client() -> redis.Redis:
+    """所有会话共享的 Redis 客户端（及其连接池），避免每个会话各建一个连接池。"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(Config.REDIS_URL)
+    return _redis_client
+
+
+class WindowedRedisChatMessageHistory(BaseChatMessageHistory):
+    """
+    只读取最近窗口的 Redis 会话历史，与 RedisChatMessageHistory 使用相同的键与数据布局
+    （message_store:{session_id}，LPUSH，表头为最新消息），已有会话无需迁移。
+    - 读取：LRANGE 0 window-1，只取回并反序列化最近 window 条消息；
+    - 写入：LPUSH、LTRIM 到 retention 条、刷新 TTL，在同一个流水线中一次往返完成。
+    因此每轮的 Redis 开销与对话总长度无关。
+    """
+
+    def __init__(self, session_id: str, window: int, retention: int, ttl: Optional[int] = None,
+                 key_prefix: str = "message_store:", redis_client: Optional[redis.Redis] = None):
+        if retention < window:
+            raise ValueError("retention 不能小于 window，否则窗口内的消息会被裁剪掉。")
+        self.session_id = session_id
+        self.window = window
+        self.retention = retention
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.redis_client = redis_client or get_redis_client()
+
+    @property
+    def key(self) -> str:
+        return self.key_prefix + self.session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore[override]
+        """最近 window 条消息，按时间先后排列。"""
+        if self.window <= 0:
+            return []
+        items = self.redis_client.lrange(self.key, 0, self.window - 1)
+        return messages_from_dict([json.loads(item) for item in reversed(items)])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        """追加消息并按保留策略裁剪、刷新过期时间（单次往返）。"""
+        if not messages:
+            return
+        with self.redis_client.pipeline(transaction=False) as pipe:
+            # LPUSH 依次推入表头，最后一条消息成为最新
+            pipe.lpush(self.key, *(json.dumps(message_to_dict(m)) for m in messages))
+            pipe.ltrim(self.key, 0, self.retention - 1)
+            if self.ttl:
+                pipe.expire(self.key, self.ttl)
+            pipe.execute()
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.add_messages([message])
+
+    def clear(self) -> None:
+        self.redis_client.delete(self.key)
@@ -24,4 +24,15 @@ class Settings(BaseSettings):
     REDIS_PORT: int = int(os.getenv("REDIS_PORT", 6379))
     REDIS_DB: int = int(os.getenv("REDIS_DB", 0))
 
+    # 会话历史配置：每个会话一个 Redis 列表（前缀 + 会话ID），只追加
+    CHAT_HISTORY_KEY_PREFIX: str = os.getenv("CHAT_HISTORY_KEY_PREFIX", "chat_history:")
+    # 放入 Prompt 的最近消息数
+    CHAT_HISTORY_WINDOW: int = int(os.getenv("CHAT_HISTORY_WINDOW", 5))
+    # 每个会话在 Redis 中最多保留的消息数
+    CHAT_HISTORY_RETENTION: int = int(os.getenv("CHAT_HISTORY_RETENTION", 200))
+    # 会话历史过期时间（秒），每次写入时刷新，0 表示不过期
+    CHAT_HISTORY_TTL_SECONDS: int = int(os.getenv("CHAT_HISTORY_TTL_SECONDS", 7 * 24 * 3600))
+    # 旧版所有会话共用的历史键，由 chat_history.py migrate 拆分
+    LEGACY_CHAT_HISTORY_KEY: str = "chat_history"
+
 settings = Settings()
\ No newline at end of file
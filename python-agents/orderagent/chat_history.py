@@ -1,101 +1,112 @@
-import redis
+# chat_history.py
+"""
+会话历史工具。对话历史按会话保存在 Redis 列表 chat_history:{session_id} 中（见 history_store.py）。
+
+    python chat_history.py show [会话ID] [--limit N]      按行输出会话最近 N 条记录
+    python chat_history.py migrate [--session 会话ID] [--dry-run] [--delete]
+                                                          把旧版全局键 'chat_history' 拆分到各会话
+
+旧版把所有对话以一个 JSON 数组存在 'chat_history' 下，条目本身不带会话ID。迁移时条目中有
+session_id 字段的写入对应会话，其余写入 --session 指定的会话（默认 default，即 cli.py 使用的会话）。
+迁移的消息排在目标会话已有消息之前，并按 CHAT_HISTORY_RETENTION 裁剪。
+完成后旧键被重命名为 chat_history_migrated_backup 以便核对，加 --delete 则直接删除；重复运行时旧键已不存在，不会重复写入。
+"""
+import argparse
+import asyncio
 import json
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from langchain_core.messages import message_to_dict, messages_from_dict
+
 from app_config import settings
+from history_store import SessionHistoryStore
 
-# 连接到 RedisStack
-redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB)
+BACKUP_SUFFIX = "_migrated_backup"
+# 每个流水线写入的消息数
+MIGRATION_BATCH = 500
 
-class OrderAgent:
-    def __init__(self):
-        # ...
-        from langchain_community.chat_message_histories import ChatMessageHistory
-        self.message_history = ChatMessageHistory()
-        self._load_chat_history()
 
-    def run(self, user_input: str) -> str:
+def split_legacy_history(history: List[dict], default_session: str) -> "OrderedDict[str, List[str]]":
+    """按会话拆分旧版历史，返回 会话ID -> 序列化后的消息（时间顺序）；无法解析的条目被跳过。"""
+    sessions: "OrderedDict[str, List[str]]" = OrderedDict()
+    for item in history:
         try:
-            # ...
-            if "订单ID" in user_input:
-                order_id = user_input.split("订单ID")[1].strip()
-                order_info = self._get_order_info(order_id)
-                if order_info:
-                    return f"订单 {order_id} 的信息如下：{order_info}"
-                else:
-                    return f"未找到订单 {order_id} 的信息。"
-
-            # 保存聊天记录到 Redis
-            self._save_chat_history()
-            # 这里需要模拟 response 存在 "output" 键的情况，假设这里有一个响应
-            response = {"output": "模拟的响应内容"}
-            return response["output"]
-        except Exception as e:
-            # ...
-            error_msg = f"处理请求时出错: {str(e)}"
-            self.message_history.add_ai_message(error_msg)
-            # 保存聊天记录到 Redis
-            self._save_chat_history()
-            return error_msg
-
-    def _save_chat_history(self):
-        """将对话历史保存到 Redis"""
-        try:
-            history = []
-            for message in self.message_history.messages:
-                if hasattr(message, 'type') and message.type == "human":
-                    history.append({"type": "human", "data": {"content": message.content}})
-                elif hasattr(message, 'type') and message.type == "ai":
-                    history.append({"type": "ai", "data": {"content": message.content}})
+            session_id = item.get("session_id") or item.get("data", {}).get("session_id") or default_session
+            message = messages_from_dict([item])[0]
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            print(f"跳过无法解析的记录: {e}")
+            continue
+        sessions.setdefault(str(session_id), []).append(json.dumps(message_to_dict(message), ensure_ascii=False))
+    return sessions
 
-            # 将聊天记录序列化为 JSON 字符串并保存到 Redis
-            redis_client.set('chat_history', json.dumps(history))
 
-        except Exception as e:
-            print(f"保存对话历史失败: {str(e)}")
+async def migrate(default_session: str, dry_run: bool = False, delete: bool = False,
+                  store: Optional[SessionHistoryStore] = None) -> Dict[str, int]:
+    store = store or SessionHistoryStore()
+    redis = store.redis
+    legacy_key = settings.LEGACY_CHAT_HISTORY_KEY
+    raw = await redis.get(legacy_key)
+    if not raw:
+        print(f"未找到旧版聊天记录（键 '{legacy_key}'），无需迁移。")
+        return {}
+    sessions = split_legacy_history(json.loads(raw), default_session)
+    counts = {session_id: len(items) for session_id, items in sessions.items()}
+    for session_id, count in counts.items():
+        print(f"{store.key(session_id)}: {count} 条")
+    if dry_run:
+        print("dry-run：未写入任何数据。")
+        return counts
 
-    def _load_chat_history(self):
-        """从 Redis 加载对话历史"""
-        try:
-            history_data = redis_client.get('chat_history')
-            if history_data:
-                history = json.loads(history_data)
-                for item in history:
-                    if item["type"] == "human":
-                        self.message_history.add_user_message(item["data"]["content"])
-                    elif item["type"] == "ai":
-                        self.message_history.add_ai_message(item["data"]["content"])
-        except Exception as e:
-            print(f"加载对话历史失败: {str(e)}")
-
-    def _save_order_info(self, order_id, order_info):
-        """保存订单信息到 Redis"""
-        try:
-            redis_client.set(f"order_info:{order_id}", json.dumps(order_info))
-        except Exception as e:
-            print(f"保存订单信息失败: {str(e)}")
+    for session_id, items in sessions.items():
+        key = store.key(session_id)
+        # 旧消息早于会话中已有的消息：倒序 LPUSH 到表头，保持时间顺序
+        for end in range(len(items), 0, -MIGRATION_BATCH):
+            batch = items[max(0, end - MIGRATION_BATCH):end]
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.lpush(key, *reversed(batch))
+                pipe.ltrim(key, -settings.CHAT_HISTORY_RETENTION, -1)
+                if settings.CHAT_HISTORY_TTL_SECONDS:
+                    pipe.expire(key, settings.CHAT_HISTORY_TTL_SECONDS)
+                await pipe.execute()
+
+    if delete:
+        await redis.delete(legacy_key)
+        print(f"已删除旧键 '{legacy_key}'。")
+    else:
+        await redis.rename(legacy_key, legacy_key + BACKUP_SUFFIX)
+        print(f"旧键已重命名为 '{legacy_key + BACKUP_SUFFIX}'。")
+    print(f"迁移完成：{len(counts)} 个会话，共 {sum(counts.values())} 条消息。")
+    return counts
+
+
+async def print_chat_history(session_id: str, limit: int):
+    """按行输出聊天记录"""
+    messages = await SessionHistoryStore().window(session_id, limit)
+    if not messages:
+        print("未找到聊天记录。")
+    for message in messages:
+        print(f"{message.type}: {message.content}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="订单助手会话历史工具")
+    sub = parser.add_subparsers(dest="command")
+    show = sub.add_parser("show", help="输出会话最近的聊天记录")
+    show.add_argument("session_id", nargs="?", default="default")
+    show.add_argument("--limit", type=int, default=settings.CHAT_HISTORY_RETENTION)
+    mig = sub.add_parser("migrate", help="把旧版全局键拆分为按会话存储")
+    mig.add_argument("--session", default="default", help="不带会话ID的记录写入的会话")
+    mig.add_argument("--dry-run", action="store_true", help="只统计，不写入")
+    mig.add_argument("--delete", action="store_true", help="迁移后删除旧键（默认重命名保留）")
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        asyncio.run(migrate(args.session, dry_run=args.dry_run, delete=args.delete))
+    else:
+        asyncio.run(print_chat_history(getattr(args, "session_id", "default"),
+                                       getattr(args, "limit", settings.CHAT_HISTORY_RETENTION)))
 
-    def _get_order_info(self, order_id):
-        """从 Redis 中获取订单信息"""
-        try:
-            order_info_data = redis_client.get(f"order_info:{order_id}")
-            if order_info_data:
-                return json.loads(order_info_data)
-            return None
-        except Exception as e:
-            print(f"获取订单信息失败: {str(e)}")
-            return None
-
-    def print_chat_history(self):
-        """按行输出聊天记录"""
-        history_data = redis_client.get('chat_history')
-        if history_data:
-            history = json.loads(history_data)
-            for item in history:
-                message_type = item["type"]
-                content = item["data"]["content"]
-                print(f"{message_type}: {content}")
-        else:
-            print("未找到聊天记录。")
 
 if __name__ == "__main__":
-    agent = OrderAgent()
-    agent.print_chat_history()
\ No newline at end of file
+    main()
@@ -1,4 +1,5 @@
 # cli.py（保留 Rich 但简化标签）
+import asyncio
 import os
 import sys
 from rich.console import Console
@@ -13,7 +14,7 @@ from core.agent import OrderAgent
 console = Console()
 
 
-def main():
+async def main():
     # 初始化代理
     agent = OrderAgent()
 
@@ -29,16 +30,15 @@ def main():
             if user_input.lower() in ["exit", "quit", "bye"]:
                 break
             elif user_input.lower() == "clear":
-                agent.clear_chat_history()
+                await agent.aclear_chat_history()
             else:
-                response = agent.run(user_input)
+                response = await agent.arun(user_input)
                 console.print(f"\n[green]助手[/green]: {response}\n")
 
     finally:
-        # 保存聊天记录到 Redis
-        agent._save_chat_history()
-        console.print("[yellow]聊天记录已保存到 Redis[/yellow]")
+        # 聊天记录每轮都已追加到 Redis
+        console.print(f"[yellow]聊天记录已保存到 Redis（会话 {agent.session_id}）[/yellow]")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
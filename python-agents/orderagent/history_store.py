@@ -0,0 +1,74 @@
+# history_store.py
+import asyncio
+import json
+import weakref
+from typing import List, Optional, Sequence
+
+import redis.asyncio as aioredis
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+from app_config import settings
+
+
+class SessionHistoryStore:
+    """
+    按会话分键、只追加的对话历史（异步 Redis）。
+    每个会话一个列表 chat_history:{session_id}，按时间顺序 RPUSH：
+    - 读取只取最近 n 条（LRANGE -n -1），开销与会话长度、其他会话的流量都无关；
+    - 追加、按保留条数裁剪（LTRIM）与刷新过期时间在一个流水线中一次往返完成。
+    """
+
+    def __init__(self, redis_client: Optional[aioredis.Redis] = None):
+        self._redis_client = redis_client
+        # 异步连接绑定在创建它的事件循环上，每个事件循环使用各自的客户端
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aioredis.Redis]" = \
+            weakref.WeakKeyDictionary()
+
+    @property
+    def redis(self) -> aioredis.Redis:
+        if self._redis_client is not None:
+            return self._redis_client
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = aioredis.Redis(
+                host=settings.REDIS_HOST, port=settings.REDIS_PORT, db=settings.REDIS_DB
+            )
+        return client
+
+    @staticmethod
+    def key(session_id: str) -> str:
+        return f"{settings.CHAT_HISTORY_KEY_PREFIX}{session_id}"
+
+    async def append(self, session_id: str, messages: Sequence[BaseMessage]) -> None:
+        """追加消息，并按保留条数裁剪、刷新过期时间。"""
+        if not messages:
+            return
+        key = self.key(session_id)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.rpush(key, *(json.dumps(message_to_dict(m), ensure_ascii=False) for m in messages))
+            pipe.ltrim(key, -settings.CHAT_HISTORY_RETENTION, -1)
+            if settings.CHAT_HISTORY_TTL_SECONDS:
+                pipe.expire(key, settings.CHAT_HISTORY_TTL_SECONDS)
+            await pipe.execute()
+
+    async def window(self, session_id: str, n: Optional[int] = None) -> List[BaseMessage]:
+        """最近 n 条消息（默认 CHAT_HISTORY_WINDOW），按时间先后排列。"""
+        n = settings.CHAT_HISTORY_WINDOW if n is None else n
+        if n <= 0:
+            return []
+        items = await self.redis.lrange(self.key(session_id), -n, -1)
+        return messages_from_dict([json.loads(item) for item in items])
+
+    async def clear(self, session_id: str) -> None:
+        await self.redis.delete(self.key(session_id))
+
+
+_store: Optional[SessionHistoryStore] = None
+
+
+def get_history_store() -> SessionHistoryStore:
+    global _store
+    if _store is None:
+        _store = SessionHistoryStore()
+    return _store
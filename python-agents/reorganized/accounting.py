@@ -0,0 +1,155 @@
+# accounting.py
+"""
+按轮次 / 会话 / 用户统计开销，并按 token 预算把重度会话切换到降级配置。
+
+每轮 /chat 由 MultiAgentWorkflow.invoke_workflow 包裹：
+- track_turn_usage() 收集路由与子代理各次迭代的 prompt / completion / 缓存命中 token、LLM 调用与工具调用次数
+  （MetricsCallbackHandler 回调累加），另计本轮墙钟耗时；
+- 轮次结束后以一次流水线写入 Redis 的紧凑计数器（字段名见 FIELDS），全部键保留 ACCOUNTING_RETENTION_DAYS：
+    acct:s:{会话ID}            HASH  会话累计
+    acct:u:{用户ID}:{UTC 日期}  HASH  用户当天累计
+    acct:top:s:{UTC 日期}       ZSET  当天各会话的 token 数
+    acct:top:u:{UTC 日期}       ZSET  当天各用户的 token 数
+- 轮次开始前读取会话累计与用户当天累计的 token 数，超过 SESSION_TOKEN_BUDGET / USER_DAILY_TOKEN_BUDGET
+  （0 表示不限）时，本轮 BUDGET_DEGRADE_STAGES 中的阶段使用降级配置（快速模型、更短的历史窗口）。
+
+Redis 不可用时只记录告警，不影响本轮处理，也不触发降级。
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional
+
+import redis
+
+from config import Config
+from deadline import with_deadline
+from metrics import TurnUsage, BUDGET_DOWNGRADES, track_redis_pool
+
+logger = logging.getLogger(__name__)
+
+# Redis 中的字段名 -> 对外的计数名
+FIELDS = {
+    "p": "prompt_tokens", "c": "completion_tokens", "k": "cached_tokens",
+    "l": "llm_calls", "t": "tool_calls", "ms": "wall_ms", "n": "turns",
+}
+
+
+def utc_day(ts: Optional[float] = None) -> str:
+    """UTC 日期（YYYYMMDD），用户每日计数与排行按此分键。"""
+    return time.strftime("%Y%m%d", time.gmtime(ts))
+
+
+def _decode_counters(raw: Dict[bytes, bytes]) -> Dict[str, int]:
+    counters = {name: 0 for name in FIELDS.values()}
+    for field, value in raw.items():
+        name = FIELDS.get(field.decode())
+        if name:
+            counters[name] = int(value)
+    counters["tokens"] = counters["prompt_tokens"] + counters["completion_tokens"]
+    return counters
+
+
+class AccountingStore:
+    SESSION_PREFIX = "acct:s:"
+    USER_PREFIX = "acct:u:"
+    TOP_PREFIX = {"session": "acct:top:s:", "user": "acct:top:u:"}
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        self.redis = redis_client or redis.Redis.from_url(
+            Config.REDIS_URL, socket_timeout=Config.REDIS_TIMEOUT_SECONDS,
+            socket_connect_timeout=Config.REDIS_TIMEOUT_SECONDS
+        )
+        track_redis_pool("redis_accounting", self.redis)
+
+    def _session_key(self, session_id: str) -> str:
+        return f"{self.SESSION_PREFIX}{session_id}"
+
+    def _user_key(self, user_id: str, day: str) -> str:
+        return f"{self.USER_PREFIX}{user_id}:{day}"
+
+    def record(self, session_id: str, user_id: Optional[str], usage: TurnUsage, wall_seconds: float) -> None:
+        """把一轮的用量累加到会话、用户当天与当天排行中（单次往返）。"""
+        day = utc_day()
+        ttl = int(Config.ACCOUNTING_RETENTION_DAYS * 86400)
+        increments = {"p": usage.prompt_tokens, "c": usage.completion_tokens, "k": usage.cached_tokens,
+                      "l": usage.llm_calls, "t": usage.tool_calls, "ms": int(wall_seconds * 1000), "n": 1}
+        keys = [self._session_key(session_id)]
+        if user_id:
+            keys.append(self._user_key(user_id, day))
+        with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                for field, value in increments.items():
+                    if value:
+                        pipe.hincrby(key, field, value)
+                pipe.expire(key, ttl)
+            if usage.tokens:
+                top = [("session", session_id)] + ([("user", user_id)] if user_id else [])
+                for kind, member in top:
+                    top_key = f"{self.TOP_PREFIX[kind]}{day}"
+                    pipe.zincrby(top_key, usage.tokens, member)
+                    pipe.expire(top_key, ttl)
+            pipe.execute()
+
+    def used_tokens(self, session_id: str, user_id: Optional[str]) -> Dict[str, int]:
+        """会话累计与用户当天累计的 token 数。"""
+        keys = [self._session_key(session_id)] + ([self._user_key(user_id, utc_day())] if user_id else [])
+        with self.redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.hmget(key, "p", "c")
+            results = pipe.execute()
+        totals = [sum(int(v or 0) for v in values) for values in results]
+        return {"session": totals[0], "user": totals[1] if user_id else 0}
+
+    def top(self, kind: str, limit: int, day: Optional[str] = None) -> List[Dict[str, Any]]:
+        """当天 token 数最多的会话或用户，附带其完整计数（会话为累计值，用户为当天值）。"""
+        day = day or utc_day()
+        ranked = self.redis.zrevrange(f"{self.TOP_PREFIX[kind]}{day}", 0, limit - 1, withscores=True)
+        if not ranked:
+            return []
+        with self.redis.pipeline(transaction=False) as pipe:
+            for member, _ in ranked:
+                member_id = member.decode()
+                pipe.hgetall(self._session_key(member_id) if kind == "session" else self._user_key(member_id, day))
+            details = pipe.execute()
+        return [{"id": member.decode(), "tokens_today": int(score), **_decode_counters(raw)}
+                for (member, score), raw in zip(ranked, details)]
+
+
+_store: Optional[AccountingStore] = None
+
+
+def get_accounting_store() -> AccountingStore:
+    global _store
+    if _store is None:
+        _store = AccountingStore()
+    return _store
+
+
+async def budget_degraded_stages(session_id: str, user_id: Optional[str]) -> List[str]:
+    """本轮因预算超限需要降级的阶段；未超限、未配置预算或读取失败时返回空列表。"""
+    if not Config.ACCOUNTING_ENABLED or not (Config.SESSION_TOKEN_BUDGET or Config.USER_DAILY_TOKEN_BUDGET):
+        return []
+    try:
+        used = await with_deadline(
+            asyncio.to_thread(get_accounting_store().used_tokens, session_id, user_id), "accounting_budget")
+    except redis.RedisError as e:
+        logger.warning(f"读取用量预算失败: {e}")
+        return []
+    for scope, budget in (("session", Config.SESSION_TOKEN_BUDGET), ("user", Config.USER_DAILY_TOKEN_BUDGET)):
+        if budget and used[scope] >= budget:
+            BUDGET_DOWNGRADES.labels(scope).inc()
+            logger.info("token 预算超限，本轮使用降级配置",
+                        extra={"session_id": session_id, "scope": scope, "used": used[scope], "budget": budget})
+            return list(Config.BUDGET_DEGRADE_STAGES)
+    return []
+
+
+async def record_turn(session_id: str, user_id: Optional[str], usage: TurnUsage, wall_seconds: float) -> None:
+    """写入本轮用量；失败只记录告警。"""
+    if not Config.ACCOUNTING_ENABLED:
+        return
+    try:
+        await asyncio.to_thread(get_accounting_store().record, session_id, user_id, usage, wall_seconds)
+    except redis.RedisError as e:
+        logger.warning(f"写入会话用量失败: {e}", extra={"session_id": session_id})
@@ -0,0 +1,275 @@
+# address_parser.py
+"""
+确定性的收货信息解析：从自由文本中提取收货人、手机号与省 / 市 / 区 / 街道，
+输出与订单服务一致的 {name, phone, detail}，无需调用 LLM。
+
+- 行政区划由 data/regions.py 构建前缀树（含去掉“省/市/区/县/自治区”等后缀的简称），
+  在地址片段开头做最长匹配；简称同名（如“朝阳”“吉林”）按已识别的上级区划消歧；
+- 未收录的区县按“区/县/旗/市”后缀识别，剩余部分作为街道门牌；
+- confidence 按识别出的字段加权（手机 0.3、姓名 0.25、省市 0.25、街道 0.2），
+  调用方在低于 Config.ADDRESS_PARSER_MIN_CONFIDENCE 时回退到 LLM。
+
+用法:
+    parsed = parse_address("张三，13800138000，广东省深圳市南山区科技园8栋")
+    if parsed.confidence >= Config.ADDRESS_PARSER_MIN_CONFIDENCE:
+        address = parsed.as_dict()
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from data.regions import MUNICIPALITIES, PROVINCE_CITIES, CITY_DISTRICTS
+
+# ----------------------------------------------------------------------
+# 行政区划前缀树
+# ----------------------------------------------------------------------
+PROVINCE, CITY, DISTRICT = 0, 1, 2
+
+# 自治州简称不能简单截取前两个字的例外
+_ALIAS_OVERRIDES = {
+    "内蒙古自治区": "内蒙古",
+    "西双版纳傣族自治州": "西双版纳",
+    "博尔塔拉蒙古自治州": "博尔塔拉",
+    "巴音郭楞蒙古自治州": "巴音郭楞",
+    "克孜勒苏柯尔克孜自治州": "克孜勒苏",
+}
+_STRIP_SUFFIXES = ("特别行政区", "新区", "林区", "地区", "省", "市", "区", "县", "盟")
+
+
+def _alias(full_name: str) -> Optional[str]:
+    """生成去掉行政后缀的简称；简称少于两个字时不收录。"""
+    if full_name in _ALIAS_OVERRIDES:
+        return _ALIAS_OVERRIDES[full_name]
+    if full_name.endswith(("自治区", "自治州")):
+        return full_name[:2]
+    for suffix in _STRIP_SUFFIXES:
+        if full_name.endswith(suffix) and len(full_name) - len(suffix) >= 2:
+            return full_name[:-len(suffix)]
+    return None
+
+
+class _TrieNode:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        # (层级, 全称, 上级全称)；同一名称可能对应多个区划
+        self.entries: List[Tuple[int, str, Optional[str]]] = []
+
+
+class RegionTrie:
+    """行政区划前缀树，支持在给定位置做最长匹配。"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        # 区划全称 -> 上级全称，用于由下级推断上级
+        self.parents: Dict[str, Optional[str]] = {}
+
+    def add(self, level: int, full_name: str, parent: Optional[str]) -> None:
+        self.parents.setdefault(full_name, parent)
+        for name in {full_name, _alias(full_name)} - {None}:
+            node = self.root
+            for char in name:
+                node = node.children.setdefault(char, _TrieNode())
+            entry = (level, full_name, parent)
+            if entry not in node.entries:
+                node.entries.append(entry)
+
+    def match(self, text: str, start: int = 0) -> Tuple[int, List[Tuple[int, str, Optional[str]]]]:
+        """返回从 start 开始的最长匹配：(结束位置, 候选区划)；未匹配时结束位置为 start。"""
+        node, end, entries = self.root, start, []
+        for index in range(start, len(text)):
+            node = node.children.get(text[index])
+            if node is None:
+                break
+            if node.entries:
+                end, entries = index + 1, node.entries
+        return end, entries
+
+
+def _build_trie() -> RegionTrie:
+    trie = RegionTrie()
+    for province, cities in PROVINCE_CITIES.items():
+        trie.add(PROVINCE, province, None)
+        # 直辖市下直接是市辖区
+        level = DISTRICT if province in MUNICIPALITIES else CITY
+        for city in cities.split():
+            trie.add(level, city, province)
+    for city, districts in CITY_DISTRICTS.items():
+        for district in districts.split():
+            trie.add(DISTRICT, district, city)
+    return trie
+
+
+_TRIE = _build_trie()
+
+# ----------------------------------------------------------------------
+# 字段规则
+# ----------------------------------------------------------------------
+_MOBILE_RE = re.compile(r"(?<!\d)(?:\+?86[-\s]?)?(1[3-9]\d)[-\s]?(\d{4})[-\s]?(\d{4})(?!\d)")
+_LANDLINE_RE = re.compile(r"(?<!\d)(0\d{2,3})-(\d{7,8})(?!\d)")
+_LABEL_RE = re.compile(
+    r"(?:收货人|收件人|联系人|姓名|名字|联系电话|电话号码|手机号码|手机号|电话|手机|"
+    r"收货地址|详细地址|所在地区|地址)\s*[:=]?"
+)
+_SPLIT_RE = re.compile(r"[,;、|/\s]+")
+_FALLBACK_DISTRICT_RE = re.compile(r"[一-龥]{1,5}?(?:新区|区|县|旗|市)")
+_STREET_HINT_RE = re.compile(r"\d|路|街|道|巷|号|弄|村|镇|乡|小区|大厦|栋|幢|楼|室|单元|花园|苑|公寓|广场|园")
+_CJK_RE = re.compile(r"^[一-龥·]+$")
+
+_SURNAMES = set(
+    "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈"
+    "姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤"
+    "常温康施文牛樊葛邢安齐易乔伍庞颜倪庄聂章鲁岳翟殷詹申欧耿关兰焦俞左柳甘祝包宁尚符舒阮柯纪梅童凌毕单季裴"
+    "霍涂成苗谷盛曲翁冉骆蓝路游辛靳管柴蒙鲍华喻祁蒲房滕屈饶解牟艾尤阳时穆农司卓古吉缪简车项连芦麦褚娄窦戚岑"
+    "景党宫费卜冷晏席卫米柏宗瞿桂全佟应臧闵苟邬边卞姬师和仇栾隋商刁沙荣巫寇桑郎甄丛仲虞敖巩明佘池查麻苑迟邝"
+)
+_COMPOUND_SURNAMES = ("欧阳", "司马", "上官", "诸葛", "东方", "皇甫", "尉迟", "公孙", "慕容", "令狐", "长孙", "夏侯", "司徒", "端木")
+_HONORIFICS = ("先生", "女士", "小姐")
+
+
+def _normalize(text: str) -> str:
+    """全角转半角，统一中文标点为分隔符。"""
+    text = unicodedata.normalize("NFKC", text)
+    return text.replace("。", ",").replace("：", ":").strip()
+
+
+def _looks_like_name(token: str) -> bool:
+    if not _CJK_RE.match(token) or _TRIE.match(token)[0] > 0 or _STREET_HINT_RE.search(token):
+        return False
+    if token.endswith(_HONORIFICS):
+        return len(token) in (3, 4) and token[0] in _SURNAMES
+    if token.startswith(_COMPOUND_SURNAMES):
+        return 3 <= len(token) <= 4
+    return 2 <= len(token) <= 3 and token[0] in _SURNAMES
+
+
+# ----------------------------------------------------------------------
+# 解析结果
+# ----------------------------------------------------------------------
+class ParsedAddress(BaseModel):
+    """结构化收货信息。"""
+    name: str = ""
+    phone: str = ""
+    province: str = ""
+    city: str = ""
+    district: str = ""
+    street: str = ""
+    confidence: float = Field(0.0, description="0~1，按已识别字段加权")
+
+    @property
+    def detail(self) -> str:
+        """省市区 + 街道门牌；直辖市不重复输出市名。"""
+        parts = [self.province]
+        if self.city and self.city != self.province:
+            parts.append(self.city)
+        parts += [self.district, self.street]
+        return "".join(parts)
+
+    def as_dict(self) -> Dict[str, str]:
+        return {"name": self.name, "phone": self.phone, "detail": self.detail}
+
+
+def _resolve_regions(address: str) -> Tuple[str, str, str, str]:
+    """在地址开头依次识别省 / 市 / 区，返回 (省, 市, 区, 剩余街道)。"""
+    province = city = district = ""
+    pos = 0
+    while pos < len(address):
+        end, entries = _TRIE.match(address, pos)
+        if not entries:
+            break
+        # 优先选择与已识别上级一致、且层级比当前更低的候选
+        context = {name for name in (province, city) if name}
+        candidates = [e for e in entries if e[0] > _current_level(province, city, district)]
+        consistent = [e for e in candidates if e[2] in context or _TRIE.parents.get(e[2]) in context]
+        chosen = (consistent or ([] if context else sorted(candidates)))[:1]
+        if not chosen:
+            break
+        level, full_name, parent = chosen[0]
+        if level == PROVINCE:
+            province = full_name
+        elif level == CITY:
+            city = full_name
+            province = province or (parent or "")
+        else:
+            district = full_name
+            parent = parent or ""
+            if parent in MUNICIPALITIES:
+                province = city = parent
+            else:
+                city = city or parent
+                province = province or (_TRIE.parents.get(parent) or "")
+        if province in MUNICIPALITIES:
+            city = province
+        pos = end
+        if district:
+            break
+
+    rest = address[pos:]
+    if (province or city) and not district:
+        match = _FALLBACK_DISTRICT_RE.match(rest)
+        if match and not _STREET_HINT_RE.search(match.group()[:-1]):
+            district = match.group()
+            rest = rest[match.end():]
+    return province, city, district, rest.strip(" ,-")
+
+
+def _current_level(province: str, city: str, district: str) -> int:
+    if district:
+        return DISTRICT
+    if city:
+        return CITY
+    if province:
+        return PROVINCE
+    return -1
+
+
+def parse_address(text: str) -> ParsedAddress:
+    """解析一段包含收货人、电话、地址的文本。"""
+    text = _normalize(text)
+
+    phone = ""
+    match = _MOBILE_RE.search(text)
+    phone_weight = 0.3
+    if match:
+        phone = "".join(match.groups())
+    else:
+        match = _LANDLINE_RE.search(text)
+        if match:
+            phone, phone_weight = "-".join(match.groups()), 0.25
+    if match:
+        text = f"{text[:match.start()]},{text[match.end():]}"
+
+    tokens = [t for t in _SPLIT_RE.split(_LABEL_RE.sub(",", text)) if t]
+
+    name = ""
+    address_tokens: List[str] = []
+    address_started = False
+    for token in tokens:
+        if not name and _looks_like_name(token):
+            name = token
+            continue
+        if not address_started:
+            # 地址从第一个以行政区划开头或带门牌特征的片段开始，之前的无关片段丢弃
+            address_started = _TRIE.match(token)[0] > 0 or bool(_STREET_HINT_RE.search(token))
+        if address_started:
+            address_tokens.append(token)
+
+    province, city, district, street = _resolve_regions("".join(address_tokens))
+
+    confidence = phone_weight if phone else 0.0
+    if name:
+        confidence += 0.25
+    if province and city:
+        confidence += 0.25
+    elif province or city:
+        confidence += 0.15
+    if street:
+        confidence += 0.2 if _STREET_HINT_RE.search(street) else 0.1
+
+    return ParsedAddress(
+        name=name, phone=phone, province=province, city=city, district=district,
+        street=street, confidence=round(confidence, 2),
+    )
@@ -1,9 +1,8 @@
 import os
 import sys
+import logging
 from typing import Dict, Any, Optional, List
 
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.messages import BaseMessage
 
@@ -13,78 +12,89 @@ project_root = os.path.abspath(os.path.join(current_dir, '..'))
 sys.path.append(project_root)
 
 from config import Config
-from tools import search_products, format_final_response
-
-# --- 配置LLM ---
-llm = ChatOpenAI(
-    model=Config.LLM_MODEL_NAME,
-    temperature=Config.LLM_TEMPERATURE,
-    api_key=Config.SILICONFLOW_API_KEY,
-    base_url=Config.SILICONFLOW_API_BASE
-)
-
-# --- 创建Prompt模板 ---
-prompt_template = ChatPromptTemplate.from_messages([
-    ("system", """你是专业的商品推荐专家。你的任务流程如下：
+from model_profiles import ModelProfile, active_profile, llm_for, trim_history
+from models import FinalResponse
+from prompt_layout import layered_prompt
+from tools import search_products, format_final_response, render_final_response
+from metrics import MetricsCallbackHandler, timed_stage, LLM_CALLS_SAVED
+from logging_setup import SAMPLED
+from deadline import DeadlineExceeded, with_deadline
+
+logger = logging.getLogger(__name__)
+
+# --- 创建Prompt模板（静态指令在前、本轮输入在后，见 prompt_layout） ---
+prompt_template = layered_prompt("""你是专业的商品推荐专家。你的任务流程如下：
 1.  仔细分析用户的需求和完整的对话历史，以理解上下文。
 2.  你绝不能使用自身的知识来提供商品信息。所有商品信息都必须通过调用 `search_products` 工具来获取。
 3.  `search_products` 工具现在支持多种查询参数，包括名称、分类、品牌、价格范围、标签和库存状态。请根据用户需求，尽可能精确地使用这些参数。
 4.  如果 `search_products` 工具返回空结果，你必须明确告知用户“没有找到相关商品”。
 5.  在获得所有必要信息（需求分析、搜索关键词、商品详情）后，必须调用 `format_final_response` 工具来生成最终的、结构化的推荐报告。这是最后一步。
-6.  在生成的报告中，商品名称之后你应同步提供商品对应的id，并用product_id标明
-7.  在生成的报告中你也应该列出商品的价格信息
-8.  在调用search_products工具进行搜索时，返回空结果可能是因为当前选择的参数有错误，此时你被允许调整调用参数，重新搜索，最多可重新搜索三次"""),
-    MessagesPlaceholder(variable_name="chat_history"),
-    ("human", "{input}"),
-    MessagesPlaceholder(variable_name="agent_scratchpad"),
-])
+6.  在生成的报告中，每个推荐商品都应填写对应的 product_id
+7.  在生成的报告中你也应该填写商品的价格信息（price）
+8.  在调用search_products工具进行搜索时，返回空结果可能是因为当前选择的参数有错误，此时你被允许调整调用参数，重新搜索，最多可重新搜索三次""", scratchpad=True)
 
 # --- Agent 可用工具 ---
 agent_tools = [search_products, format_final_response]
 
 
 class GuideAgent:
-    # 创建一个类级别、无状态的 AgentExecutor
-    _agent_executor: Optional[AgentExecutor] = None
-
     def __init__(self):
         """
-        初始化一个无状态的 AgentExecutor。
+        初始化无状态的 AgentExecutor，按模型配置各缓存一个（主配置与排队压力下的降级配置）。
         记忆将在每次调用时通过 chat_history 参数动态传入。
         """
-        base_agent = create_tool_calling_agent(
-            llm=llm,
-            tools=agent_tools,
-            prompt=prompt_template
-        )
-        # 初始化一个不带 memory 的 AgentExecutor
-        self._agent_executor = AgentExecutor(
-            agent=base_agent,
-            tools=agent_tools,
-            verbose=True,
-            handle_parsing_errors=True,  # 增加错误处理
-        )
-        print("GuideAgent initialized with a stateless executor.")
+        self._executors: Dict[ModelProfile, AgentExecutor] = {}
+        # --- 配置LLM（guide 阶段的模型配置，在构建 Agent 时创建，而不是在模块导入时） ---
+        self._executor_for(active_profile("guide"))
+        logger.info("GuideAgent initialized with a stateless executor.")
+
+    def _executor_for(self, profile: ModelProfile) -> AgentExecutor:
+        executor = self._executors.get(profile)
+        if executor is None:
+            base_agent = create_tool_calling_agent(
+                llm=llm_for(profile),
+                tools=agent_tools,
+                prompt=prompt_template
+            )
+            # 初始化一个不带 memory 的 AgentExecutor
+            executor = self._executors[profile] = AgentExecutor(
+                agent=base_agent,
+                tools=agent_tools,
+                verbose=Config.AGENT_VERBOSE,
+                handle_parsing_errors=True,  # 增加错误处理
+                max_iterations=Config.AGENT_MAX_ITERATIONS,
+            )
+        return executor
 
     async def process_message(self, user_input: str, session_id: str, user_id: str,chat_history: List[BaseMessage]) -> str:
         """
         处理用户消息，直接使用由监管者传入的全局 chat_history 作为记忆。
         """
-        print(f"--- GuideAgent 正在处理请求 (Session: {session_id}) ---")
-        print(f"--- 接收到的全局历史记录 (最近3条): {chat_history[-3:]}")
+        logger.info("GuideAgent 正在处理请求", extra={"session_id": session_id, "history_len": len(chat_history)})
+        logger.debug("最近3条历史记录: %s", chat_history[-3:], extra=SAMPLED)
 
+        metrics_handler = MetricsCallbackHandler(stage="guide")
+        profile = active_profile("guide")
         try:
-            # 在 ainvoke 中明确传入 chat_history，实现全局上下文注入
-            response = await self._agent_executor.ainvoke({
-                "input": user_input,
-                "chat_history": chat_history
-            })
+            # 在 ainvoke 中明确传入 chat_history，实现全局上下文注入；执行循环只获得本轮剩余预算
+            with timed_stage("agent.guide"):
+                response = await with_deadline(self._executor_for(profile).ainvoke({
+                    "input": user_input,
+                    "chat_history": trim_history(profile, chat_history)
+                }, config={"callbacks": [metrics_handler]}), "agent.guide")
+            metrics_handler.record_iterations()
 
             final_report = response.get('output', "未能生成有效响应")
+            if isinstance(final_report, FinalResponse):
+                # format_final_response 为终结工具：本地渲染，省去一次 LLM 复述调用
+                LLM_CALLS_SAVED.labels("guide", "terminal_tool").inc()
+                return render_final_response(final_report)
             return str(final_report)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             error_msg = f"GuideAgent 在处理请求时出错: {str(e)}"
-            print(f"ERROR: {error_msg}")
+            logger.exception(error_msg, extra={"session_id": session_id})
             return error_msg
 
 
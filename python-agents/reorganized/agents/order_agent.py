@@ -1,19 +1,29 @@
 # agents/order_agent.py
 import logging
 import asyncio
-import requests
 import json
 import os
 from datetime import datetime
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union
 from langchain_core.output_parsers import JsonOutputParser
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import AgentExecutor, create_tool_calling_agent, Tool
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.tools import StructuredTool
+from langchain.agents import AgentExecutor, create_tool_calling_agent
 
 from reorganized.config import Config
-from reorganized.models import AgentState
+from reorganized.models import (
+    AgentState, AddressInfo, ProductOrderItem, CreateOrderInput, OrderIdInput, UserIdInput, UpdateOrderStatusInput
+)
+from metrics import MetricsCallbackHandler, timed_stage, tool_arg_error_handler, ADDRESS_PARSE_RESULTS
+from logging_setup import SAMPLED
+from model_profiles import get_llm
+from prompt_layout import layered_prompt
+from services.rest_client import RestServiceAPI
+from prefetch import consume_prefetched
+from address_parser import parse_address
+from data.product_db import get_products_by_ids
+from deadline import DeadlineExceeded, with_deadline
 
 
 # ----------------------------------------------------------------------
@@ -23,29 +33,26 @@ class OrderConfig:
     """订单代理配置"""
     SILICONFLOW_API_KEY: str = Config.SILICONFLOW_API_KEY
     SILICONFLOW_BASE_URL: str = Config.SILICONFLOW_API_BASE
-    MODEL_NAME: str = Config.LLM_MODEL_NAME
-    Config.LLM_MODEL_NAME
-    MODEL_TEMPERATURE: float = Config.LLM_TEMPERATURE
-    MAX_TOKENS: int = 500
     ORDER_SERVICE_BASE_URL: str = os.environ.get("ORDER_SERVICE_BASE_URL", "http://10.172.66.224:8084/order")
+    # Nacos 中的服务名，启用服务发现时直连该服务的实例，ORDER_SERVICE_BASE_URL（网关）作为回退地址
+    ORDER_SERVICE_NAME: str = os.environ.get("ORDER_SERVICE_NAME", "order-service")
 
 
 # ----------------------------------------------------------------------
 # 订单服务 API 封装 (修改)
 # ----------------------------------------------------------------------
-class OrderServiceAPI:
+class OrderServiceAPI(RestServiceAPI):
     """订单服务 API 封装"""
+    service_name = "order"
+    display_name = "订单服务"
 
-    def __init__(self, base_url: str = OrderConfig.ORDER_SERVICE_BASE_URL):
-        self.base_url = base_url
-        self.session = requests.Session()
-        self.session.timeout = 120
-        self.logger = logging.getLogger(__name__)
+    def __init__(self, base_url: str = OrderConfig.ORDER_SERVICE_BASE_URL,
+                 discovery_service: Optional[str] = OrderConfig.ORDER_SERVICE_NAME):
+        super().__init__(base_url, discovery_service)
 
     async def create_order(self, user_id: str, items: List[Dict[str, Any]], shipping_address: str, total_amount: float,
                            status: str = "PENDING_PAYMENT") -> Dict[str, Any]:
         """创建新订单（修改为匹配数据库格式）"""
-        url = f"{self.base_url}/api/orders"
         data = {
             "userId": user_id,
             "totalAmount": total_amount,
@@ -53,79 +60,37 @@ class OrderServiceAPI:
             "items": items,
             "status": status
         }
-        try:
-            response = await asyncio.to_thread(self.session.post, url, json=data)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"创建订单失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("POST", "/api/orders", "/api/orders", "创建订单失败", json_body=data)
 
     async def get_all_orders(self) -> Dict[str, Any]:
         """获取所有订单"""
-        url = f"{self.base_url}/api/orders"
-        try:
-            response = await asyncio.to_thread(self.session.get, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"获取所有订单失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("GET", "/api/orders", "/api/orders", "获取所有订单失败")
 
     async def get_order_by_id(self, order_id: str) -> Dict[str, Any]:
         """根据订单 ID 获取订单"""
-        url = f"{self.base_url}/api/orders/{order_id}"
-        try:
-            response = await asyncio.to_thread(self.session.get, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"获取订单信息失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("GET", f"/api/orders/{order_id}", "/api/orders/{order_id}", "获取订单信息失败")
 
     async def get_orders_by_user(self, user_id: str) -> Dict[str, Any]:
-        """根据用户 ID 获取订单"""
-        url = f"{self.base_url}/api/orders/user/{user_id}"
-        try:
-            response = await asyncio.to_thread(self.session.get, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"获取用户订单失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        """根据用户 ID 获取订单（优先使用本轮的投机预取结果）"""
+        prefetched = await consume_prefetched("order", user_id)
+        if prefetched is not None:
+            return prefetched
+        return await self._request("GET", f"/api/orders/user/{user_id}", "/api/orders/user/{user_id}",
+                                   "获取用户订单失败")
 
     async def update_order(self, order_id: str, order_data: Dict[str, Any]) -> Dict[str, Any]:
         """更新订单"""
-        url = f"{self.base_url}/api/orders/{order_id}"
-        try:
-            response = await asyncio.to_thread(self.session.put, url, json=order_data)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"更新订单失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("PUT", f"/api/orders/{order_id}", "/api/orders/{order_id}", "更新订单失败",
+                                   json_body=order_data)
 
     async def update_order_status(self, order_id: str, status: str) -> Dict[str, Any]:
         """更新订单状态"""
-        url = f"{self.base_url}/api/orders/{order_id}/status/{status}"
-        try:
-            response = await asyncio.to_thread(self.session.patch, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"更新订单状态失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("PATCH", f"/api/orders/{order_id}/status/{status}",
+                                   "/api/orders/{order_id}/status/{status}", "更新订单状态失败")
 
     async def delete_order(self, order_id: str) -> Dict[str, Any]:
         """删除订单"""
-        url = f"{self.base_url}/api/orders/{order_id}"
-        try:
-            response = await asyncio.to_thread(self.session.delete, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json() if response.content else {}}
-        except Exception as e:
-            self.logger.error(f"删除订单失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("DELETE", f"/api/orders/{order_id}", "/api/orders/{order_id}", "删除订单失败")
 
 
 # ----------------------------------------------------------------------
@@ -134,122 +99,32 @@ class OrderServiceAPI:
 def create_order_tool(order_agent):
     """创建订单工具"""
 
-    def _create_order_sync(order_data: str) -> str:
+    def _create_order_sync(**kwargs) -> str:
         """同步包装器"""
-        return asyncio.run(_create_order(order_data))
-
-    async def _create_order(order_data: str) -> str:
-        try:
-            # 尝试解析JSON格式
-            try:
-                data = json.loads(order_data)
-            except json.JSONDecodeError:
-                # 如果不是JSON，尝试解析为自然语言地址格式
-                return await order_agent._handle_natural_language_order(order_data)
-
-            # 检查必需字段
-            required_fields = ["user_id", "products", "address"]
-            missing = [field for field in required_fields if field not in data]
-            if missing:
-                return f"❌❌ 缺少必要字段：{', '.join(missing)}"
-
-            # 获取参数（安全处理）
-            user_id = data.get("user_id", "")
-            if isinstance(user_id, int):
-                user极 = str(user_id)
-            elif isinstance(user_id, str):
-                user_id = user_id.strip()
-            else:
-                return "❌❌ 无效的用户ID格式"
-
-            products = data.get("products", [])
-            address = data.get("address", "")
-
-            # 检查地址不能为空
-            if not address:
-                return "❌❌ 收货地址不能为空"
-
-            # 统一地址格式为字符串
-            if isinstance(address, dict):
-                required_keys = ["name", "phone", "detail"]
-                if not all(key in address for key in required_keys):
-                    return "❌❌ 地址字典缺少必要字段：name, phone, detail"
-                address_str = f"{address['name']}，{address['phone']}，{address['detail']}"
-            else:
-                address_str = str(address).strip()
-                if not address_str:
-                    return "❌❌ 收货地址不能为空"
-
-            # 检查商品列表不能为空
-            if len(products) == 0:
-                return "❌❌ 商品列表不能为空"
-
-            # 标准化商品格式并计算总金额
-            valid_items = []
-            total_amount = 0.0
-            for item in products:
-                # 处理字符串格式的商品
-                if isinstance(item, str):
-                    try:
-                        parsed_item = json.loads(item)
-                        if "product_id" in parsed_item:
-                            item = parsed_item
-                    except:
-                        item = {"product_id": item, "quantity": 1}
-
-                # 确保商品有product_id字段
-                if "product_id" not in item:
-                    return f"❌❌ 商品缺少product_id字段: {item}"
-
-                # 处理整数类型的product_id
-                product_id = str(item["product_id"]) if isinstance(item["product_id"], int) else item["product_id"]
-
-                # 获取单价和数量
-                unit_price = float(item.get("unit_price", 0.0))
-                quantity = int(item.get("quantity", 1))
-                item_amount = unit_price * quantity
-
-                # 创建数据库格式的商品项
-                valid_item = {
-                    "productId": product_id,
-                    "productName": item.get("product_name", f"产品{product_id}"),
-                    "quantity": quantity,
-                    "unitPrice": unit_price
-                }
-
-                valid_items.append(valid_item)
-                total_amount += item_amount
-
-            # 调用服务
-            result = await order_agent.create_order(
-                user_id,
-                valid_items,
-                address_str,
-                total_amount
-            )
-
-            if result["success"]:
-                return f"订单创建成功：{json.dumps(result['data'], ensure_ascii=False)}"
-            else:
-                return f"订单创建失败：{result['error']}"
-
-        except Exception as e:
-            return f"创建订单时发生错误：{str(e)}"
+        return asyncio.run(_create_order(**kwargs))
+
+    async def _create_order(user_id: str, address: Union[AddressInfo, str], products: List[ProductOrderItem],
+                            total_amount: Optional[float] = None) -> str:
+        # 参数已由 CreateOrderInput 校验，这里只做格式转换
+        order_data: Dict[str, Any] = {
+            "user_id": user_id.strip(),
+            "products": [item.model_dump(exclude_none=True) for item in products],
+            "address": address.model_dump() if isinstance(address, AddressInfo) else address,
+        }
+        if total_amount is not None:
+            order_data["total_amount"] = total_amount
+        return await order_agent._create_order_from_data(order_data)
 
-    # 修复：添加了缺少的func和coro参数
-    return Tool(
+    return StructuredTool.from_function(
         name="create_order",
         func=_create_order_sync,
-        coro=_create_order,
-        description=(
-            "创建新订单。输入必须是包含以下字段的JSON字符串：\n"
-            "- user_id: 用户ID\n"
-            "- products: 商品列表，每个商品必须包含 product_id, quantity, unit_price\n"
-            "- address: 字符串或 {name, phone, detail} 字典\n"
-            "示例：{'user_id':'U123', 'products':[{'product_id':'P456','quantity':2,'unit_price':2499}], ...}"
-        )
+        coroutine=_create_order,
+        args_schema=CreateOrderInput,
+        handle_validation_error=tool_arg_error_handler("create_order"),
+        description="创建新订单。products 中每个商品需包含 product_id 和 quantity，单价与名称按商品目录自动补全。"
     )
 
+
 def get_order_by_id_tool(order_agent):
     """根据ID获取订单工具"""
 
@@ -263,14 +138,18 @@ def get_order_by_id_tool(order_agent):
                 return f"订单信息：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"获取订单信息失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"获取订单信息时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="get_order_by_id",
         func=_get_order_by_id_sync,
-        coro=_get_order_by_id,
-        description="根据订单ID获取订单信息，参数：订单ID"
+        coroutine=_get_order_by_id,
+        args_schema=OrderIdInput,
+        handle_validation_error=tool_arg_error_handler("get_order_by_id"),
+        description="根据订单ID获取订单信息"
     )
 
 
@@ -289,35 +168,31 @@ def get_orders_by_user_tool(order_agent):
                 return f"用户订单列表：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"获取用户订单失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"获取用户订单时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="get_orders_by_user",
         func=_get_orders_by_user_sync,
-        coro=_get_orders_by_user,
-        description="根据用户ID获取所有订单，参数：用户ID"
+        coroutine=_get_orders_by_user,
+        args_schema=UserIdInput,
+        handle_validation_error=tool_arg_error_handler("get_orders_by_user"),
+        description="根据用户ID获取所有订单"
     )
 
 
 def update_order_status_tool(order_agent):
     """更新订单状态工具"""
 
-    def _update_order_status_sync(status_data: str) -> str:
+    def _update_order_status_sync(order_id: str, status: str) -> str:
         """同步包装器"""
-        return asyncio.run(_update_order_status(status_data))
+        return asyncio.run(_update_order_status(order_id, status))
 
-    async def _update_order_status(status_data: str) -> str:
-        """更新订单状态，参数为JSON格式字符串"""
+    async def _update_order_status(order_id: str, status: str) -> str:
+        """更新订单状态"""
         try:
-            try:
-                data = json.loads(status_data)
-            except json.JSONDecodeError:
-                return "参数格式错误。输入必须是包含 order_id 和 status的JSON字符串。"
-            order_id = data.get("order_id")
-            status = data.get("status")
-            if not all([order_id, status]):
-                return "缺少必要参数：order_id、status"
             current_result = await order_agent.get_order_by_id(order_id)
             if not current_result["success"]:
                 return f"无法获取订单当前状态：{current_result['error']}"
@@ -334,14 +209,18 @@ def update_order_status_tool(order_agent):
                 return f"订单状态更新成功：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"更新订单状态失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"更新订单状态时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="update_order_status",
         func=_update_order_status_sync,
-        coro=_update_order_status,
-        description="更新订单状态。输入必须是包含 order_id 和 status 的JSON字符串。"
+        coroutine=_update_order_status,
+        args_schema=UpdateOrderStatusInput,
+        handle_validation_error=tool_arg_error_handler("update_order_status"),
+        description="更新订单状态"
     )
 
 
@@ -366,17 +245,31 @@ def cancel_order_tool(order_agent):
                 return f"订单取消成功：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"取消订单失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"取消订单时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="cancel_order",
         func=_cancel_order_sync,
-        coro=_cancel_order,
-        description="取消一个订单，参数：订单ID"
+        coroutine=_cancel_order,
+        args_schema=OrderIdInput,
+        handle_validation_error=tool_arg_error_handler("cancel_order"),
+        description="取消一个订单"
     )
 
 
+# 本地规则解析置信度不足时的 LLM 收货信息解析（静态前缀，模块级构建一次）
+ADDRESS_PARSING_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+     "从用户提供的收货信息中提取收货人、电话和详细地址。"
+     "输出JSON：{{\"name\": \"收货人\", \"phone\": \"电话\", \"detail\": \"省市区+街道门牌\"}}，"
+     "无法识别的字段输出空字符串，绝不虚构。"),
+    ("human", "{input}"),
+])
+
+
 # ----------------------------------------------------------------------
 # 订单代理主类 (修改)
 # ----------------------------------------------------------------------
@@ -400,15 +293,8 @@ class OrderAgent:
             "DELIVERED": "已发货", "FINISHED": "已完成", "CANCELLED": "已取消"
         }
 
-        # 初始化 LLM
-        llm = ChatOpenAI(
-            api_key=self.config.SILICONFLOW_API_KEY,
-            base_url=self.config.SILICONFLOW_BASE_URL,
-            model=self.config.MODEL_NAME,
-            temperature=self.config.MODEL_TEMPERATURE,
-            max_tokens=self.config.MAX_TOKENS,
-            timeout=60.0
-        )
+        # 初始化 LLM（order 阶段的模型配置）
+        llm = get_llm("order")
 
         # 初始化工具
         tools = [
@@ -419,8 +305,8 @@ class OrderAgent:
             cancel_order_tool(self)
         ]
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是专业的订单助手。你的核心任务是根据用户的指令和对话极史，调用工具来处理订单。
+        # 静态指令在前、User ID 作为会话级上下文、本轮输入在最后，便于命中服务商的前缀缓存
+        prompt = layered_prompt("""你是专业的订单助手。你的核心任务是根据用户的指令和对话极史，调用工具来处理订单。
 
         **工作流程:**
         1.  **分析意图**: 仔细分析用户的最新输入和完整的对话历史，理解用户的具体需求。
@@ -432,21 +318,16 @@ class OrderAgent:
                 • 详细收货地址（省市区+街道门牌号）
             -   如果缺少任何信息，必须明确要求用户提供
         3.  **调用工具**: 使用提取的信息调用创建订单工具
-        4.  **订单金额**：从对话历史中提取
+        4.  **订单金额**：单价与总金额由系统按商品目录计算，只需提供商品ID和数量
         5.  **响应用户**: 根据工具结果生成回复
 
         **重要规则:**
         - 收货地址必须是完整的省市区+街道门牌号
         -当调用工具函数时打印出使用了哪个工具函数
-        -从对话历史中计算订单金额并正确记录
         -当用户要求查询自己的所有订单信息时，优先调用工具函数查询，而不是从chathistory中解析。
         - 如果用户未提供收货信息，返回固定格式提示：
           "请提供收货信息：[姓名]，[电话]，[完整地址]"
-        - 绝不虚构信息"""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "User ID: {user_id}\nUser Request: {input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
+        - 绝不虚构信息""", session_context="User ID: {user_id}", scratchpad=True)
         # 创建 agent
         base_agent = create_tool_calling_agent(
             llm=llm,
@@ -458,11 +339,12 @@ class OrderAgent:
         self._agent_executor = AgentExecutor(
             agent=base_agent,
             tools=tools,
-            verbose=True,
+            verbose=Config.AGENT_VERBOSE,
             handle_parsing_errors=True,
+            max_iterations=Config.AGENT_MAX_ITERATIONS,
         )
 
-        print("OrderAgent initialized with a stateless executor and updated prompt.")
+        self.logger.info("OrderAgent initialized with a stateless executor and updated prompt.")
 
     async def process_message(self, user_input: str, session_id: str, user_id: str,
                               chat_history: List[BaseMessage]) -> str:
@@ -470,21 +352,25 @@ class OrderAgent:
         处理用户消息，直接使用由监管者传入的全局 chat_history 作为记忆。
         返回一个字符串作为响应。
         """
-        self.logger.info(f"--- OrderAgent 正在处理请求 (Session: {session_id}) ---")
-        self.logger.info(f"--- 接收到的全局历史记录条数: {len(chat_history)} ---")
+        self.logger.info("OrderAgent 正在处理请求", extra={"session_id": session_id, "history_len": len(chat_history)})
 
+        metrics_handler = MetricsCallbackHandler(stage="order")
         try:
-            # 在 ainvoke 中明确传入 user_id，以匹配新的 prompt 模板
-            response = await self._agent_executor.ainvoke({
-                "input": user_input,
-                "user_id": user_id,
-                "chat_history": chat_history
-            })
+            # 在 ainvoke 中明确传入 user_id，以匹配新的 prompt 模板；执行循环只获得本轮剩余预算
+            with timed_stage("agent.order"):
+                response = await with_deadline(self._agent_executor.ainvoke({
+                    "input": user_input,
+                    "user_id": user_id,
+                    "chat_history": chat_history
+                }, config={"callbacks": [metrics_handler]}), "agent.order")
+            metrics_handler.record_iterations()
 
             output = response.get("output", "OrderAgent: 抱歉，我无法处理您的请求。")
-            self.logger.info(f"OrderAgent 响应: {output}")
+            self.logger.info("OrderAgent 响应: %s", output, extra={**SAMPLED, "session_id": session_id})
             return str(output)
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             import traceback
             error_msg = f"OrderAgent 在处理请求时出错: {str(e)}"
@@ -510,6 +396,8 @@ class OrderAgent:
                 shipping_address,
                 total_amount
             )
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"创建订单失败: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -526,116 +414,79 @@ class OrderAgent:
         """更新订单状态"""
         return await self.order_api.update_order_status(order_id, status)
 
-    async def _handle_natural_language_order(self, input_text: str) -> str:
-        """处理自然语言格式的订单信息"""
-        from langchain_core.output_parsers import JsonOutputParser
-        from langchain_core.prompts import ChatPromptTemplate
-
-        prompt = ChatPromptTemplate.from_messages([
-            ("system",
-             "将用户输入解析为结构化订单数据。注意："
-             "1. 商品字段可能是数组或单个商品对象\n"
-             "2. 单个商品格式: {'product_id':'..','quantity':1}\n"
-             "3. 自动为缺失quantity字段补默认值1\n"
-             "4. 必须提取总金额(total_amount)\n"  # 新增金额提取要求
-             "5. 输出必须是JSON格式，包含user_id, products, address, total_amount字段")  # 增加金额字段
-        ])
-
-        llm = ChatOpenAI(
-            model=self.config.MODEL_NAME,
-            temperature=0,
-            api_key=self.config.SILICONFLOW_API_KEY,
-            base_url=self.config.SILICONFLOW_BASE_URL
-        )
-        parser = JsonOutputParser()
-
+    async def _lookup_products(self, product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """按ID批量查询商品目录，返回 {商品ID: {"name", "price"}}。"""
+        if Config.USE_EXTERNAL_PRODUCT_API:
+            from services.product_api_client import get_product_api_client
+            client = await get_product_api_client()
+            products = await client.get_products_by_ids(product_ids)
+            return {pid: {"name": p.name, "price": float(p.price)} for pid, p in products.items()}
+        products = get_products_by_ids(product_ids)
+        return {pid: {"name": p["name"], "price": float(p["price"])} for pid, p in products.items()}
+
+    async def _resolve_address(self, address: Any) -> Optional[str]:
+        """
+        将收货地址统一为 "姓名，电话，省市区街道"。
+        字典直接拼接；文本优先本地确定性解析，置信度不足时才回退到 LLM。无法识别时返回 None。
+        """
+        if isinstance(address, dict):
+            if not all(address.get(key) for key in ("name", "phone", "detail")):
+                return None
+            return f"{address['name']}，{address['phone']}，{address['detail']}"
+
+        text = str(address or "").strip()
+        if not text:
+            return None
+        parsed = parse_address(text)
+        if parsed.confidence >= Config.ADDRESS_PARSER_MIN_CONFIDENCE:
+            ADDRESS_PARSE_RESULTS.labels("local").inc()
+            return "{name}，{phone}，{detail}".format(**parsed.as_dict())
+
+        llm = get_llm("parsing")
         try:
-            # 解析自然语言输入
-            chain = prompt | llm | parser
-            structured_data = await chain.ainvoke({"input": input_text})
-            self.logger.info(f"自然语言解析结果：{structured_data}")
-            if not structured_data.get("products"):
-                return "❌ 解析失败：未识别到商品信息"
-
-            if not structured_data.get("address"):
-                return "❌ 解析失败：未识别到收货地址"
-                # +++ 新增：直接使用结构化数据中的单价 +++
-                valid_items = []
-                total_amount = 0.0
-                for item in structured_data["products"]:  # 直接使用已解析数据
-                    unit_price = float(item["unit_price"])  # 确保单价存在
-                    quantity = int(item.get("quantity", 1))
-
-                    valid_item = {
-                        "productId": str(item["product_id"]),
-                        "productName": item.get("product_name", f"产品{item['product_id']}"),
-                        "quantity": quantity,
-                        "unitPrice": unit_price  # 确保传递单价
-                    }
-                    valid_items.append(valid_item)
-                    total_amount += unit_price * quantity  # 计算总金额
-
-                # 调用服务时传递计算的总金额
-                result = await self.create_order(
-                    structured_data["user_id"],
-                    valid_items,
-                    address_str,
-                    total_amount  # 关键修复点
-                )
-
-            # 递归调用创建订单方法
-            return await self._create_order_from_nlp(structured_data)
-
+            structured = await (ADDRESS_PARSING_PROMPT | llm | JsonOutputParser()).ainvoke(
+                {"input": text}, config={"callbacks": [MetricsCallbackHandler(stage="parsing")]})
+            self.logger.info("LLM 地址解析结果：%s", structured, extra=SAMPLED)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
-            return f"❌ 订单解析失败：{str(e)}"
+            self.logger.warning(f"LLM 地址解析失败: {str(e)}")
+            structured = None
+
+        if isinstance(structured, dict) and all(structured.get(key) for key in ("name", "phone", "detail")):
+            ADDRESS_PARSE_RESULTS.labels("llm_fallback").inc()
+            return f"{structured['name']}，{structured['phone']}，{structured['detail']}"
+        ADDRESS_PARSE_RESULTS.labels("failed").inc()
+        return None
 
-    async def _create_order_from_nlp(self, structured_data: dict) -> str:
-        """处理从自然语言解析出的结构化数据（添加金额提取与验证）"""
+    async def _create_order_from_data(self, structured_data: Dict[str, Any]) -> str:
+        """
+        根据 create_order 工具校验后的数据创建订单（金额提取与验证）。
+        structured_data: {user_id, products: [{product_id, quantity, unit_price?, product_name?}],
+                          address: {name, phone, detail} 或文本, total_amount?}
+        """
         try:
-            # 确保所有必要字段都存在
-            required_fields = ["user_id", "products", "address"]
-            missing = [field for field in required_fields if field not in structured_data]
-            if missing:
-                return f"❌❌ 缺少必要字段：{', '.join(missing)}"
-
-            # 获取地址信息
-            address = structured_data["address"]
-            if not address:
-                return "❌❌ 收货地址不能为空"
-
-            # 统一地址格式为字符串
-            if isinstance(address, dict):
-                # 确保字典包含必要字段
-                required_keys = ["name", "phone", "detail"]
-                if not all(key in address for key in required_keys):
-                    return "❌❌ 地址字典缺少必要字段：name, phone, detail"
-                address_str = f"{address['name']}，{address['phone']}，{address['detail']}"
-            else:
-                address_str = str(address).strip()
-                if not address_str:
-                    return "❌❌ 收货地址不能为空"
+            address_str = await self._resolve_address(structured_data["address"])
+            if not address_str:
+                return "请提供收货信息：[姓名]，[电话]，[完整地址]"
 
-            # 处理商品列表
             products = structured_data["products"]
             if not products:
                 return "❌❌ 商品列表不能为空"
 
-            # 场景1：用户输入的是单一商品字典
-            if isinstance(products, dict):
-                products = [products]  # 包装成列表
-
-            # 场景2：用户输入的是字符串格式商品ID
-            elif isinstance(products, str):
-                try:
-                    # 尝试解析为JSON
-                    products = json.loads(products)
-                except:
-                    # 非JSON字符串：视为单一商品ID
-                    products = [{"product_id": products, "quantity": 1}]
-
-            # 验证商品列表类型
-            if not isinstance(products, list):
-                return "❌❌ 商品列表必须是数组格式"
+            # 一次批量查询所有商品的权威价格与名称；查询失败时退回使用模型提供的单价
+            product_ids = [str(item["product_id"]) for item in products]
+            try:
+                catalog = await self._lookup_products(product_ids)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                self.logger.warning(f"批量查询商品失败，使用模型提供的单价: {str(e)}")
+                catalog = None
+            if catalog is not None:
+                unknown = [pid for pid in product_ids if pid not in catalog]
+                if unknown:
+                    return f"❌❌ 商品不存在：{', '.join(unknown)}"
 
             # ========== 金额提取与验证 ==========
             # 1. 尝试从结构化数据中提取总金额
@@ -652,21 +503,21 @@ class OrderAgent:
             calculated_amount = 0.0
             valid_items = []
             for item in products:
-                # 确保商品有product_id字段
-                if "product_id" not in item:
-                    return f"❌❌ 商品缺少product_id字段: {item}"
-
-                # 处理整数类型的product_id
-                product_id = str(item["product_id"]) if isinstance(item["product_id"], int) else item["product_id"]
+                product_id = str(item["product_id"])
 
-                # 获取单价和数量
-                unit_price = float(item.get("unit_price", 0.0))
+                # 获取单价和数量（以商品目录为准）
+                if catalog is not None:
+                    unit_price = catalog[product_id]["price"]
+                    product_name = catalog[product_id]["name"]
+                else:
+                    unit_price = float(item.get("unit_price", 0.0))
+                    product_name = item.get("product_name", f"产品{product_id}")
                 quantity = int(item.get("quantity", 1))
 
                 # 创建数据库格式的商品项
                 valid_item = {
                     "productId": product_id,
-                    "productName": item.get("product_name", f"产品{product_id}"),
+                    "productName": product_name,
                     "quantity": quantity,
                     "unitPrice": unit_price
                 }
@@ -679,8 +530,13 @@ class OrderAgent:
 
             self.logger.info(f"商品总金额计算: ¥{calculated_amount:.2f}")
 
-            # 3. 金额验证与决策
-            if total_amount > 0:
+            # 3. 金额验证与决策：单价来自商品目录时直接使用计算金额
+            if catalog is not None:
+                if total_amount > 0 and abs(total_amount - calculated_amount) > 0.01:
+                    self.logger.warning(f"解析金额¥{total_amount:.2f}与目录价格计算的¥{calculated_amount:.2f}不一致，"
+                                        f"使用目录价格")
+                final_amount = calculated_amount
+            elif total_amount > 0:
                 # 存在解析金额时进行验证
                 if abs(total_amount - calculated_amount) > 0.01:  # 考虑浮点精度
                     amount_difference = abs(total_amount - calculated_amount)
@@ -723,6 +579,8 @@ class OrderAgent:
                 return f"订单创建成功：{json.dumps(order_data, ensure_ascii=False)}"
             else:
                 return f"订单创建失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"创建订单时发生错误：{str(e)}"
 
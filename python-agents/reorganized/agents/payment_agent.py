@@ -1,19 +1,25 @@
 # agents/payment_agent.py
 import logging
 import asyncio
-import requests
 import json
+import os
 import time
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.agents import AgentExecutor, create_tool_calling_agent, Tool
+from langchain_core.tools import StructuredTool
+from langchain.agents import AgentExecutor, create_tool_calling_agent
 
 from config import Config
-from models import AgentState
+from models import AgentState, CreatePaymentInput, PaymentQueryInput, RefundInput, UserIdInput, OrderIdInput
+from metrics import MetricsCallbackHandler, timed_stage, tool_arg_error_handler
+from logging_setup import SAMPLED
+from model_profiles import get_llm
+from prompt_layout import layered_prompt
+from services.rest_client import RestServiceAPI
+from prefetch import consume_prefetched
+from deadline import DeadlineExceeded, with_deadline
 
 
 # ----------------------------------------------------------------------
@@ -23,88 +29,60 @@ class PaymentConfig:
     """支付代理配置"""
     SILICONFLOW_API_KEY: str = Config.SILICONFLOW_API_KEY
     SILICONFLOW_BASE_URL: str = Config.SILICONFLOW_API_BASE
-    MODEL_NAME: str = Config.LLM_MODEL_NAME
-    MODEL_TEMPERATURE: float = Config.LLM_TEMPERATURE
-    MAX_TOKENS: int = 500
     SUPPORTED_PAYMENT_METHODS: List[str] = ["simulated"]
     SUPPORTED_CURRENCIES: List[str] = ["CNY"]
     MAX_PAYMENT_AMOUNT: float = 10000.0
     DEFAULT_PAYMENT_METHOD: str = "simulated"
     DEFAULT_CURRENCY: str = "CNY"
+    PAYMENT_SERVICE_BASE_URL: str = os.environ.get("PAYMENT_SERVICE_BASE_URL", "http://10.172.66.224:8084/payment")
+    # Nacos 中的服务名，启用服务发现时直连该服务的实例，PAYMENT_SERVICE_BASE_URL（网关）作为回退地址
+    PAYMENT_SERVICE_NAME: str = os.environ.get("PAYMENT_SERVICE_NAME", "payment-service")
 
 # ----------------------------------------------------------------------
 # 支付服务 API 封装
 # ----------------------------------------------------------------------
-class PaymentServiceAPI:
+class PaymentServiceAPI(RestServiceAPI):
     """支付服务 API 封装"""
+    service_name = "payment"
+    display_name = "支付服务"
 
-    def __init__(self, base_url: str = "http://10.172.66.224:8084/payment"):
-        self.base_url = base_url
-        self.session = requests.Session()
-        self.session.timeout = 120
-        self.logger = logging.getLogger(__name__)
+    def __init__(self, base_url: str = PaymentConfig.PAYMENT_SERVICE_BASE_URL,
+                 discovery_service: Optional[str] = PaymentConfig.PAYMENT_SERVICE_NAME):
+        super().__init__(base_url, discovery_service)
 
     async def create_payment(self, order_id: str, user_id: str, amount: float, status: str = "PENDING") -> Dict[
         str, Any]:
         """创建新的支付"""
-        url = f"{self.base_url}/api/payments"
         data = {
             "orderId": order_id,
             "userId": user_id,
             "amount": amount,
             "status": status
         }
-        try:
-            response = await asyncio.to_thread(self.session.post, url, json=data)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"创建支付失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("POST", "/api/payments", "/api/payments", "创建支付失败", json_body=data)
 
     async def get_payment_by_id(self, payment_id: str) -> Dict[str, Any]:
         """根据 ID 获取支付"""
-        url = f"{self.base_url}/api/payments/{payment_id}"
-        try:
-            response = await asyncio.to_thread(self.session.get, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"获取支付信息失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("GET", f"/api/payments/{payment_id}", "/api/payments/{payment_id}",
+                                   "获取支付信息失败")
 
     async def get_payments_by_order(self, order_id: str) -> Dict[str, Any]:
         """根据订单 ID 获取支付记录"""
-        url = f"{self.base_url}/api/payments/order/{order_id}"
-        try:
-            response = await asyncio.to_thread(self.session.get, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"获取订单支付信息失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("GET", f"/api/payments/order/{order_id}", "/api/payments/order/{order_id}",
+                                   "获取订单支付信息失败")
 
     async def get_payments_by_user(self, user_id: str) -> Dict[str, Any]:
-        """根据用户 ID 获取支付"""
-        url = f"{self.base_url}/api/payments/user/{user_id}"
-        try:
-            response = await asyncio.to_thread(self.session.get, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"获取用户支付信息失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        """根据用户 ID 获取支付（优先使用本轮的投机预取结果）"""
+        prefetched = await consume_prefetched("payment", user_id)
+        if prefetched is not None:
+            return prefetched
+        return await self._request("GET", f"/api/payments/user/{user_id}", "/api/payments/user/{user_id}",
+                                   "获取用户支付信息失败")
 
     async def update_payment_status(self, payment_id: str, status: str) -> Dict[str, Any]:
         """更新支付状态"""
-        url = f"{self.base_url}/api/payments/{payment_id}/{status}"
-        try:
-            response = await asyncio.to_thread(self.session.patch, url)
-            response.raise_for_status()
-            return {"success": True, "data": response.json()}
-        except Exception as e:
-            self.logger.error(f"更新支付状态失败: {str(e)}")
-            return {"success": False, "error": str(e)}
+        return await self._request("PATCH", f"/api/payments/{payment_id}/{status}", "/api/payments/{payment_id}/{status}",
+                                   "更新支付状态失败")
 
 
 # ----------------------------------------------------------------------
@@ -113,58 +91,41 @@ class PaymentServiceAPI:
 def create_payment_tool(payment_agent):
     """创建支付订单工具"""
 
-    def _create_payment_sync(payment_data: str) -> str:
-        return asyncio.run(_create_payment(payment_data))
+    def _create_payment_sync(order_id: str, user_id: str, amount: float) -> str:
+        return asyncio.run(_create_payment(order_id, user_id, amount))
 
-    async def _create_payment(payment_data: str) -> str:
+    async def _create_payment(order_id: str, user_id: str, amount: float) -> str:
         try:
-            try:
-                data = json.loads(payment_data)
-            except json.JSONDecodeError:
-                return "参数格式错误。输入必须是包含 order_id, user_id, 和 amount 的JSON字符串。"
-            order_id = data.get("order_id")
-            user_id = data.get("user_id")
-            amount = data.get("amount")
-            if not all([order_id, user_id, amount]):
-                return "缺少必要参数：order_id、user_id、amount"
-            try:
-                amount = float(amount)
-            except (ValueError, TypeError):
-                return "金额必须是数字"
-            result = await payment_agent.create_payment(order_id, user_id, amount)
+            result = await payment_agent.create_payment(order_id.strip(), user_id.strip(), amount)
             if result["success"]:
                 return f"支付创建成功：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"支付创建失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"创建支付时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="create_payment_order",
         func=_create_payment_sync,
-        coro=_create_payment,
-        description="创建支付订单。输入必须是包含 order_id, user_id, 和 amount 的JSON字符串。"
+        coroutine=_create_payment,
+        args_schema=CreatePaymentInput,
+        handle_validation_error=tool_arg_error_handler("create_payment_order"),
+        description="创建支付订单。"
     )
 
 
 def query_payment_status_tool(payment_agent):
     """查询支付状态工具"""
 
-    def _query_payment_status_sync(query_data: str) -> str:
-        return asyncio.run(_query_payment_status(query_data))
+    def _query_payment_status_sync(payment_id: Optional[str] = None, order_id: Optional[str] = None) -> str:
+        return asyncio.run(_query_payment_status(payment_id, order_id))
 
-    async def _query_payment_status(query_data: str) -> str:
+    async def _query_payment_status(payment_id: Optional[str] = None, order_id: Optional[str] = None) -> str:
         try:
-            try:
-                data = json.loads(query_data)
-                payment_id = data.get("payment_id") or data.get("id")
-                order_id = data.get("order_id")
-            except json.JSONDecodeError:
-                payment_id = query_data.strip()
-                order_id = None
-
             if payment_id:
-                result = await payment_agent.payment_api.get_payment_by_id(payment_id)
+                result = await payment_agent.payment_api.get_payment_by_id(payment_id.strip())
                 if result["success"]:
                     payment_data = result["data"]
                     status_text = payment_agent.payment_status_map.get(payment_data.get("status", "UNKNOWN"),
@@ -173,7 +134,7 @@ def query_payment_status_tool(payment_agent):
                 else:
                     return f"查询支付状态失败：{result['error']}"
             elif order_id:
-                result = await payment_agent.payment_api.get_payments_by_order(order_id)
+                result = await payment_agent.payment_api.get_payments_by_order(order_id.strip())
                 if result["success"]:
                     payments = result["data"]
                     if payments:
@@ -187,49 +148,47 @@ def query_payment_status_tool(payment_agent):
                     return f"查询订单支付状态失败：{result['error']}"
             else:
                 return "请提供支付ID或订单ID。"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"查询支付状态时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="query_payment_status",
         func=_query_payment_status_sync,
-        coro=_query_payment_status,
-        description="查询支付状态，参数可以是支付ID，也可以是包含 id 或 order_id 的JSON字符串。"
+        coroutine=_query_payment_status,
+        args_schema=PaymentQueryInput,
+        handle_validation_error=tool_arg_error_handler("query_payment_status"),
+        description="查询支付状态，提供支付ID或订单ID之一。"
     )
 
 
 def process_refund_tool(payment_agent):
     """处理退款工具"""
 
-    def _process_refund_sync(refund_data: str) -> str:
-        return asyncio.run(_process_refund(refund_data))
+    def _process_refund_sync(payment_id: str, reason: str = "用户申请退款") -> str:
+        return asyncio.run(_process_refund(payment_id, reason))
 
-    async def _process_refund(refund_data: str) -> str:
+    async def _process_refund(payment_id: str, reason: str = "用户申请退款") -> str:
         try:
-            try:
-                data = json.loads(refund_data)
-            except json.JSONDecodeError:
-                data = {"id": refund_data.strip()}
-
-            payment_id = data.get("payment_id") or data.get("id")
-            if not payment_id:
-                return "缺少必要参数：id（支付ID）"
-
-            refund_reason = data.get("reason", "用户申请退款").strip()
-            result = await payment_agent.process_refund(payment_id, refund_reason)
+            result = await payment_agent.process_refund(payment_id.strip(), reason.strip() or "用户申请退款")
 
             if result["success"]:
                 return f"退款处理成功：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"退款处理失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"处理退款时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="process_refund",
         func=_process_refund_sync,
-        coro=_process_refund,
-        description="处理退款。输入必须是包含 id (支付ID) 的JSON字符串，reason (退款原因)可选。"
+        coroutine=_process_refund,
+        args_schema=RefundInput,
+        handle_validation_error=tool_arg_error_handler("process_refund"),
+        description="处理退款，需要支付ID，退款原因可选。"
     )
 
 
@@ -246,14 +205,18 @@ def get_user_payments_tool(payment_agent):
                 return f"用户支付记录：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"获取用户支付记录失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"获取用户支付记录时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="get_user_payments",
         func=_get_user_payments_sync,
-        coro=_get_user_payments,
-        description="获取指定用户的所有支付记录，参数：用户ID"
+        coroutine=_get_user_payments,
+        args_schema=UserIdInput,
+        handle_validation_error=tool_arg_error_handler("get_user_payments"),
+        description="获取指定用户的所有支付记录"
     )
 
 
@@ -270,14 +233,18 @@ def get_order_payments_tool(payment_agent):
                 return f"订单支付记录：{json.dumps(result['data'], ensure_ascii=False)}"
             else:
                 return f"获取订单支付记录失败：{result['error']}"
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             return f"获取订单支付记录时发生错误：{str(e)}"
 
-    return Tool(
+    return StructuredTool.from_function(
         name="get_order_payments",
         func=_get_order_payments_sync,
-        coro=_get_order_payments,
-        description="获取指定订单的所有支付记录，参数：订单ID"
+        coroutine=_get_order_payments,
+        args_schema=OrderIdInput,
+        handle_validation_error=tool_arg_error_handler("get_order_payments"),
+        description="获取指定订单的所有支付记录"
     )
 
 
@@ -302,19 +269,12 @@ class PaymentAgent:
             "REFUNDED": "已退款", "REFUNDING": "退款中"
         }
 
-        llm = ChatOpenAI(
-            api_key=self.config.SILICONFLOW_API_KEY,
-            base_url=self.config.SILICONFLOW_BASE_URL,
-            model=self.config.MODEL_NAME,
-            temperature=self.config.MODEL_TEMPERATURE,
-            max_tokens=self.config.MAX_TOKENS,
-            timeout=60.0
-        )
+        llm = get_llm("payment")
 
         tools = self._get_payment_tools()
 
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """你是专业的支付助手。你的核心任务是根据用户的指令和对话历史，调用工具来处理支付相关业务。
+        # 静态指令在前、User ID 作为会话级上下文、本轮输入在最后，便于命中服务商的前缀缓存
+        prompt = layered_prompt("""你是专业的支付助手。你的核心任务是根据用户的指令和对话历史，调用工具来处理支付相关业务。
 
 **工作流程:**
 1.  **分析意图**: 仔细分析用户的最新输入和完整的对话历史，理解用户的具体需求（如支付订单、查询状态、退款等）。
@@ -329,21 +289,18 @@ class PaymentAgent:
 **重要规则:**
 -   **首要原则是回顾历史，而不是直接提问。**
 -   支付是模拟的，创建后会自动成功。
--   退款需要支付ID。"""),
-            MessagesPlaceholder(variable_name="chat_history"),
-            ("human", "User ID: {user_id}\nUser Request: {input}"),
-            MessagesPlaceholder(variable_name="agent_scratchpad"),
-        ])
+-   退款需要支付ID。""", session_context="User ID: {user_id}", scratchpad=True)
 
         agent = create_tool_calling_agent(llm=llm, tools=tools, prompt=prompt)
 
         self._agent_executor = AgentExecutor(
             agent=agent,
             tools=tools,
-            verbose=True,
-            handle_parsing_errors=True
+            verbose=Config.AGENT_VERBOSE,
+            handle_parsing_errors=True,
+            max_iterations=Config.AGENT_MAX_ITERATIONS,
         )
-        print("PaymentAgent initialized with a stateless executor and updated prompt.")
+        self.logger.info("PaymentAgent initialized with a stateless executor and updated prompt.")
 
     def _get_payment_tools(self):
         """获取支付工具列表"""
@@ -360,20 +317,26 @@ class PaymentAgent:
         """
         处理用户消息，使用传入的全局 chat_history 作为记忆。
         """
-        self.logger.info(f"PaymentAgent 收到消息: {user_input} (Session: {session_id})")
-        self.logger.info(f"--- 接收到的全局历史记录条数: {len(chat_history)} ---")
+        self.logger.info("PaymentAgent 正在处理请求", extra={"session_id": session_id, "history_len": len(chat_history)})
+        self.logger.debug("PaymentAgent 收到消息: %s", user_input, extra=SAMPLED)
 
+        metrics_handler = MetricsCallbackHandler(stage="payment")
         try:
-            response = await self._agent_executor.ainvoke({
-                "input": user_input,
-                "user_id": user_id,
-                "chat_history": chat_history
-            })
+            # 执行循环只获得本轮剩余预算
+            with timed_stage("agent.payment"):
+                response = await with_deadline(self._agent_executor.ainvoke({
+                    "input": user_input,
+                    "user_id": user_id,
+                    "chat_history": chat_history
+                }, config={"callbacks": [metrics_handler]}), "agent.payment")
+            metrics_handler.record_iterations()
 
             output = response.get("output", "PaymentAgent: 抱歉，我无法处理您的请求。")
-            self.logger.info(f"PaymentAgent 响应: {output}")
+            self.logger.info("PaymentAgent 响应: %s", output, extra={**SAMPLED, "session_id": session_id})
             return str(output)
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             import traceback
             self.logger.error(f"PaymentAgent 处理消息失败: {str(e)}\n{traceback.format_exc()}")
@@ -415,6 +378,8 @@ class PaymentAgent:
                 original_data = payment_result["data"].copy()
                 original_data.update({"warning": "支付已创建但状态更新失败，请稍后查询状态"})
                 return {"success": True, "data": original_data}
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"创建支付失败: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -445,6 +410,8 @@ class PaymentAgent:
                 }
             else:
                 return refund_result
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"处理退款失败: {str(e)}")
             return {"success": False, "error": str(e)}
@@ -473,6 +440,8 @@ class PaymentAgent:
                 return {"success": True, "data": formatted_payments}
             else:
                 return result
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             self.logger.error(f"获取用户支付记录失败: {str(e)}")
             return {"success": False, "error": str(e)}
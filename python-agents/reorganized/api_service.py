@@ -3,29 +3,97 @@ import nest_asyncio
 nest_asyncio.apply() # 解决 asyncio.run() 错误
 
 import os
-from typing import Dict, Any
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Literal, Optional, Tuple
 from urllib.parse import urlparse
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager, suppress
 import logging # 【新增】日志
 import redis # 【新增】Redis 客户端用于测试连接
 
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from config import Config
 from models import ChatRequest, ChatResponse # 导入API模型
 from supervisor_agent import get_multi_agent_workflow # 【修改】导入多 Agent 工作流
-
-# 设置日志
-logging.basicConfig(level=logging.INFO)
+from metrics import INFLIGHT_REQUESTS, render_metrics, timed_stage
+from cassette import close_cassette
+from logging_setup import SAMPLED, setup_logging
+from deadline import request_deadline
+from accounting import get_accounting_store, utc_day
+
+# 设置日志（异步队列 + JSON 输出，见 logging_setup.py）
+setup_logging()
 logger = logging.getLogger(__name__)
 
+
+# --- 实例负载（Nacos 按此调整权重，见 services/nacos_registry.py） ---
+class CountingThreadPoolExecutor(ThreadPoolExecutor):
+    """记录已提交但尚未开始执行的任务数（queued），作为线程池排队深度。"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queued = 0
+        self._queued_lock = threading.Lock()
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def _dequeue(self, state: dict) -> None:
+        with self._queued_lock:
+            if not state["started"]:
+                state["started"] = True
+                self._queued -= 1
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        state = {"started": False}
+
+        def run():
+            self._dequeue(state)
+            return fn(*args, **kwargs)
+
+        with self._queued_lock:
+            self._queued += 1
+        try:
+            future = super().submit(run)
+        except BaseException:
+            self._dequeue(state)
+            raise
+        # 开始执行前被取消的任务不会运行 run()
+        future.add_done_callback(lambda _: self._dequeue(state))
+        return future
+
+
+# asyncio.to_thread 使用的默认线程池，在 lifespan 中安装到事件循环
+executor = CountingThreadPoolExecutor(thread_name_prefix="agent-worker")
+_inflight_requests = 0
+
+
+@contextmanager
+def track_inflight():
+    global _inflight_requests
+    _inflight_requests += 1
+    try:
+        yield
+    finally:
+        _inflight_requests -= 1
+
+
+def load_counters() -> Tuple[int, int]:
+    """（处理中的 /chat 请求数，线程池排队数）"""
+    return _inflight_requests, executor.queued
+
+
 # --- FastAPI 应用实例 ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 应用启动时执行的代码
+    asyncio.get_running_loop().set_default_executor(executor)
     try:
         Config.validate()
     except ValueError as e:
@@ -58,18 +126,51 @@ async def lifespan(app: FastAPI):
     else:
         logger.info("ℹ️ 未配置 PRODUCT_API_BASE_URL，将使用硬编码商品数据。")
 
-    # 【修改】初始化多 Agent 工作流
-    await get_multi_agent_workflow()
-    logger.info("多 Agent 工作流初始化完成。")
+    if Config.CASSETTE_MODE != "off":
+        logger.info(f"ℹ️ Cassette 模式: {Config.CASSETTE_MODE}，文件: {Config.CASSETTE_PATH}")
+
+    # 【修改】初始化多 Agent 工作流（lazy 模式下子代理在首次使用时构建，可选后台预热）
+    workflow = await get_multi_agent_workflow()
+    warmup_task = None
+    if Config.STARTUP_MODE == "lazy":
+        if Config.STARTUP_WARMUP:
+            warmup_task = asyncio.create_task(workflow.warm_up())
+        logger.info(f"多 Agent 工作流已就绪（lazy 模式，后台预热: {Config.STARTUP_WARMUP}）。")
+    else:
+        logger.info("多 Agent 工作流初始化完成。")
+    # 会话分层存储的后台维护（空闲会话降级到冷归档）
+    maintenance_task = asyncio.create_task(workflow.checkpointer.run_maintenance())
+    # 工作流就绪后再注册到 Nacos，避免网关把流量转发到尚未初始化完成的实例
+    registration = None
+    discovery_task = None
+    if Config.DISCOVERY_ENABLED:
+        from services.endpoint_pool import run_discovery_refresh
+        discovery_task = asyncio.create_task(run_discovery_refresh())
+    if Config.NACOS_ENABLED:
+        from services.nacos_registry import NacosRegistration
+        registration = NacosRegistration(load_probe=load_counters)
+        await registration.start()
 
     yield # 在这里，应用开始处理请求
 
-    # 应用关闭时执行的代码
+    # 应用关闭时执行的代码：先从 Nacos 注销，不再接收新流量
+    if registration is not None:
+        await registration.stop()
+    # 后台任务取消后等待其结束：维护任务中进行的 SQLite 写入完成后才关闭连接，发现任务的 finally 得以关闭客户端
+    for task in (discovery_task, warmup_task, maintenance_task):
+        if task is not None and not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    workflow.checkpointer.close()
     if Config.USE_EXTERNAL_PRODUCT_API:
         from services.product_api_client import get_product_api_client
         product_client = await get_product_api_client()
         await product_client.close()
         logger.info("--- Product API Client closed ---")
+    if Config.CASSETTE_MODE != "off":
+        close_cassette()
+        logger.info(f"--- Cassette closed: {Config.CASSETTE_PATH} ({Config.CASSETTE_MODE}) ---")
     logger.info("--- Application shutdown complete ---")
 
 
@@ -108,19 +209,46 @@ async def chat_endpoint(request: ChatRequest):
     user_id = request.user_id
 
     try:
-        workflow = await get_multi_agent_workflow()
-        final_response_text = await workflow.invoke_workflow(user_input, session_id, user_id)
-        print(f"DEBUG: chat_endpoint returning: {final_response_text}") # 添加日志
+        # 本轮的时间预算从这里开始计算，随上下文传递到路由、子代理、工具与下游调用
+        with INFLIGHT_REQUESTS.track_inprogress(), track_inflight(), timed_stage("chat"), \
+                request_deadline(Config.REQUEST_DEADLINE_SECONDS):
+            workflow = await get_multi_agent_workflow()
+            final_response_text = await workflow.invoke_workflow(user_input, session_id, user_id)
+        logger.debug("chat_endpoint returning: %s", final_response_text, extra={**SAMPLED, "session_id": session_id})
         return ChatResponse(response=final_response_text, session_id=session_id)
 
     except Exception as e:
-        logger.error(f"处理请求时发生错误 (Session ID: {session_id}): {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"处理请求时发生错误: {e}", extra={"session_id": session_id})
         raise HTTPException(status_code=500, detail=f"内部服务器错误: {e}")
 
+@app.get("/health")
+async def health_endpoint():
+    """存活/就绪探针：应用完成启动即返回，附带已加载的子代理列表"""
+    workflow = await get_multi_agent_workflow()
+    return {"status": "ok", "startup_mode": Config.STARTUP_MODE, "agents_loaded": sorted(workflow.agents)}
+
+@app.get("/accounting/top")
+async def accounting_top_endpoint(kind: Literal["session", "user"] = "session",
+                                  limit: int = Query(20, ge=1, le=500),
+                                  day: Optional[str] = Query(None, pattern=r"^\d{8}$")):
+    """当天（或 day=YYYYMMDD，UTC）token 用量最多的会话 / 用户及其用量计数"""
+    if not Config.ACCOUNTING_ENABLED:
+        raise HTTPException(status_code=404, detail="用量统计未启用（ACCOUNTING_ENABLED=false）")
+    day = day or utc_day()
+    try:
+        items = await asyncio.to_thread(get_accounting_store().top, kind, limit, day)
+    except redis.RedisError as e:
+        raise HTTPException(status_code=503, detail=f"读取用量统计失败: {e}")
+    return {"kind": kind, "day": day, "items": items}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus 指标抓取端点"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 def run_fastapi():
-    uvicorn.run(app, host="0.0.0.0", port=8085)
+    uvicorn.run(app, host="0.0.0.0", port=Config.SERVICE_PORT)
 
 # --- 运行 FastAPI 应用 ---
 if __name__ == "__main__":
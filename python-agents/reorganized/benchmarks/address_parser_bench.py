@@ -0,0 +1,169 @@
+# benchmarks/address_parser_bench.py
+"""
+本地地址解析基准：用行政区划表随机生成带标注的收货信息语料（多种书写格式、全角 / 半角、
+简称 / 全称、字段顺序打乱），外加一组手写样例，统计各字段准确率、整体可直接下单比例
+（confidence 达到阈值且姓名 / 电话 / 地址全部正确）、回退率与单条解析延迟。
+
+用法:
+    python benchmarks/address_parser_bench.py --samples 2000 --seed 7
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+
+os.environ.setdefault("SILICONFLOW_API_KEY", "offline-benchmark")
+
+from address_parser import parse_address, _alias
+from config import Config
+from data.regions import MUNICIPALITIES, PROVINCE_CITIES, CITY_DISTRICTS
+
+NAMES = ["张伟", "王芳", "李娜", "刘洋", "陈静", "杨帆", "赵磊", "黄丽", "周杰", "吴敏", "徐强", "孙悦",
+         "马超", "朱婷", "胡斌", "郭靖", "欧阳娜娜", "诸葛明", "林先生", "王女士"]
+ROADS = ["人民路", "解放大道", "中山北路", "建设街", "文三路", "长江东路", "科技园南路", "新华街道幸福路"]
+BUILDINGS = ["阳光小区", "金地花园", "国贸大厦", "万科城", "翠苑一区", ""]
+# 格式模板：{n} 姓名 {p} 电话 {a} 地址
+TEMPLATES = [
+    "{n}，{p}，{a}",
+    "{n} {p} {a}",
+    "收货人：{n}\n电话：{p}\n地址：{a}",
+    "{a} {n} {p}",
+    "{p} {a} {n}",
+    "收件人:{n};手机号:{p};详细地址:{a}",
+    "{n}/{p}/{a}",
+]
+
+# 手写样例：(文本, 期望姓名, 期望电话, 期望 detail)
+HANDWRITTEN: List[Tuple[str, str, str, str]] = [
+    ("张三，13800138000，广东省深圳市南山区科技园8栋", "张三", "13800138000", "广东省深圳市南山区科技园8栋"),
+    ("收货人：李四 手机：139-1234-5678 地址：北京市朝阳区建国路88号2号楼1201",
+     "李四", "13912345678", "北京市朝阳区建国路88号2号楼1201"),
+    ("上海浦东新区张江路100弄5号302室 王五 15012345678", "王五", "15012345678", "上海市浦东新区张江路100弄5号302室"),
+    ("欧阳娜娜 +86 186 0000 1111 辽宁朝阳双塔区友谊大街3号",
+     "欧阳娜娜", "18600001111", "辽宁省朝阳市双塔区友谊大街3号"),
+    ("赵先生，0755-88889999，深圳福田区华强北路1002号", "赵先生", "0755-88889999", "广东省深圳市福田区华强北路1002号"),
+    ("１３８００００１１１１ 杭州市西湖区文三路４７８号 周杰", "周杰", "13800001111", "浙江省杭州市西湖区文三路478号"),
+    ("收件人:江小白,电话:13611112222,地址:江苏省苏州市工业园区星湖街328号",
+     "江小白", "13611112222", "江苏省苏州市工业园区星湖街328号"),
+    ("吉林省吉林市船营区北京路5号 孙悦 13300001234", "孙悦", "13300001234", "吉林省吉林市船营区北京路5号"),
+    # 信息不全，应回退到 LLM / 追问用户
+    ("麻烦送到我家，电话13900001111", "", "13900001111", ""),
+    ("寄给小王 老地址就行", "", "", ""),
+]
+
+
+def _random_phone(rng: random.Random) -> Tuple[str, str]:
+    digits = f"1{rng.choice('3456789')}{rng.randint(0, 9)}{rng.randint(0, 99999999):08d}"
+    style = rng.randrange(3)
+    if style == 1:
+        return f"{digits[:3]}-{digits[3:7]}-{digits[7:]}", digits
+    if style == 2:
+        return f"+86 {digits[:3]} {digits[3:7]} {digits[7:]}", digits
+    return digits, digits
+
+
+def _random_region(rng: random.Random) -> Tuple[str, str]:
+    """返回 (书写形式, 规范形式) 的省市区前缀。"""
+    province = rng.choice([p for p, cities in PROVINCE_CITIES.items() if cities])
+    cities = PROVINCE_CITIES[province].split()
+    short = rng.random() < 0.3
+
+    def written(name: str) -> str:
+        return (_alias(name) or name) if short else name
+
+    if province in MUNICIPALITIES:
+        district = rng.choice(cities)
+        return written(province) + district, province + district
+
+    city = rng.choice(cities)
+    districts = CITY_DISTRICTS.get(city, "").split()
+    district = rng.choice(districts) if districts else rng.choice(["城关镇", ""])
+    text = ("" if rng.random() < 0.15 else written(province)) + written(city) + district
+    return text, province + city + district
+
+
+def build_corpus(samples: int, seed: int) -> List[Tuple[str, str, str, str]]:
+    rng = random.Random(seed)
+    corpus = list(HANDWRITTEN)
+    for _ in range(samples):
+        name = rng.choice(NAMES)
+        phone_text, phone = _random_phone(rng)
+        region_text, region = _random_region(rng)
+        street = f"{rng.choice(ROADS)}{rng.randint(1, 999)}号{rng.choice(BUILDINGS)}"
+        if rng.random() < 0.5:
+            street += f"{rng.randint(1, 30)}栋{rng.randint(101, 2505)}室"
+        text = rng.choice(TEMPLATES).format(n=name, p=phone_text, a=region_text + street)
+        if rng.random() < 0.2:
+            text = text.translate(str.maketrans("0123456789,:;", "０１２３４５６７８９，：；"))
+        corpus.append((text, name, phone, region + street))
+    return corpus
+
+
+def run(corpus: List[Tuple[str, str, str, str]]) -> Dict[str, float]:
+    hits = {"name": 0, "phone": 0, "detail": 0, "all": 0}
+    accepted = accepted_correct = 0
+    latencies = []
+    for text, name, phone, detail in corpus:
+        start = time.perf_counter()
+        parsed = parse_address(text)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        result = parsed.as_dict()
+        ok = {"name": result["name"] == name, "phone": result["phone"] == phone, "detail": result["detail"] == detail}
+        for key, value in ok.items():
+            hits[key] += value
+        hits["all"] += all(ok.values())
+        if parsed.confidence >= Config.ADDRESS_PARSER_MIN_CONFIDENCE:
+            accepted += 1
+            accepted_correct += all(ok.values())
+
+    total = len(corpus)
+    latencies.sort()
+    return {
+        "samples": total,
+        **{f"acc_{key}": value / total for key, value in hits.items()},
+        "local_rate": accepted / total,
+        "llm_fallback_rate": 1 - accepted / total,
+        "local_precision": accepted_correct / accepted if accepted else 0.0,
+        "p50_us": statistics.median(latencies),
+        "p99_us": latencies[int(total * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地地址解析准确率与延迟基准")
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--show-errors", type=int, default=0, help="打印前 N 条解析错误样例")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.samples, args.seed)
+    parse_address(corpus[0][0])  # 预热正则与前缀树
+    report = run(corpus)
+
+    print(f"样本数: {report['samples']}（阈值 {Config.ADDRESS_PARSER_MIN_CONFIDENCE}）")
+    for key in ("acc_name", "acc_phone", "acc_detail", "acc_all"):
+        print(f"  {key:<18}{report[key]:.2%}")
+    print(f"  本地直接下单比例     {report['local_rate']:.2%}（其中完全正确 {report['local_precision']:.2%}）")
+    print(f"  回退 LLM 比例       {report['llm_fallback_rate']:.2%}")
+    print(f"  解析延迟 p50 / p99  {report['p50_us']:.1f} / {report['p99_us']:.1f} µs")
+
+    if args.show_errors:
+        shown = 0
+        for text, name, phone, detail in corpus:
+            result = parse_address(text).as_dict()
+            if result != {"name": name, "phone": phone, "detail": detail}:
+                print(f"  ✗ {text!r}\n    期望 {name} {phone} {detail}\n    实际 {result}")
+                shown += 1
+                if shown >= args.show_errors:
+                    break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# benchmarks/checkpoint_codec_bench.py
+"""
+检查点编码基准：对比旧 JSON（msg.dict()）、msgpack、msgpack + zstd（无字典 / 共享字典）
+在 10 / 100 / 1000 条消息的会话上的字节数与编解码耗时。
+
+会话内容按压测场景合成（用户输入 + 导购推荐 / 订单 JSON / 闲聊回复）；
+字典用另一批随机种子的会话训练，避免在测试样本上训练。
+
+用法:
+    python benchmarks/checkpoint_codec_bench.py --sizes 10 100 1000
+    # 从线上 Redis 抽样检查点训练字典并写入文件，供 CHECKPOINT_ZSTD_DICTS 使用
+    python benchmarks/checkpoint_codec_bench.py --train-dict checkpoint.zdict --redis-url redis://host:6379/0
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Callable, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+
+os.environ.setdefault("SILICONFLOW_API_KEY", "offline-benchmark")
+
+import msgpack
+import zstandard
+from langchain_core.messages import HumanMessage, AIMessage
+
+import checkpoint_codec
+from benchmarks.scenarios import SCENARIOS
+from checkpoint_codec import pack_checkpoint, decode_checkpoint, VERSION_MSGPACK, VERSION_MSGPACK_ZSTD
+from config import Config
+from data.product_db import PRODUCT_DATABASE
+from models import FinalResponse, Recommendation
+from tools import render_final_response
+
+USER_INPUTS = [text for turns in SCENARIOS.values() for text in turns]
+CHITCHAT_REPLIES = [
+    "你好呀！我是小购，随时帮您找好物~ 今天想找什么呢？👗👟📱",
+    "您是想了解：\n1️⃣ 商品推荐\n2️⃣ 订单问题\n3️⃣ 支付帮助\n回复数字就好~ ✨",
+]
+
+
+def _guide_reply(rng: random.Random) -> str:
+    products = rng.sample(PRODUCT_DATABASE, 3)
+    return render_final_response(FinalResponse(
+        demand_analysis=f"用户希望购买{products[0]['category']}，关注性价比与口碑",
+        search_keyword=products[0]["category"],
+        recommendations=[Recommendation(
+            product_name=p["name"], product_id=str(p["id"]), price=float(p["price"]),
+            reasons=[p["features"], f"{p['brand']}品牌，售后有保障"],
+        ) for p in products],
+    ))
+
+
+def _order_reply(rng: random.Random) -> str:
+    product = rng.choice(PRODUCT_DATABASE)
+    order = {
+        "id": f"ORD{rng.randint(1, 10 ** 8):08d}", "userId": f"user-{rng.randint(1, 10 ** 5)}",
+        "status": "PENDING_PAYMENT", "totalAmount": float(product["price"]),
+        "shippingAddress": "张三，13800138000，广东省深圳市南山区科技园8栋",
+        "items": [{"productId": str(product["id"]), "productName": product["name"], "quantity": 1,
+                   "unitPrice": float(product["price"])}],
+        "createAt": datetime.now(timezone.utc).isoformat(),
+    }
+    return f"订单创建成功：{json.dumps(order, ensure_ascii=False)}"
+
+
+def build_checkpoint(messages: int, rng: random.Random) -> Dict[str, Any]:
+    history = []
+    for index in range(messages):
+        if index % 2 == 0:
+            history.append(HumanMessage(content=rng.choice(USER_INPUTS)))
+        else:
+            reply = rng.choices([_guide_reply, _order_reply, lambda r: r.choice(CHITCHAT_REPLIES)],
+                                weights=[0.5, 0.3, 0.2])[0](rng)
+            history.append(AIMessage(content=reply))
+    return {
+        "v": 1, "ts": datetime.now(timezone.utc).isoformat(), "channel_values": {"chat_history": history},
+        "channel_versions": {}, "seen": {}, "metadata": {}, "parent_config": None,
+    }
+
+
+def train_dictionary(samples: List[bytes], size: int) -> zstandard.ZstdCompressionDict:
+    return zstandard.train_dictionary(size, samples)
+
+
+def _samples_from_redis(url: str, limit: int) -> List[bytes]:
+    """从 Redis 抽样已有检查点（任意版本），统一转成 msgpack 载荷作为训练样本。"""
+    import redis
+
+    client = redis.Redis.from_url(url)
+    samples = []
+    for key in client.scan_iter("langgraph:checkpoint:*", count=1000):
+        data = client.get(key)
+        if data:
+            samples.append(pack_checkpoint(decode_checkpoint(data)))
+        if len(samples) >= limit:
+            break
+    return samples
+
+
+def _timeit(fn: Callable[[], Any], repeat: int) -> float:
+    """返回单次调用耗时的中位数（微秒）。"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1e6)
+    return statistics.median(timings)
+
+
+def _configure(codec: str, zstd: bool, dict_path: str = "") -> None:
+    Config.CHECKPOINT_CODEC = codec
+    Config.CHECKPOINT_ZSTD_ENABLED = zstd
+    Config.CHECKPOINT_ZSTD_DICTS = dict_path
+    checkpoint_codec._zstd = None
+
+
+def run(sizes: List[int], dict_path: str, repeat: int, seed: int) -> List[Tuple[int, str, int, float, float]]:
+    variants = [("json", "json", False, ""), ("msgpack", "msgpack", False, ""),
+                ("msgpack+zstd", "msgpack", True, ""), ("msgpack+zstd+dict", "msgpack", True, dict_path)]
+    rows = []
+    for size in sizes:
+        checkpoint = build_checkpoint(size, random.Random(seed + size))
+        for name, codec, zstd, path in variants:
+            _configure(codec, zstd, path)
+            data = checkpoint_codec.encode_checkpoint(checkpoint)
+            restored = decode_checkpoint(data)
+            assert [m.content for m in restored["channel_values"]["chat_history"]] == \
+                   [m.content for m in checkpoint["channel_values"]["chat_history"]]
+            encode_us = _timeit(lambda: checkpoint_codec.encode_checkpoint(checkpoint), repeat)
+            decode_us = _timeit(lambda: decode_checkpoint(data), repeat)
+            rows.append((size, name, len(data), encode_us, decode_us))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检查点编码字节数与耗时基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="每个会话的消息数")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--dict-size", type=int, default=16 * 1024, help="zstd 字典大小（字节）")
+    parser.add_argument("--train-sessions", type=int, default=500, help="训练字典使用的会话数")
+    parser.add_argument("--train-dict", default=None, help="只训练字典并写入该路径")
+    parser.add_argument("--redis-url", default=None, help="从该 Redis 抽样检查点训练字典，不指定时使用合成会话")
+    args = parser.parse_args()
+
+    if args.redis_url:
+        samples = _samples_from_redis(args.redis_url, args.train_sessions)
+    else:
+        # 训练样本的消息数覆盖短会话到长会话，与测试会话使用不同的随机种子
+        rng = random.Random(args.seed * 1000 + 1)
+        samples = [pack_checkpoint(build_checkpoint(rng.choice([2, 4, 10, 30]), rng))
+                   for _ in range(args.train_sessions)]
+    dictionary = train_dictionary(samples, args.dict_size)
+
+    if args.train_dict:
+        with open(args.train_dict, "wb") as f:
+            f.write(dictionary.as_bytes())
+        print(f"已写入字典 {args.train_dict}（{len(dictionary.as_bytes())} 字节，ID {dictionary.dict_id()}，"
+              f"样本 {len(samples)} 个）")
+        return
+
+    dict_path = os.path.join(project_root, "benchmarks", ".checkpoint_bench.zdict")
+    with open(dict_path, "wb") as f:
+        f.write(dictionary.as_bytes())
+    try:
+        rows = run(args.sizes, dict_path, args.repeat, args.seed)
+    finally:
+        os.remove(dict_path)
+
+    print(f"版本字节: msgpack={VERSION_MSGPACK:#04x} msgpack+zstd={VERSION_MSGPACK_ZSTD:#04x}；"
+          f"zstd level {Config.CHECKPOINT_ZSTD_LEVEL}，字典 {args.dict_size} 字节")
+    print(f"{'消息数':<8}{'编码':<20}{'字节数':>10}{'相对JSON':>10}{'编码 µs':>10}{'解码 µs':>10}")
+    baseline = {}
+    for size, name, length, encode_us, decode_us in rows:
+        baseline.setdefault(size, length)
+        print(f"{size:<8}{name:<20}{length:>10}{length / baseline[size]:>10.1%}{encode_us:>10.0f}{decode_us:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
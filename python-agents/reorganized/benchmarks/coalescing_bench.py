@@ -0,0 +1,131 @@
+# benchmarks/coalescing_bench.py
+"""
+下游请求合并基准：模拟流量高峰时多个会话在同一时刻查询相同数据
+（同一用户的订单 / 支付、同一订单、同一分类、重叠的商品ID），
+分别在 COALESCE_ENABLED 开 / 关下统计实际发往下游的请求数与查询耗时。
+
+用法:
+    python benchmarks/coalescing_bench.py --concurrency 50 --waves 10 --users 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter as CollectionCounter
+from typing import Dict, Any, List
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+
+os.environ.setdefault("SILICONFLOW_API_KEY", "offline-benchmark")
+
+import uvicorn
+from prometheus_client import REGISTRY
+
+from benchmarks.fake_services import create_app, FailureInjector
+from benchmarks.load_test import _free_port, _wait_ready
+from config import Config
+from data.product_db import PRODUCT_DATABASE
+from agents.order_agent import OrderServiceAPI
+from agents.payment_agent import PaymentServiceAPI
+from services.product_api_client import ProductAPIClient
+
+CATEGORIES = sorted({p["category"] for p in PRODUCT_DATABASE})
+PRODUCT_IDS = [str(p["id"]) for p in PRODUCT_DATABASE]
+
+
+def _downstream_counts() -> Dict[str, float]:
+    counts: Dict[str, float] = CollectionCounter()
+    for family in REGISTRY.collect():
+        if family.name != "agent_downstream_latency_seconds":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_count"):
+                counts[sample.labels["service"]] += sample.value
+    return counts
+
+
+async def _session(rng: random.Random, order_ids: List[str], order_api, payment_api, product_client) -> None:
+    """一个会话在高峰时刻发起的一组查询。"""
+    index = rng.randrange(len(order_ids))
+    user_id = f"user-{index}"
+    await asyncio.gather(
+        order_api.get_orders_by_user(user_id),
+        payment_api.get_payments_by_user(user_id),
+        order_api.get_order_by_id(order_ids[index]),
+        product_client.search_by_category(rng.choice(CATEGORIES)),
+        product_client.get_products_by_ids(rng.sample(PRODUCT_IDS, rng.randint(1, 3))),
+    )
+
+
+async def run(base_url: str, enabled: bool, order_ids: List[str], args) -> Dict[str, Any]:
+    Config.COALESCE_ENABLED = enabled
+    order_api = OrderServiceAPI(f"{base_url}/order")
+    payment_api = PaymentServiceAPI(f"{base_url}/payment")
+    product_client = ProductAPIClient(base_url)
+    rng = random.Random(args.seed)
+
+    before = _downstream_counts()
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for _ in range(args.waves):
+        wave_start = time.perf_counter()
+        await asyncio.gather(*(_session(rng, order_ids, order_api, payment_api, product_client)
+                               for _ in range(args.concurrency)))
+        latencies.append(time.perf_counter() - wave_start)
+        # 每波之间清空商品缓存，只衡量合并本身的效果
+        product_client._cache.clear()
+    elapsed = time.perf_counter() - start
+    await product_client.close()
+
+    after = _downstream_counts()
+    calls = {service: int(after[service] - before.get(service, 0)) for service in after}
+    return {"calls": calls, "total": sum(calls.values()), "elapsed": elapsed,
+            "wave_p50": sorted(latencies)[len(latencies) // 2]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下游请求合并基准")
+    parser.add_argument("--concurrency", type=int, default=50, help="每波同时发起查询的会话数")
+    parser.add_argument("--waves", type=int, default=10)
+    parser.add_argument("--users", type=int, default=5, help="活跃用户数，越小重复请求越多")
+    parser.add_argument("--service-latency-ms", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    port = _free_port()
+    app = create_app(FailureInjector(args.service_latency_ms, args.service_latency_ms / 2, 0.0))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="FakeServices", daemon=True).start()
+    base_url = f"http://127.0.0.1:{port}"
+
+    async def _main():
+        await _wait_ready(f"{base_url}/health")
+        # 每个活跃用户预置一个订单，使按订单ID的查询命中
+        seed_api = OrderServiceAPI(f"{base_url}/order")
+        order_ids = []
+        for index in range(args.users):
+            created = await seed_api.create_order(f"user-{index}", [], "张三，13800138000，北京市朝阳区", 1.0)
+            order_ids.append(created["data"]["id"])
+        return [await run(base_url, enabled, order_ids, args) for enabled in (False, True)]
+
+    off, on = asyncio.run(_main())
+    server.should_exit = True
+
+    sessions = args.concurrency * args.waves
+    print(f"会话数: {sessions}（每波 {args.concurrency}，共 {args.waves} 波，活跃用户 {args.users}）")
+    print(f"{'模式':<10}{'下游请求':>10}{'order':>8}{'payment':>9}{'product':>9}{'每波 p50':>11}{'总耗时':>9}")
+    for name, report in (("off", off), ("on", on)):
+        calls = report["calls"]
+        print(f"{name:<10}{report['total']:>10}{calls.get('order', 0):>8}{calls.get('payment', 0):>9}"
+              f"{calls.get('product', 0):>9}{report['wave_p50']:>10.3f}s{report['elapsed']:>8.2f}s")
+    if off["total"]:
+        print(f"下游请求减少 {1 - on['total'] / off['total']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
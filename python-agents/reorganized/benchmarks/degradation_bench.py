@@ -0,0 +1,163 @@
+# benchmarks/degradation_bench.py
+"""
+排队压力下模型降级的基准：离线启动 fake_llm（主模型慢、快速模型快），按“低负载 → 过载 → 低负载”
+三个阶段并发发起 chitchat / guide 两类 LLM 调用（交替），分别在关闭与开启降级时运行，
+报告每个阶段的调用数、使用降级配置的比例、端到端 p50 / p95 延迟（含排队）以及降级 / 恢复的切换次数。
+
+并发上限 LLM_MAX_CONCURRENCY 默认设为 4，使过载阶段出现排队；为便于观察，
+EWMA 衰减与最短降级时长也按参数缩短。
+
+用法:
+    python benchmarks/degradation_bench.py --main-ms 800 --fast-ms 100 --low 2 --high 16 --phase-seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+
+os.environ.setdefault("SILICONFLOW_API_KEY", "offline-benchmark")
+os.environ.setdefault("PROMPT_HUB_ENABLED", "false")
+
+import httpx
+from langchain_core.messages import HumanMessage, AIMessage
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "您当前是智能购物小助手【小购】，性格亲切活泼。"),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("user", "{input}"),
+])
+HISTORY = [HumanMessage(content=f"第{i}轮提问") if i % 2 == 0 else AIMessage(content=f"第{i}轮回答") for i in range(20)]
+STAGES = ("chitchat", "guide")
+
+
+def _start_fake_llm(main_ms: float, fast_ms: float, fast_model: str) -> Tuple[subprocess.Popen, str]:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen([sys.executable, os.path.join(current_dir, "fake_llm.py"), "--port", str(port),
+                                "--median-ms", str(main_ms), "--sigma", "0.2",
+                                "--model-latency", f"{fast_model}={fast_ms}"], cwd=project_root)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base}/health", timeout=0.5)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    return process, f"{base}/v1"
+
+
+async def call(stage: str) -> Tuple[bool, float]:
+    """按当前生效配置调用一次，返回 (是否为降级配置, 端到端耗时)。"""
+    from model_profiles import active_profile, get_profile, llm_for, trim_history
+
+    profile = active_profile(stage)
+    start = time.perf_counter()
+    await (PROMPT | llm_for(profile)).ainvoke({"input": "你好", "chat_history": trim_history(profile, HISTORY)})
+    return profile != get_profile(stage), time.perf_counter() - start
+
+
+async def run_phase(concurrency: int, seconds: float) -> List[Tuple[str, bool, float]]:
+    results: List[Tuple[str, bool, float]] = []
+    stop_at = time.monotonic() + seconds
+
+    async def worker(index: int):
+        n = index
+        while time.monotonic() < stop_at:
+            stage = STAGES[n % len(STAGES)]
+            degraded, elapsed = await call(stage)
+            results.append((stage, degraded, elapsed))
+            n += 1
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return results
+
+
+def _p(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def _switches() -> Dict[str, int]:
+    from metrics import MODEL_DEGRADATIONS
+
+    counts: Dict[str, int] = {}
+    for metric in MODEL_DEGRADATIONS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                key = f"{sample.labels['stage']}:{sample.labels['direction']}"
+                counts[key] = int(sample.value)
+    return counts
+
+
+async def run(enabled: bool, phases: List[Tuple[str, int]], seconds: float):
+    import model_degradation
+    from config import Config
+
+    Config.DEGRADE_ENABLED = enabled
+    model_degradation._monitor = None
+    before = _switches()
+    rows = []
+    for name, concurrency in phases:
+        rows.append((name, concurrency, await run_phase(concurrency, seconds)))
+    after = _switches()
+    switches = {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+    return rows, switches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="排队压力下的模型降级基准（离线）")
+    parser.add_argument("--main-ms", type=float, default=800.0, help="LLM_MODEL_NAME 的延迟中位数")
+    parser.add_argument("--fast-ms", type=float, default=100.0, help="LLM_FAST_MODEL_NAME 的延迟中位数")
+    parser.add_argument("--low", type=int, default=2, help="低负载阶段的并发数")
+    parser.add_argument("--high", type=int, default=16, help="过载阶段的并发数")
+    parser.add_argument("--phase-seconds", type=float, default=10.0)
+    parser.add_argument("--max-concurrency", type=int, default=4, help="LLM_MAX_CONCURRENCY")
+    parser.add_argument("--hold-seconds", type=float, default=3.0, help="DEGRADE_MIN_HOLD_SECONDS")
+    parser.add_argument("--decay-seconds", type=float, default=2.0, help="DEGRADE_EWMA_DECAY_SECONDS")
+    args = parser.parse_args()
+
+    os.environ["LLM_MAX_CONCURRENCY"] = str(args.max_concurrency)
+    os.environ["DEGRADE_MIN_HOLD_SECONDS"] = str(args.hold_seconds)
+    os.environ["DEGRADE_EWMA_DECAY_SECONDS"] = str(args.decay_seconds)
+    from config import Config
+
+    # 让 chitchat 与 guide 的主配置都使用 LLM_MODEL_NAME，降级时切到快速模型
+    if not Config.MODEL_PROFILES:
+        Config.MODEL_PROFILES = json.dumps({"chitchat": {"model": Config.LLM_MODEL_NAME}})
+
+    process, Config.SILICONFLOW_API_BASE = _start_fake_llm(args.main_ms, args.fast_ms, Config.LLM_FAST_MODEL_NAME)
+    phases = [("低负载", args.low), ("过载", args.high), ("恢复", args.low)]
+    try:
+        reports = [(label, asyncio.run(run(enabled, phases, args.phase_seconds)))
+                   for label, enabled in (("不降级", False), ("降级", True))]
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+    print(f"主模型 {args.main_ms:.0f}ms，快速模型 {args.fast_ms:.0f}ms，LLM_MAX_CONCURRENCY={args.max_concurrency}，"
+          f"每阶段 {args.phase_seconds:.0f}s")
+    for label, (rows, switches) in reports:
+        print(f"\n[{label}]")
+        print(f"{'阶段':<8}{'并发':>6}{'调用数':>8}{'降级占比':>10}{'p50':>8}{'p95':>8}")
+        for name, concurrency, results in rows:
+            latencies = [elapsed for _, _, elapsed in results]
+            degraded = sum(1 for _, d, _ in results if d) / len(results) if results else 0.0
+            p50 = statistics.median(latencies) if latencies else 0.0
+            print(f"{name:<8}{concurrency:>6}{len(results):>8}{degraded:>10.0%}{p50:>8.3f}{_p(latencies, 0.95):>8.3f}")
+        print("切换次数: " + (", ".join(f"{k}={v}" for k, v in sorted(switches.items())) or "无"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+# benchmarks/fake_llm.py
+"""
+离线压测用的 OpenAI 兼容 LLM 服务。
+按请求内容返回脚本化的路由决策 / 工具调用 / 最终回复，并按对数正态分布注入延迟。
+usage 中按消息边界模拟服务商的前缀缓存（prompt_tokens_details.cached_tokens）。
+
+用法: python benchmarks/fake_llm.py --port 18000 --median-ms 800 --sigma 0.4
+      # 按请求中的模型名单独设置延迟（模拟快速模型与推理模型的差异）
+      python benchmarks/fake_llm.py --model-latency Qwen/Qwen2.5-7B-Instruct=150
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+ORDER_KEYWORDS = ("订单", "下单", "购买", "买", "取消", "发货")
+PAYMENT_KEYWORDS = ("支付", "付款", "退款", "付钱")
+GUIDE_KEYWORDS = ("推荐", "耳机", "手机", "笔记本", "手表", "平板", "音箱", "找", "便宜", "预算")
+
+
+class LatencyModel:
+    """对数正态延迟分布，median_ms 为中位数，sigma 控制长尾。"""
+
+    def __init__(self, median_ms: float, sigma: float):
+        self.median_ms = median_ms
+        self.sigma = sigma
+
+    def sample(self) -> float:
+        if self.median_ms <= 0:
+            return 0.0
+        return random.lognormvariate(0, self.sigma) * self.median_ms / 1000.0
+
+
+class PrefixCache:
+    """
+    模拟服务商的前缀缓存：对“模型 + tools + 前 N 条消息”逐条累积哈希，
+    已见过的最长前缀中的消息内容计为 cached_tokens（与 prompt_tokens 同样按 2 字符 / token 估算）。
+    """
+
+    def __init__(self, max_entries: int = 50000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, None]" = OrderedDict()
+
+    def cached_tokens(self, payload: Dict[str, Any]) -> int:
+        digest = hashlib.sha256(json.dumps([payload.get("model"), payload.get("tools")], sort_keys=True,
+                                           ensure_ascii=False).encode()).hexdigest()
+        cached_chars = chars = 0
+        hit = True
+        for message in payload.get("messages", []):
+            digest = hashlib.sha256((digest + json.dumps(message, sort_keys=True, ensure_ascii=False)).encode()).hexdigest()
+            chars += len(str(message.get("content") or ""))
+            if hit and digest in self._entries:
+                self._entries.move_to_end(digest)
+                cached_chars = chars
+            else:
+                hit = False
+                self._entries[digest] = None
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return cached_chars // 2
+
+
+def _last_user_content(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            return content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+    return ""
+
+
+def _tool_results_since_last_user(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    results = []
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            break
+        if message.get("role") == "tool":
+            results.append(message)
+    return list(reversed(results))
+
+
+def _route(text: str) -> str:
+    if any(k in text for k in PAYMENT_KEYWORDS):
+        return "payment"
+    if any(k in text for k in ORDER_KEYWORDS):
+        return "order"
+    if any(k in text for k in GUIDE_KEYWORDS):
+        return "guide"
+    return "__end__"
+
+
+def _first_arg_name(tool: Dict[str, Any]) -> str:
+    properties = tool["function"].get("parameters", {}).get("properties", {})
+    return next(iter(properties), "__arg1")
+
+
+def _extract_user_id(messages: List[Dict[str, Any]]) -> str:
+    for message in reversed(messages):
+        match = re.search(r"User ID:\s*(\S+)", str(message.get("content") or ""))
+        if match:
+            return match.group(1)
+    return "bench-user"
+
+
+def _plan(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """根据请求决定脚本化的回复：content 或 tool_calls。"""
+    messages = payload.get("messages", [])
+    user_text = _last_user_content(messages)
+
+    # 1. 结构化输出（监管者路由）
+    response_format = payload.get("response_format") or {}
+    schema_name = (response_format.get("json_schema") or {}).get("name")
+    tools = {t["function"]["name"]: t for t in payload.get("tools", []) if t.get("type") == "function"}
+    if schema_name == "Router":
+        return {"content": json.dumps({"next": _route(user_text)})}
+    if "Router" in tools:
+        return {"tool_calls": [("Router", {"next": _route(user_text)})]}
+
+    # 2. 子代理：按工具集合与已返回的工具结果推进脚本
+    tool_results = _tool_results_since_last_user(messages)
+    if "search_products" in tools:
+        if not tool_results:
+            query = json.dumps({"name": "耳机"}, ensure_ascii=False)
+            return {"tool_calls": [("search_products", {_first_arg_name(tools["search_products"]): query})]}
+        if len(tool_results) == 1 and "format_final_response" in tools:
+            return {"tool_calls": [("format_final_response", {
+                "demand_analysis": "用户想要一款性价比高的耳机",
+                "search_keyword": "耳机",
+                "recommendations": [{"product_name": "无线蓝牙耳机", "product_id": "1", "price": 299.0,
+                                     "reasons": ["主动降噪", "价格适中"]}],
+            })]}
+        return {"content": "为您推荐：无线蓝牙耳机 (product_id: 1)，价格 ¥299，主动降噪。"}
+
+    if "create_order" in tools and "下单" in user_text:
+        if not tool_results:
+            order = {
+                "user_id": _extract_user_id(messages),
+                "products": [{"product_id": "1", "quantity": 1}],
+                "address": user_text.split("下单", 1)[1].strip("，, "),
+            }
+            properties = tools["create_order"]["function"].get("parameters", {}).get("properties", {})
+            # 兼容单字符串参数的旧版工具：整个订单编码为 JSON 字符串
+            args = order if "products" in properties else {
+                _first_arg_name(tools["create_order"]): json.dumps(order, ensure_ascii=False)}
+            return {"tool_calls": [("create_order", args)]}
+        return {"content": "订单已创建成功，请尽快完成支付。"}
+
+    if "get_orders_by_user" in tools:
+        if not tool_results:
+            user_id = _extract_user_id(messages)
+            return {"tool_calls": [("get_orders_by_user", {_first_arg_name(tools["get_orders_by_user"]): user_id})]}
+        return {"content": "已为您查询到订单信息，当前订单状态为待支付。"}
+
+    if "get_user_payments" in tools:
+        if not tool_results:
+            user_id = _extract_user_id(messages)
+            return {"tool_calls": [("get_user_payments", {_first_arg_name(tools["get_user_payments"]): user_id})]}
+        return {"content": "已为您查询到支付记录，最近一笔支付已成功。"}
+
+    # 3. 收货信息解析链路（输出 JSON）
+    system_text = " ".join(str(m.get("content") or "") for m in messages if m.get("role") == "system")
+    if "提取收货人" in system_text:
+        phone = re.search(r"1\d{10}", user_text)
+        return {"content": json.dumps({"name": "张三", "phone": phone.group(0) if phone else "",
+                                       "detail": user_text[phone.end():].strip(" ，,") if phone else user_text},
+                                      ensure_ascii=False)}
+
+    # 4. 闲聊 / 其他链路
+    return {"content": "你好呀！我是小购，随时帮您找好物~ 今天想找什么呢？"}
+
+
+def _completion(payload: Dict[str, Any], plan: Dict[str, Any], cached_tokens: int = 0) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"role": "assistant", "content": plan.get("content")}
+    finish_reason = "stop"
+    if plan.get("tool_calls"):
+        message["tool_calls"] = [
+            {"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+             "function": {"name": name, "arguments": json.dumps(args, ensure_ascii=False)}}
+            for name, args in plan["tool_calls"]
+        ]
+        finish_reason = "tool_calls"
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in payload.get("messages", []))
+    prompt_tokens = max(1, prompt_chars // 2)
+    completion_tokens = max(1, len(json.dumps(message, ensure_ascii=False)) // 2)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "fake-model"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens,
+                  "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)}},
+    }
+
+
+def _stream_chunks(completion: Dict[str, Any], include_usage: bool):
+    """将完整回复拆成 OpenAI SSE 流式分片。"""
+    choice = completion["choices"][0]
+    message = choice["message"]
+    base = {k: completion[k] for k in ("id", "created", "model")}
+    base["object"] = "chat.completion.chunk"
+
+    delta: Dict[str, Any] = {"role": "assistant", "content": message.get("content") or ""}
+    if message.get("tool_calls"):
+        delta["tool_calls"] = [{"index": i, **call} for i, call in enumerate(message["tool_calls"])]
+    chunks = [
+        {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]},
+        {**base, "choices": [{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}]},
+    ]
+    if include_usage:
+        chunks.append({**base, "choices": [], "usage": completion["usage"]})
+    for chunk in chunks:
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_app(latency: LatencyModel, router_latency: Optional[LatencyModel] = None,
+               model_latency: Optional[Dict[str, LatencyModel]] = None) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI-compatible LLM")
+    prefix_cache = PrefixCache()
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        plan = _plan(payload)
+        is_router = "Router" in json.dumps(payload.get("response_format") or {}) or any(
+            t.get("function", {}).get("name") == "Router" for t in payload.get("tools", []))
+        model = router_latency if (is_router and router_latency) else latency
+        # 按模型名配置的延迟优先
+        model = (model_latency or {}).get(payload.get("model"), model)
+        await asyncio.sleep(model.sample())
+        completion = _completion(payload, plan, prefix_cache.cached_tokens(payload))
+        if payload.get("stream"):
+            include_usage = bool((payload.get("stream_options") or {}).get("include_usage"))
+            return StreamingResponse(_stream_chunks(completion, include_usage), media_type="text/event-stream")
+        return completion
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线 OpenAI 兼容 LLM 替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--median-ms", type=float, default=800.0, help="子代理调用延迟中位数")
+    parser.add_argument("--sigma", type=float, default=0.4, help="对数正态分布 sigma")
+    parser.add_argument("--router-median-ms", type=float, default=None, help="路由调用延迟中位数（默认同上）")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=MEDIAN_MS",
+                        help="按模型名设置延迟中位数，可重复指定，优先于以上两项")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    router_latency = LatencyModel(args.router_median_ms, args.sigma) if args.router_median_ms is not None else None
+    model_latency = {}
+    for item in args.model_latency:
+        name, median_ms = item.rsplit("=", 1)
+        model_latency[name] = LatencyModel(float(median_ms), args.sigma)
+    app = create_app(LatencyModel(args.median_ms, args.sigma), router_latency, model_latency)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
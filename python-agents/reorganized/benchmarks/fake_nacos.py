@@ -0,0 +1,167 @@
+# benchmarks/fake_nacos.py
+"""
+离线测试用的 Nacos 命名服务替身，实现 services/nacos_client.py 用到的 Open API v1 子集：
+注册 / 更新 / 注销实例、临时实例心跳、实例列表与登录。
+
+- 临时实例超过 --expire-seconds 未收到心跳时标记为不健康，不出现在 healthyOnly 列表中；
+- --register 可预先注册持久实例（如离线订单 / 支付服务），供服务发现使用，地址可带路径前缀；
+- GET /debug/instances 返回全部实例（含权重与 metadata），便于观察负载上报。
+
+用法:
+    python benchmarks/fake_nacos.py --port 18848 --register order-service=127.0.0.1:18084/order \
+        --register order-service=127.0.0.1:18085/order --register payment-service=127.0.0.1:18084/payment
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, Tuple, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+DEFAULT_GROUP = "DEFAULT_GROUP"
+
+
+async def _params(request: Request) -> Dict[str, str]:
+    """Nacos Open API 的参数既可以在查询串中，也可以是表单。"""
+    params = dict(request.query_params)
+    if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+        form = await request.form()
+        params.update({k: str(v) for k, v in form.items()})
+    return params
+
+
+class NamingStore:
+    """按 (命名空间, 分组@@服务) 保存实例，实例键为 ip:port。"""
+
+    def __init__(self, expire_seconds: float):
+        self.expire_seconds = expire_seconds
+        self.services: Dict[Tuple[str, str], Dict[str, Dict[str, Any]]] = {}
+
+    @staticmethod
+    def _service_key(params: Dict[str, str]) -> Tuple[str, str]:
+        name = params["serviceName"]
+        if "@@" not in name:
+            name = f"{params.get('groupName') or DEFAULT_GROUP}@@{name}"
+        return params.get("namespaceId") or "public", name
+
+    def upsert(self, params: Dict[str, str], update_only: bool = False) -> bool:
+        instances = self.services.setdefault(self._service_key(params), {})
+        key = f"{params['ip']}:{params['port']}"
+        instance = instances.get(key)
+        if instance is None:
+            if update_only:
+                return False
+            instance = instances[key] = {
+                "ip": params["ip"], "port": int(params["port"]), "weight": 1.0, "metadata": {},
+                "clusterName": params.get("clusterName") or "DEFAULT", "enabled": True,
+                "ephemeral": params.get("ephemeral", "true") == "true",
+            }
+        if params.get("weight") is not None:
+            instance["weight"] = float(params["weight"])
+        if params.get("metadata"):
+            instance["metadata"] = json.loads(params["metadata"])
+        instance["lastBeat"] = time.monotonic()
+        return True
+
+    def remove(self, params: Dict[str, str]) -> None:
+        self.services.get(self._service_key(params), {}).pop(f"{params['ip']}:{params['port']}", None)
+
+    def beat(self, params: Dict[str, str]) -> bool:
+        beat = json.loads(params.get("beat") or "{}")
+        instance = self.services.get(self._service_key(params), {}).get(f"{beat.get('ip')}:{beat.get('port')}")
+        if instance is None:
+            return False
+        instance["lastBeat"] = time.monotonic()
+        return True
+
+    def hosts(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        healthy_only = params.get("healthyOnly", "false") == "true"
+        clusters = {c for c in (params.get("clusters") or "").split(",") if c}
+        now = time.monotonic()
+        result = []
+        for instance in self.services.get(self._service_key(params), {}).values():
+            healthy = not instance["ephemeral"] or now - instance["lastBeat"] <= self.expire_seconds
+            if (healthy_only and not healthy) or (clusters and instance["clusterName"] not in clusters):
+                continue
+            host = {k: v for k, v in instance.items() if k != "lastBeat"}
+            result.append({**host, "healthy": healthy, "instanceId": f"{host['ip']}#{host['port']}"})
+        return result
+
+
+def create_app(expire_seconds: float = 15.0, preregistered: Dict[str, List[str]] = None) -> FastAPI:
+    app = FastAPI(title="Fake Nacos")
+    store = NamingStore(expire_seconds)
+    app.state.store = store
+    for service, addresses in (preregistered or {}).items():
+        for address in addresses:
+            # IP:PORT/前缀 形式的地址把前缀写入 metadata 的 context-path（如离线替身的 /order）
+            host, _, context_path = address.partition("/")
+            ip, port = host.rsplit(":", 1)
+            metadata = json.dumps({"context-path": f"/{context_path}"}) if context_path else None
+            store.upsert({"serviceName": service, "ip": ip, "port": port, "ephemeral": "false",
+                          "metadata": metadata})
+
+    @app.post("/nacos/v1/auth/login")
+    async def login():
+        return {"accessToken": "fake-token", "tokenTtl": 18000, "globalAdmin": False}
+
+    @app.post("/nacos/v1/ns/instance")
+    async def register(request: Request):
+        store.upsert(await _params(request))
+        return "ok"
+
+    @app.put("/nacos/v1/ns/instance")
+    async def update(request: Request):
+        if not store.upsert(await _params(request), update_only=True):
+            return {"code": 400, "message": "instance not found"}
+        return "ok"
+
+    @app.delete("/nacos/v1/ns/instance")
+    async def deregister(request: Request):
+        store.remove(await _params(request))
+        return "ok"
+
+    @app.put("/nacos/v1/ns/instance/beat")
+    async def beat(request: Request):
+        found = store.beat(await _params(request))
+        return {"clientBeatInterval": 5000, "code": 10200 if found else 20404, "lightBeatEnabled": False}
+
+    @app.get("/nacos/v1/ns/instance/list")
+    async def list_instances(request: Request):
+        params = dict(request.query_params)
+        namespace, name = NamingStore._service_key(params)
+        return {"name": name, "clusters": params.get("clusters", ""), "hosts": store.hosts(params),
+                "cacheMillis": 10000, "lastRefTime": int(time.time() * 1000)}
+
+    @app.get("/debug/instances")
+    async def debug_instances():
+        return {f"{namespace}/{name}": list(instances.values())
+                for (namespace, name), instances in store.services.items()}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线 Nacos 命名服务替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18848)
+    parser.add_argument("--expire-seconds", type=float, default=15.0, help="临时实例无心跳后判定不健康的时间")
+    parser.add_argument("--register", action="append", default=[], metavar="SERVICE=IP:PORT[/PREFIX]",
+                        help="预先注册的持久实例，可重复指定")
+    args = parser.parse_args()
+
+    preregistered: Dict[str, List[str]] = {}
+    for item in args.register:
+        service, address = item.split("=", 1)
+        preregistered.setdefault(service, []).append(address)
+    uvicorn.run(create_app(args.expire_seconds, preregistered), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# benchmarks/fake_services.py
+"""
+离线压测用的订单 / 支付 / 商品 REST 服务替身，路由与网关路径保持一致
+（/order/api/orders、/payment/api/payments、/product/api/products）。
+支持注入延迟与按比例返回 503 以模拟下游故障。
+
+用法: python benchmarks/fake_services.py --port 18084 --latency-ms 30 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sys
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(current_dir, '..')))
+
+from data.product_db import PRODUCT_DATABASE
+
+
+class FailureInjector:
+    """按配置为每个请求注入延迟和错误。"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+
+    async def apply(self) -> bool:
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+        if delay:
+            await asyncio.sleep(delay)
+        return random.random() < self.error_rate
+
+
+def _as_catalog_product(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "_id": str(p["id"]), "id": str(p["id"]), "sku": f"SKU-{p['id']:04d}", "name": p["name"],
+        "description": p["features"], "category": p["category"], "brand": p["brand"],
+        "price": float(p["price"]), "stock": 100, "status": "AVAILABLE", "tags": [p["features"]],
+    }
+
+
+def create_app(injector: FailureInjector) -> FastAPI:
+    app = FastAPI(title="Fake order/payment/product services")
+    orders: Dict[str, Dict[str, Any]] = {}
+    payments: Dict[str, Dict[str, Any]] = {}
+    order_ids = itertools.count(1)
+    payment_ids = itertools.count(1)
+    catalog = [_as_catalog_product(p) for p in PRODUCT_DATABASE]
+
+    @app.middleware("http")
+    async def inject_failures(request: Request, call_next):
+        if request.url.path != "/health" and await injector.apply():
+            return JSONResponse(status_code=503, content={"error": "injected failure"})
+        return await call_next(request)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    # --- 订单服务 ---
+    @app.post("/order/api/orders")
+    async def create_order(body: Dict[str, Any]):
+        order_id = f"ORD{next(order_ids):08d}"
+        order = {**body, "id": order_id, "orderId": order_id, "createAt": datetime.now().isoformat()}
+        order.setdefault("status", "PENDING_PAYMENT")
+        orders[order_id] = order
+        return order
+
+    @app.get("/order/api/orders")
+    async def list_orders():
+        return list(orders.values())
+
+    @app.get("/order/api/orders/user/{user_id}")
+    async def orders_by_user(user_id: str):
+        return [o for o in orders.values() if str(o.get("userId")) == user_id]
+
+    @app.get("/order/api/orders/{order_id}")
+    async def get_order(order_id: str):
+        if order_id not in orders:
+            raise HTTPException(status_code=404, detail="order not found")
+        return orders[order_id]
+
+    @app.put("/order/api/orders/{order_id}")
+    async def update_order(order_id: str, body: Dict[str, Any]):
+        if order_id not in orders:
+            raise HTTPException(status_code=404, detail="order not found")
+        orders[order_id].update(body)
+        return orders[order_id]
+
+    @app.patch("/order/api/orders/{order_id}/status/{status}")
+    @app.put("/order/api/orders/{order_id}/status/{status}")
+    async def update_order_status(order_id: str, status: str):
+        if order_id not in orders:
+            raise HTTPException(status_code=404, detail="order not found")
+        orders[order_id]["status"] = status
+        return orders[order_id]
+
+    @app.delete("/order/api/orders/{order_id}")
+    async def delete_order(order_id: str):
+        orders.pop(order_id, None)
+        return {}
+
+    # --- 支付服务 ---
+    @app.post("/payment/api/payments")
+    async def create_payment(body: Dict[str, Any]):
+        payment_id = f"PAY{next(payment_ids):08d}"
+        payment = {**body, "id": payment_id, "createAt": datetime.now().isoformat()}
+        payments[payment_id] = payment
+        return payment
+
+    @app.get("/payment/api/payments/user/{user_id}")
+    async def payments_by_user(user_id: str):
+        return [p for p in payments.values() if str(p.get("userId")) == user_id]
+
+    @app.get("/payment/api/payments/order/{order_id}")
+    async def payments_by_order(order_id: str):
+        return [p for p in payments.values() if str(p.get("orderId")) == order_id]
+
+    @app.get("/payment/api/payments/{payment_id}")
+    async def get_payment(payment_id: str):
+        if payment_id not in payments:
+            raise HTTPException(status_code=404, detail="payment not found")
+        return payments[payment_id]
+
+    @app.patch("/payment/api/payments/{payment_id}/{status}")
+    async def update_payment_status(payment_id: str, status: str):
+        if payment_id not in payments:
+            raise HTTPException(status_code=404, detail="payment not found")
+        payments[payment_id]["status"] = status
+        return payments[payment_id]
+
+    # --- 商品服务 ---
+    @app.get("/product/api/products/search")
+    async def search_products(name: str = ""):
+        return [p for p in catalog if name.lower() in p["name"].lower()]
+
+    @app.get("/product/api/products/category/{category}")
+    async def by_category(category: str):
+        return [p for p in catalog if p["category"].lower() == category.lower()]
+
+    @app.get("/product/api/products/brand/{brand}")
+    async def by_brand(brand: str):
+        return [p for p in catalog if p["brand"].lower() == brand.lower()]
+
+    @app.get("/product/api/products/tag/{tag}")
+    async def by_tag(tag: str):
+        return [p for p in catalog if tag in p["tags"]]
+
+    @app.get("/product/api/products/available")
+    async def available():
+        return catalog
+
+    @app.get("/product/api/products/price-range")
+    async def price_range(minPrice: Optional[float] = None, maxPrice: Optional[float] = None):
+        return [p for p in catalog
+                if (minPrice is None or p["price"] >= minPrice) and (maxPrice is None or p["price"] <= maxPrice)]
+
+    @app.get("/product/api/products/batch")
+    async def batch(ids: str = ""):
+        wanted = set(filter(None, ids.split(",")))
+        return [p for p in catalog if p["id"] in wanted]
+
+    @app.get("/product/api/products/{product_id}")
+    async def get_product(product_id: str):
+        for p in catalog:
+            if p["id"] == product_id:
+                return p
+        raise HTTPException(status_code=404, detail="product not found")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线订单/支付/商品服务替身")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18084)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的请求比例")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    app = create_app(FailureInjector(args.latency_ms, args.jitter_ms, args.error_rate))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+# benchmarks/import_profile.py
+"""
+冷启动分析：
+1. 使用 `python -X importtime` 统计导入 api_service 的耗时，按累计 / 自身耗时以及顶层包汇总输出；
+2. 分别以 eager / lazy 启动模式拉起 API 服务，测量从进程启动到首个请求被接受（/health 返回 200）的时间，
+   以及随后首个 /chat 请求的耗时（lazy 模式下包含子代理的按需构建）。
+
+用法:
+    python benchmarks/import_profile.py --top 25
+    python benchmarks/import_profile.py --modes lazy --no-chat
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+import httpx
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+
+from benchmarks.load_test import _free_port, _start_fake_redis, _spawn
+
+
+def _base_env(redis_url: str, llm_base: str, services_base: str) -> Dict[str, str]:
+    env = os.environ.copy()
+    env.update({
+        "SILICONFLOW_API_KEY": "offline-benchmark",
+        "SILICONFLOW_API_BASE": llm_base,
+        "REDIS_URL": redis_url,
+        "PRODUCT_API_BASE_URL": f"{services_base}/product/api/products",
+        "ORDER_SERVICE_BASE_URL": f"{services_base}/order",
+        "PAYMENT_SERVICE_BASE_URL": f"{services_base}/payment",
+        "PROMPT_HUB_ENABLED": "false",
+        "LANGCHAIN_TRACING_V2": "false",
+        "PYTHONPATH": os.pathsep.join([os.path.dirname(project_root), project_root, env.get("PYTHONPATH", "")]),
+    })
+    return env
+
+
+# --- 导入耗时分析 ---
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """解析 -X importtime 输出，返回 [(模块名, 自身耗时us, 累计耗时us)]。"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def import_profile(module: str, env: Dict[str, str]) -> List[Tuple[str, int, int]]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=project_root, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def print_import_report(module: str, rows: List[Tuple[str, int, int]], top: int) -> Dict[str, Any]:
+    total_us = next((cumulative for name, _, cumulative in rows if name == module), 0)
+    by_package: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in rows:
+        by_package[name.split(".")[0]] += self_us
+
+    print(f"\n===== 导入耗时: {module}  总计 {total_us / 1000:.1f} ms，共 {len(rows)} 个模块 =====")
+    print(f"\n{'顶层包':<32}{'自身耗时合计(ms)':>18}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<32}{self_us / 1000:>18.1f}")
+    print(f"\n{'模块（按累计耗时）':<56}{'累计(ms)':>10}{'自身(ms)':>10}")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"{name[:55]:<56}{cumulative_us / 1000:>10.1f}{self_us / 1000:>10.1f}")
+    return {"module": module, "total_ms": round(total_us / 1000, 1),
+            "packages_ms": {k: round(v / 1000, 1) for k, v in sorted(by_package.items(), key=lambda i: -i[1])[:top]}}
+
+
+# --- 启动耗时测量 ---
+async def measure_startup(mode: str, env: Dict[str, str], with_chat: bool) -> Dict[str, Any]:
+    port = _free_port()
+    env = {**env, "STARTUP_MODE": mode}
+    start = time.perf_counter()
+    process = _spawn(["-m", "uvicorn", "api_service:app", "--host", "127.0.0.1", "--port", str(port),
+                      "--log-level", "warning"], env)
+    base = f"http://127.0.0.1:{port}"
+    result: Dict[str, Any] = {"mode": mode}
+    try:
+        async with httpx.AsyncClient() as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"API 进程提前退出（mode={mode}）")
+                if time.perf_counter() - start > 120:
+                    raise RuntimeError(f"API 未在 120s 内就绪（mode={mode}）")
+                try:
+                    if (await client.get(f"{base}/health", timeout=1.0)).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.02)
+            result["first_accepted_s"] = round(time.perf_counter() - start, 3)
+
+            if with_chat:
+                chat_start = time.perf_counter()
+                response = await client.post(f"{base}/chat", json={
+                    "user_input": "推荐一款降噪蓝牙耳机", "session_id": f"startup-{mode}-{port}", "user_id": "user-1",
+                }, timeout=120.0)
+                result["first_chat_s"] = round(time.perf_counter() - chat_start, 3)
+                result["first_chat_status"] = response.status_code
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return result
+
+
+async def run(args) -> None:
+    redis_url, fake_redis = _start_fake_redis()
+    processes: List[subprocess.Popen] = []
+    llm_port, services_port = _free_port(), _free_port()
+    env = _base_env(redis_url, f"http://127.0.0.1:{llm_port}/v1", f"http://127.0.0.1:{services_port}")
+    try:
+        print_import_report(args.module, import_profile(args.module, env), args.top)
+
+        if args.chat:
+            processes.append(_spawn(["benchmarks/fake_llm.py", "--port", str(llm_port), "--median-ms", "0"]))
+            processes.append(_spawn(["benchmarks/fake_services.py", "--port", str(services_port),
+                                     "--latency-ms", "0", "--jitter-ms", "0"]))
+            await asyncio.sleep(1.0)
+
+        print(f"\n===== 启动耗时（{args.runs} 次取中位数） =====")
+        for mode in args.modes:
+            runs = [await measure_startup(mode, env, args.chat) for _ in range(args.runs)]
+            accepted = sorted(r["first_accepted_s"] for r in runs)[len(runs) // 2]
+            line = f"{mode:<8} 首个请求被接受: {accepted:.3f}s"
+            if args.chat:
+                chat = sorted(r["first_chat_s"] for r in runs)[len(runs) // 2]
+                line += f"   首个 /chat 耗时: {chat:.3f}s (status={runs[-1]['first_chat_status']})"
+            print(line)
+    finally:
+        for process in processes:
+            process.terminate()
+        fake_redis.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导入耗时与冷启动分析")
+    parser.add_argument("--module", default="api_service", help="要分析导入耗时的模块")
+    parser.add_argument("--top", type=int, default=20, help="输出前 N 项")
+    parser.add_argument("--modes", nargs="+", default=["eager", "lazy"], choices=["eager", "lazy"])
+    parser.add_argument("--runs", type=int, default=3, help="每种模式的启动次数")
+    parser.add_argument("--no-chat", dest="chat", action="store_false", help="不测量首个 /chat 请求")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
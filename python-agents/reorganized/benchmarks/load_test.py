@@ -0,0 +1,351 @@
+# benchmarks/load_test.py
+"""
+离线压测入口：启动 LLM / 下游服务 / Redis 替身与 API 服务，按目标 RPS 以多会话、多轮对话驱动 /chat，
+最后汇总吞吐、端到端与分阶段 p50/p95/p99 延迟以及错误率。
+
+用法:
+    python benchmarks/load_test.py --rps 5 --duration 60 --llm-median-ms 800 --service-error-rate 0.02
+    python benchmarks/load_test.py --redis-url redis://localhost:6379/15   # 使用本地真实 Redis
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+
+from benchmarks.scenarios import SCENARIOS, pick_scenario
+
+# 报告中展开的直方图及其分组标签
+REPORTED_HISTOGRAMS = {
+    "agent_stage_latency_seconds": ("stage",),
+    "agent_llm_latency_seconds": ("stage",),
+    "agent_tool_latency_seconds": ("tool",),
+    "agent_downstream_latency_seconds": ("service", "endpoint"),
+    "agent_turn_iterations": ("agent",),
+    "agent_turn_tokens": ("agent",),
+}
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_fake_redis() -> Tuple[str, Any]:
+    """在后台线程中启动 fakeredis 的 TCP 服务，返回连接 URL。"""
+    from fakeredis import TcpFakeServer
+
+    port = _free_port()
+    server = TcpFakeServer(("127.0.0.1", port), server_type="redis")
+    threading.Thread(target=server.serve_forever, name="FakeRedis", daemon=True).start()
+    return f"redis://127.0.0.1:{port}/0", server
+
+
+def _spawn(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, *args], cwd=project_root, env=env or os.environ.copy())
+
+
+async def _wait_ready(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url, timeout=1.0)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"服务未在 {timeout}s 内就绪: {url}")
+
+
+# --- 指标解析 ---
+def _histogram_buckets(metrics_text: str) -> Dict[Tuple[str, Tuple[str, ...]], Dict[float, float]]:
+    """解析 /metrics 文本，返回 {(指标名, 分组标签值): {le: 累计计数}}。"""
+    result: Dict[Tuple[str, Tuple[str, ...]], Dict[float, float]] = defaultdict(lambda: defaultdict(float))
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name not in REPORTED_HISTOGRAMS:
+            continue
+        group_labels = REPORTED_HISTOGRAMS[family.name]
+        for sample in family.samples:
+            if not sample.name.endswith("_bucket"):
+                continue
+            key = (family.name, tuple(sample.labels.get(label, "") for label in group_labels))
+            result[key][float(sample.labels["le"])] += sample.value
+    return result
+
+
+def _quantile(buckets: Dict[float, float], q: float) -> float:
+    """基于累计分桶做线性插值估算分位数。"""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if total <= 0:
+        return 0.0
+    target = q * total
+    prev_bound, prev_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= target:
+            if bound == float("inf"):
+                return prev_bound
+            span = count - prev_count
+            fraction = (target - prev_count) / span if span else 1.0
+            return prev_bound + (bound - prev_bound) * fraction
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def stage_report(before: str, after: str) -> List[Dict[str, Any]]:
+    """对比压测前后的直方图，得到压测期间各阶段的样本数与分位数。"""
+    start, end = _histogram_buckets(before), _histogram_buckets(after)
+    rows = []
+    for key, buckets in sorted(end.items()):
+        delta = {le: count - start.get(key, {}).get(le, 0.0) for le, count in buckets.items()}
+        total = delta.get(float("inf"), 0.0)
+        if total <= 0:
+            continue
+        metric, labels = key
+        rows.append({
+            "metric": metric, "labels": "/".join(labels), "count": int(total),
+            "p50": _quantile(delta, 0.50), "p95": _quantile(delta, 0.95), "p99": _quantile(delta, 0.99),
+        })
+    return rows
+
+
+def _prompt_cache_tokens(metrics_text: str) -> Dict[Tuple[str, str], float]:
+    counts: Dict[Tuple[str, str], float] = defaultdict(float)
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != "agent_llm_prompt_cache_tokens":
+            continue
+        for sample in family.samples:
+            if sample.name.endswith("_total"):
+                counts[(sample.labels["stage"], sample.labels["result"])] += sample.value
+    return counts
+
+
+def prompt_cache_report(before: str, after: str) -> List[Dict[str, Any]]:
+    """压测期间各阶段 prompt token 的前缀缓存命中情况。"""
+    start, end = _prompt_cache_tokens(before), _prompt_cache_tokens(after)
+    rows = []
+    for stage in sorted({stage for stage, _ in end}):
+        cached = end.get((stage, "cached"), 0.0) - start.get((stage, "cached"), 0.0)
+        uncached = end.get((stage, "uncached"), 0.0) - start.get((stage, "uncached"), 0.0)
+        if cached + uncached > 0:
+            rows.append({"stage": stage, "cached": int(cached), "uncached": int(uncached),
+                         "hit_ratio": round(cached / (cached + uncached), 4)})
+    return rows
+
+
+# --- 负载驱动 ---
+class LoadDriver:
+    """开环负载：按目标 RPS 发出请求，每个会话内的多轮输入严格串行。"""
+
+    def __init__(self, base_url: str, rps: float, duration: float, timeout: float, seed: int):
+        self.base_url = base_url
+        self.rps = rps
+        self.duration = duration
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.sent = 0
+        self.completed_sessions = 0
+        self._idle_sessions: List[Dict[str, Any]] = []
+
+    def _next_session(self) -> Dict[str, Any]:
+        if self._idle_sessions:
+            return self._idle_sessions.pop(0)
+        scenario = pick_scenario(self.rng)
+        return {"session_id": f"bench-{self.rng.getrandbits(48):012x}", "user_id": f"user-{self.rng.randint(1, 500)}",
+                "turns": list(SCENARIOS[scenario]), "scenario": scenario}
+
+    async def _run_turn(self, client: httpx.AsyncClient, session: Dict[str, Any]) -> None:
+        user_input = session["turns"].pop(0)
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{self.base_url}/chat", json={
+                "user_input": user_input, "session_id": session["session_id"], "user_id": session["user_id"],
+            }, timeout=self.timeout)
+            if response.status_code == 200:
+                self.latencies.append(time.perf_counter() - start)
+            else:
+                self.errors[f"http_{response.status_code}"] += 1
+        except httpx.TimeoutException:
+            self.errors["timeout"] += 1
+        except httpx.HTTPError as e:
+            self.errors[type(e).__name__] += 1
+
+        if session["turns"]:
+            self._idle_sessions.append(session)
+        else:
+            self.completed_sessions += 1
+
+    async def run(self) -> float:
+        interval = 1.0 / self.rps
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=100)
+        async with httpx.AsyncClient(limits=limits) as client:
+            tasks = []
+            started = time.perf_counter()
+            next_fire = started
+            while time.perf_counter() - started < self.duration:
+                tasks.append(asyncio.create_task(self._run_turn(client, self._next_session())))
+                self.sent += 1
+                next_fire += interval
+                await asyncio.sleep(max(0.0, next_fire - time.perf_counter()))
+            await asyncio.gather(*tasks)
+            return time.perf_counter() - started
+
+
+def print_report(driver: LoadDriver, elapsed: float, stages: List[Dict[str, Any]],
+                 prompt_cache: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    ok = len(driver.latencies)
+    failed = sum(driver.errors.values())
+    summary = {
+        "sent": driver.sent, "ok": ok, "failed": failed, "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(ok / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round(failed / driver.sent, 4) if driver.sent else 0.0,
+        "errors": dict(driver.errors), "completed_sessions": driver.completed_sessions,
+        "latency_s": {q: round(_percentile(driver.latencies, v), 4)
+                      for q, v in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))},
+        "stages": stages,
+        "prompt_cache": prompt_cache or [],
+    }
+    print("\n===== 压测结果 =====")
+    print(f"请求: {driver.sent}  成功: {ok}  失败: {failed}  错误率: {summary['error_rate']:.2%}  "
+          f"吞吐: {summary['throughput_rps']} req/s  耗时: {summary['elapsed_s']}s")
+    if driver.errors:
+        print(f"错误分布: {dict(driver.errors)}")
+    lat = summary["latency_s"]
+    print(f"端到端延迟: p50={lat['p50']:.3f}s  p95={lat['p95']:.3f}s  p99={lat['p99']:.3f}s")
+    print(f"\n{'指标':<36}{'标签':<44}{'样本':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for row in stages:
+        print(f"{row['metric']:<36}{row['labels'][:43]:<44}{row['count']:>7}"
+              f"{row['p50']:>9.3f}{row['p95']:>9.3f}{row['p99']:>9.3f}")
+    if prompt_cache:
+        print(f"\n{'Prompt 前缀缓存':<16}{'命中 token':>12}{'未命中 token':>14}{'命中率':>10}")
+        for row in prompt_cache:
+            print(f"{row['stage']:<16}{row['cached']:>12}{row['uncached']:>14}{row['hit_ratio']:>10.1%}")
+    return summary
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    processes: List[subprocess.Popen] = []
+    fake_redis = None
+    try:
+        redis_url = args.redis_url
+        if not redis_url:
+            redis_url, fake_redis = _start_fake_redis()
+
+        llm_port, services_port, api_port = _free_port(), _free_port(), _free_port()
+        # 回放模式下 LLM 与下游服务均由 cassette 提供，无需启动替身
+        replaying = args.cassette_mode == "replay"
+        if not replaying:
+            llm_args = ["benchmarks/fake_llm.py", "--port", str(llm_port), "--median-ms", str(args.llm_median_ms),
+                        "--sigma", str(args.llm_sigma), "--seed", str(args.seed)]
+            if args.router_median_ms is not None:
+                llm_args += ["--router-median-ms", str(args.router_median_ms)]
+            processes.append(_spawn(llm_args))
+            processes.append(_spawn([
+                "benchmarks/fake_services.py", "--port", str(services_port), "--latency-ms",
+                str(args.service_latency_ms), "--error-rate", str(args.service_error_rate), "--seed", str(args.seed),
+            ]))
+
+        services_base = f"http://127.0.0.1:{services_port}"
+        env = os.environ.copy()
+        env.update({
+            "SILICONFLOW_API_KEY": "offline-benchmark",
+            "SILICONFLOW_API_BASE": f"http://127.0.0.1:{llm_port}/v1",
+            "REDIS_URL": redis_url,
+            "PRODUCT_API_BASE_URL": f"{services_base}/product/api/products",
+            "ORDER_SERVICE_BASE_URL": f"{services_base}/order",
+            "PAYMENT_SERVICE_BASE_URL": f"{services_base}/payment",
+            "PROMPT_HUB_ENABLED": "false",
+            "SESSION_ARCHIVE_PATH": os.path.join(tempfile.mkdtemp(prefix="load_test_"), "sessions.db"),
+            "LANGCHAIN_TRACING_V2": "false",
+            "PYTHONPATH": os.pathsep.join([os.path.dirname(project_root), project_root, env.get("PYTHONPATH", "")]),
+        })
+        if args.cassette_mode != "off":
+            env.update({
+                "CASSETTE_MODE": args.cassette_mode,
+                "CASSETTE_PATH": os.path.abspath(args.cassette),
+                "CASSETTE_LATENCY_SCALE": str(args.cassette_latency_scale),
+            })
+        processes.append(_spawn(["-m", "uvicorn", "api_service:app", "--host", "127.0.0.1", "--port", str(api_port),
+                                 "--log-level", "warning"], env))
+
+        api_base = f"http://127.0.0.1:{api_port}"
+        if not replaying:
+            await _wait_ready(f"http://127.0.0.1:{llm_port}/health")
+            await _wait_ready(f"{services_base}/health")
+        await _wait_ready(f"{api_base}/metrics", timeout=120.0)
+
+        async with httpx.AsyncClient() as client:
+            before = (await client.get(f"{api_base}/metrics")).text
+        driver = LoadDriver(api_base, args.rps, args.duration, args.timeout, args.seed)
+        elapsed = await driver.run()
+        async with httpx.AsyncClient() as client:
+            after = (await client.get(f"{api_base}/metrics")).text
+
+        summary = print_report(driver, elapsed, stage_report(before, after), prompt_cache_report(before, after))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+        return summary
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if fake_redis is not None:
+            fake_redis.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="离线 /chat 压测")
+    parser.add_argument("--rps", type=float, default=2.0, help="目标请求速率")
+    parser.add_argument("--duration", type=float, default=30.0, help="发压时长（秒）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="单请求超时（秒）")
+    parser.add_argument("--llm-median-ms", type=float, default=800.0)
+    parser.add_argument("--llm-sigma", type=float, default=0.4)
+    parser.add_argument("--router-median-ms", type=float, default=None)
+    parser.add_argument("--service-latency-ms", type=float, default=20.0)
+    parser.add_argument("--service-error-rate", type=float, default=0.0)
+    parser.add_argument("--redis-url", default=None, help="不指定时使用 fakeredis")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", default=None, help="将结果写入 JSON 文件")
+    parser.add_argument("--cassette", default="cassettes/load_test.jsonl.gz", help="cassette 文件路径")
+    parser.add_argument("--cassette-mode", choices=("off", "record", "replay"), default="off",
+                        help="record 录制本次压测的 LLM/下游交互；replay 不启动替身，直接回放")
+    parser.add_argument("--cassette-latency-scale", type=float, default=1.0, help="回放延迟倍率")
+    args = parser.parse_args()
+    asyncio.run(run_benchmark(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+# benchmarks/model_profile_bench.py
+"""
+按阶段模型配置的延迟基准：对 router / chitchat / guide / order / payment / parsing 各阶段的一次典型 LLM 调用，
+分别用旧配置（所有阶段均为 LLM_MODEL_NAME）与当前模型配置（model_profiles，含 MODEL_PROFILES 覆盖）
+各请求 --repeat 次，报告 p50 / p95 延迟与每次调用节省的时间。
+
+子代理阶段只测量执行循环中的单次 LLM 调用（绑定该阶段的工具），不含工具执行。
+
+用法:
+    # 使用 SILICONFLOW_API_BASE / SILICONFLOW_API_KEY 指向的真实服务
+    python benchmarks/model_profile_bench.py --repeat 10
+    # 离线：启动 fake_llm，并按模型名模拟延迟
+    python benchmarks/model_profile_bench.py --offline --main-ms 3000 --fast-ms 300
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, Any, List, Callable, Tuple
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.append(project_root)
+
+os.environ.setdefault("SILICONFLOW_API_KEY", "offline-benchmark")
+os.environ.setdefault("PROMPT_HUB_ENABLED", "false")
+
+import httpx
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+import model_profiles
+from config import Config
+from model_profiles import ModelProfile, STAGES, build_profiles, create_llm, _load_overrides
+
+ROUTER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是一个顶级智能客服调度中心。根据用户的最新请求和对话历史，将其分发给子代理："
+               "商品推荐选 'guide'，订单相关选 'order'，支付相关选 'payment'，问候闲聊选 '__end__'。"),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("user", "{input}"),
+])
+CHITCHAT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "您当前是智能购物小助手【小购】，性格亲切活泼，用表情符号增加亲和力 🌸"),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("user", "{input}"),
+])
+AGENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "你是电商平台的{role}助手，根据用户请求调用合适的工具。User ID: bench-user"),
+    MessagesPlaceholder(variable_name="chat_history"),
+    ("human", "{input}"),
+])
+PARSING_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", "从用户提供的收货信息中提取收货人、电话和详细地址。"
+               "输出JSON：{{\"name\": \"收货人\", \"phone\": \"电话\", \"detail\": \"省市区+街道门牌\"}}，"
+               "无法识别的字段输出空字符串，绝不虚构。"),
+    ("human", "{input}"),
+])
+
+
+def baseline_profiles() -> Dict[str, ModelProfile]:
+    """引入按阶段配置之前的设置：所有阶段使用 LLM_MODEL_NAME。"""
+    main, timeout = Config.LLM_MODEL_NAME, Config.LLM_TIMEOUT_SECONDS
+    return {
+        "router": ModelProfile(main, 0.0, None, timeout),
+        "chitchat": ModelProfile(main, 0.0, None, timeout),
+        "guide": ModelProfile(main, Config.LLM_TEMPERATURE, None, timeout),
+        "order": ModelProfile(main, Config.LLM_TEMPERATURE, 500, timeout),
+        "payment": ModelProfile(main, Config.LLM_TEMPERATURE, 500, timeout),
+        "parsing": ModelProfile(main, 0.0, None, timeout),
+    }
+
+
+def stage_calls() -> Dict[str, Tuple[Callable[[Any], Any], Dict[str, Any]]]:
+    """每个阶段的 (由 LLM 构建可执行链的函数, 输入)。"""
+    from supervisor_agent import Router
+    from agents.guide_agent import agent_tools
+    from agents.order_agent import OrderAgent
+    from agents.payment_agent import PaymentAgent
+
+    order_tools = OrderAgent()._agent_executor.tools
+    payment_tools = PaymentAgent()._agent_executor.tools
+    return {
+        "router": (lambda llm: ROUTER_PROMPT | llm.with_structured_output(Router),
+                   {"input": "推荐一款降噪蓝牙耳机", "chat_history": []}),
+        "chitchat": (lambda llm: CHITCHAT_PROMPT | llm, {"input": "你好，你都能做什么", "chat_history": []}),
+        "guide": (lambda llm: AGENT_PROMPT | llm.bind_tools(agent_tools),
+                  {"role": "商品推荐", "input": "推荐一款500元以内的降噪蓝牙耳机", "chat_history": []}),
+        "order": (lambda llm: AGENT_PROMPT | llm.bind_tools(order_tools),
+                  {"role": "订单", "input": "查一下我的订单", "chat_history": []}),
+        "payment": (lambda llm: AGENT_PROMPT | llm.bind_tools(payment_tools),
+                    {"role": "支付", "input": "查一下我的支付记录", "chat_history": []}),
+        "parsing": (lambda llm: PARSING_PROMPT | llm | JsonOutputParser(),
+                    {"input": "收货人张三 电话13800138000 广东省深圳市南山区科技园8栋"}),
+    }
+
+
+async def measure(chain, payload: Dict[str, Any], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await chain.ainvoke(payload)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _p(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _start_fake_llm(main_ms: float, fast_ms: float, fast_model: str) -> Tuple[subprocess.Popen, str]:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen([sys.executable, os.path.join(current_dir, "fake_llm.py"), "--port", str(port),
+                                "--median-ms", str(main_ms), "--sigma", "0.3",
+                                "--model-latency", f"{fast_model}={fast_ms}"], cwd=project_root)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            httpx.get(f"{base}/health", timeout=0.5)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    return process, f"{base}/v1"
+
+
+async def run(stages: List[str], repeat: int) -> List[Tuple[str, ModelProfile, ModelProfile, List[float], List[float]]]:
+    baseline = baseline_profiles()
+    current = build_profiles(_load_overrides(Config.MODEL_PROFILES))
+    calls = stage_calls()
+    rows = []
+    for stage in stages:
+        build, payload = calls[stage]
+        before = await measure(build(create_llm(baseline[stage])), payload, repeat)
+        after = await measure(build(create_llm(current[stage])), payload, repeat)
+        rows.append((stage, baseline[stage], current[stage], before, after))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按阶段模型配置的 LLM 延迟基准")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--offline", action="store_true", help="使用 fake_llm，按模型名模拟延迟")
+    parser.add_argument("--main-ms", type=float, default=3000.0, help="离线模式下 LLM_MODEL_NAME 的延迟中位数")
+    parser.add_argument("--fast-ms", type=float, default=300.0, help="离线模式下 LLM_FAST_MODEL_NAME 的延迟中位数")
+    args = parser.parse_args()
+
+    process = None
+    if args.offline:
+        process, Config.SILICONFLOW_API_BASE = _start_fake_llm(args.main_ms, args.fast_ms, Config.LLM_FAST_MODEL_NAME)
+        model_profiles._llms.clear()
+    try:
+        rows = asyncio.run(run(args.stages, args.repeat))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    print(f"LLM 服务: {Config.SILICONFLOW_API_BASE}，每个阶段每种配置 {args.repeat} 次")
+    print(f"{'阶段':<10}{'旧模型':<30}{'新模型':<30}{'旧 p50':>8}{'新 p50':>8}{'旧 p95':>8}{'新 p95':>8}{'节省 p50':>10}")
+    for stage, old, new, before, after in rows:
+        saved = statistics.median(before) - statistics.median(after)
+        print(f"{stage:<10}{old.model:<30}{new.model:<30}{statistics.median(before):>8.3f}"
+              f"{statistics.median(after):>8.3f}{_p(before, 0.95):>8.3f}{_p(after, 0.95):>8.3f}{saved:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+# benchmarks/scenarios.py
+"""压测会话脚本：每个场景是一组按顺序发送的多轮用户输入。"""
+import random
+from typing import List, Dict
+
+SCENARIOS: Dict[str, List[str]] = {
+    "browse": [
+        "你好",
+        "推荐一款降噪蓝牙耳机",
+        "有没有便宜一点的耳机推荐",
+    ],
+    "order_lookup": [
+        "帮我推荐一款轻薄笔记本",
+        "查一下我的订单",
+        "最近那个订单发货了吗",
+    ],
+    "order_create": [
+        "推荐一款降噪蓝牙耳机",
+        "就买第一款，下单，收货人张三，13800138000，广东省深圳市南山区科技园8栋",
+    ],
+    "payment_lookup": [
+        "查一下我的支付记录",
+        "最近一笔付款成功了吗",
+    ],
+    "chitchat": [
+        "你好",
+        "你都能做什么",
+    ],
+}
+
+# 各场景的抽样权重，近似线上流量构成
+SCENARIO_WEIGHTS: Dict[str, float] = {
+    "browse": 0.4,
+    "order_lookup": 0.25,
+    "order_create": 0.1,
+    "payment_lookup": 0.15,
+    "chitchat": 0.1,
+}
+
+
+def pick_scenario(rng: random.Random) -> str:
+    names = list(SCENARIO_WEIGHTS)
+    return rng.choices(names, weights=[SCENARIO_WEIGHTS[n] for n in names], k=1)[0]
@@ -0,0 +1,251 @@
+# cassette.py
+"""
+LLM 与下游 HTTP 调用的录制 / 回放层（cassette）。
+
+- record: 透传真实请求，并将每次请求/响应以及耗时写入 cassette 文件；重新录制会覆盖已有文件，避免旧交互排在新交互之前被回放；
+- replay: 不访问网络，按请求哈希返回录制的响应，并按原始耗时 × CASSETTE_LATENCY_SCALE 等待。
+
+cassette 文件为 gzip 压缩的 JSON Lines，每行一条交互，加载时按请求哈希建立索引；
+同一哈希的多次请求按录制顺序依次回放，用尽后重复最后一条。
+"""
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, Optional, List
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 只保留与回放相关的响应头，避免重复解压等问题
+_KEPT_HEADERS = ("content-type",)
+
+
+class CassetteMissError(httpx.TransportError):
+    """回放模式下 cassette 中不存在对应请求。"""
+
+
+def _canonical_body(body: Optional[bytes]) -> bytes:
+    if not body:
+        return b""
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode("utf-8")
+    except (ValueError, UnicodeDecodeError):
+        return body
+
+
+def request_key(method: str, url: str, body: Optional[bytes]) -> str:
+    """请求哈希：方法 + 路径与查询串 + 规范化请求体，不含主机，便于跨环境回放。"""
+    parts = urlsplit(str(url))
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+    digest = hashlib.sha256()
+    digest.update(method.upper().encode("utf-8"))
+    digest.update(b" ")
+    digest.update(target.encode("utf-8"))
+    digest.update(b"\n")
+    digest.update(_canonical_body(body))
+    return digest.hexdigest()[:32]
+
+
+def _encode_body(body: bytes) -> Dict[str, str]:
+    try:
+        return {"b": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(body).decode("ascii")}
+
+
+def _decode_body(entry: Dict[str, Any]) -> bytes:
+    if "b64" in entry:
+        return base64.b64decode(entry["b64"])
+    return entry.get("b", "").encode("utf-8")
+
+
+class Cassette:
+    """按请求哈希索引的交互存储。"""
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未知的 cassette 模式: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._index: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._file = None
+
+        if mode == "replay":
+            self._load()
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def _load(self) -> None:
+        count = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._index[entry["k"]].append(entry)
+                        count += 1
+            except (EOFError, json.JSONDecodeError):
+                # 录制进程未正常关闭时文件尾部可能不完整，保留已读取的部分
+                logger.warning(f"cassette 文件尾部不完整，已读取 {count} 条: {self.path}")
+        logger.info(f"cassette 已加载 {count} 条交互: {self.path}")
+
+    def lookup(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._index.get(key)
+            if not entries:
+                raise CassetteMissError(f"cassette 中没有匹配的请求: {key}")
+            position = self._cursor[key]
+            self._cursor[key] = position + 1
+            return entries[min(position, len(entries) - 1)]
+
+    def record(self, key: str, method: str, url: str, status: int, headers: Dict[str, str], body: bytes,
+               latency: float) -> None:
+        entry = {"k": key, "m": method.upper(), "u": urlsplit(str(url)).path, "s": status,
+                 "h": {k: v for k, v in headers.items() if k.lower() in _KEPT_HEADERS}, "l": round(latency, 4),
+                 **_encode_body(body)}
+        with self._lock:
+            self._index[key].append(entry)
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def replay_delay(self, entry: Dict[str, Any]) -> float:
+        return max(0.0, entry.get("l", 0.0) * self.latency_scale)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class CassetteAsyncTransport(httpx.AsyncBaseTransport):
+    """httpx 异步传输层：用于 ChatOpenAI 与 ProductAPIClient。"""
+
+    def __init__(self, cassette: Cassette, wrapped: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.wrapped = wrapped or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        key = request_key(request.method, str(request.url), body)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.lookup(key)
+            await asyncio.sleep(self.cassette.replay_delay(entry))
+            return httpx.Response(entry["s"], headers=entry.get("h", {}), content=_decode_body(entry),
+                                  request=request)
+
+        start = time.perf_counter()
+        response = await self.wrapped.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        self.cassette.record(key, request.method, str(request.url), response.status_code, dict(response.headers),
+                             content, time.perf_counter() - start)
+        headers = {k: v for k, v in response.headers.items() if k.lower() in _KEPT_HEADERS}
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self) -> None:
+        await self.wrapped.aclose()
+
+
+class CassetteAdapter(HTTPAdapter):
+    """requests 适配器：用于 OrderServiceAPI / PaymentServiceAPI 的 requests.Session。"""
+
+    def __init__(self, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        key = request_key(request.method, request.url, body)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.lookup(key)
+            time.sleep(self.cassette.replay_delay(entry))
+            response = requests.Response()
+            response.status_code = entry["s"]
+            response.headers = CaseInsensitiveDict(entry.get("h", {}))
+            response._content = _decode_body(entry)
+            response.url = request.url
+            response.request = request
+            response.encoding = "utf-8"
+            return response
+
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        self.cassette.record(key, request.method, request.url, response.status_code, dict(response.headers),
+                             response.content, time.perf_counter() - start)
+        return response
+
+
+# --- 全局 cassette 管理 ---
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+_llm_client: Optional[httpx.AsyncClient] = None
+
+
+def get_cassette() -> Optional[Cassette]:
+    """按配置返回全局 cassette；CASSETTE_MODE=off 时返回 None。"""
+    global _cassette
+    if Config.CASSETTE_MODE == "off":
+        return None
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette(Config.CASSETTE_PATH, Config.CASSETTE_MODE, Config.CASSETTE_LATENCY_SCALE)
+    return _cassette
+
+
+def async_http_client() -> Optional[httpx.AsyncClient]:
+    """
+    返回挂载了 cassette 的共享 httpx.AsyncClient，供 ChatOpenAI(http_async_client=...) 使用；
+    未启用时返回 None（使用库的默认客户端）。
+    """
+    global _llm_client
+    cassette = get_cassette()
+    if cassette is None:
+        return None
+    if _llm_client is None:
+        _llm_client = httpx.AsyncClient(transport=CassetteAsyncTransport(cassette), timeout=None)
+    return _llm_client
+
+
+def async_transport() -> Optional[httpx.AsyncBaseTransport]:
+    """返回 cassette 传输层，供自建的 httpx.AsyncClient(transport=...) 使用；未启用时返回 None。"""
+    cassette = get_cassette()
+    return CassetteAsyncTransport(cassette) if cassette else None
+
+
+def mount_session(session: requests.Session) -> requests.Session:
+    """为 requests.Session 挂载 cassette 适配器（未启用时不做任何修改）。"""
+    cassette = get_cassette()
+    if cassette is not None:
+        adapter = CassetteAdapter(cassette)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+    return session
+
+
+def close_cassette() -> None:
+    if _cassette is not None:
+        _cassette.close()
@@ -0,0 +1,146 @@
+# checkpoint_codec.py
+"""
+Redis 检查点的紧凑编码。
+
+格式（首字节为版本号）：
+- 旧数据：orjson 序列化的 JSON，以 "{" 开头，无版本字节，仍可读取；
+- 0x01：msgpack；
+- 0x02：msgpack + zstd 压缩（可带共享字典，字典 ID 记录在 zstd 帧头中）。
+
+消息只保留读回时用到的字段：[类型, 内容]（"h" 用户 / "a" 助手），
+不再存储 additional_kwargs、response_metadata 等字段。
+
+zstd 为可选依赖：CHECKPOINT_ZSTD_ENABLED=true 时才导入 zstandard。
+字典由 benchmarks/checkpoint_codec_bench.py --train-dict 从真实会话训练；
+CHECKPOINT_ZSTD_DICTS 可配置多个字典路径（逗号分隔），第一个用于写入，其余仅用于读取轮换前写入的数据。
+"""
+import logging
+from typing import Dict, Any, List, Optional
+
+import msgpack
+import orjson
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+VERSION_MSGPACK = 0x01
+VERSION_MSGPACK_ZSTD = 0x02
+
+_TYPE_CODES = {"human": "h", "ai": "a"}
+_MESSAGE_CLASSES = {"h": HumanMessage, "a": AIMessage, "human": HumanMessage, "ai": AIMessage}
+
+
+class CheckpointCodecError(ValueError):
+    """检查点数据无法解码（未知版本、缺少对应的 zstd 字典等）。"""
+
+
+# ----------------------------------------------------------------------
+# zstd 压缩器（按需加载）
+# ----------------------------------------------------------------------
+class _Zstd:
+    def __init__(self, level: int, dict_paths: List[str]):
+        import zstandard
+
+        self._zstd = zstandard
+        dicts = []
+        for path in dict_paths:
+            with open(path, "rb") as f:
+                dicts.append(zstandard.ZstdCompressionDict(f.read()))
+        write_dict = dicts[0] if dicts else None
+        self._compressor = zstandard.ZstdCompressor(level=level, dict_data=write_dict, write_content_size=True)
+        # 按字典 ID 选择解压器；ID 为 0 表示写入时未使用字典
+        self._decompressors = {0: zstandard.ZstdDecompressor()}
+        for d in dicts:
+            self._decompressors[d.dict_id()] = zstandard.ZstdDecompressor(dict_data=d)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        dict_id = self._zstd.get_frame_parameters(data).dict_id
+        decompressor = self._decompressors.get(dict_id)
+        if decompressor is None:
+            raise CheckpointCodecError(f"缺少 ID 为 {dict_id} 的 zstd 字典")
+        return decompressor.decompress(data)
+
+
+_zstd: Optional[_Zstd] = None
+
+
+def _get_zstd() -> _Zstd:
+    global _zstd
+    if _zstd is None:
+        paths = [p.strip() for p in Config.CHECKPOINT_ZSTD_DICTS.split(",") if p.strip()]
+        _zstd = _Zstd(Config.CHECKPOINT_ZSTD_LEVEL, paths)
+    return _zstd
+
+
+# ----------------------------------------------------------------------
+# 编解码
+# ----------------------------------------------------------------------
+def _pack_messages(messages: List[BaseMessage]) -> List[list]:
+    return [[_TYPE_CODES[m.type], m.content] for m in messages if m.type in _TYPE_CODES]
+
+
+def _unpack_message(item: Any) -> Optional[BaseMessage]:
+    """新格式为 [类型, 内容]，旧 JSON 格式为 msg.dict()；无法识别的类型丢弃。"""
+    if isinstance(item, dict):
+        cls = _MESSAGE_CLASSES.get(item.get("type"))
+        return cls(**item) if cls else None
+    cls = _MESSAGE_CLASSES.get(item[0])
+    return cls(content=item[1]) if cls else None
+
+
+def pack_checkpoint(checkpoint: Dict[str, Any]) -> bytes:
+    """检查点的 msgpack 编码（不含版本字节），同时作为训练 zstd 字典的样本。"""
+    channel_values = checkpoint.get("channel_values") or {}
+    if "chat_history" in channel_values:
+        # 浅拷贝，不修改调用方的检查点
+        checkpoint = {**checkpoint, "channel_values": {
+            **channel_values, "chat_history": _pack_messages(channel_values["chat_history"])
+        }}
+    return msgpack.packb(checkpoint, use_bin_type=True)
+
+
+def encode_checkpoint(checkpoint: Dict[str, Any]) -> bytes:
+    if Config.CHECKPOINT_CODEC == "json":
+        return _encode_json(checkpoint)
+    payload = pack_checkpoint(checkpoint)
+    if Config.CHECKPOINT_ZSTD_ENABLED:
+        compressed = _get_zstd().compress(payload)
+        if len(compressed) < len(payload):
+            return bytes((VERSION_MSGPACK_ZSTD,)) + compressed
+    return bytes((VERSION_MSGPACK,)) + payload
+
+
+def decode_checkpoint(data: bytes) -> Dict[str, Any]:
+    """解码任意版本的检查点，chat_history 还原为消息对象。"""
+    if not data:
+        raise CheckpointCodecError("检查点数据为空")
+    version = data[0]
+    if version == VERSION_MSGPACK:
+        checkpoint = msgpack.unpackb(data[1:], raw=False)
+    elif version == VERSION_MSGPACK_ZSTD:
+        checkpoint = msgpack.unpackb(_get_zstd().decompress(data[1:]), raw=False)
+    elif data[:1] == b"{":
+        checkpoint = orjson.loads(data)
+    else:
+        raise CheckpointCodecError(f"未知的检查点版本: {version:#04x}")
+
+    channel_values = checkpoint.get("channel_values")
+    if channel_values and "chat_history" in channel_values:
+        messages = (_unpack_message(item) for item in channel_values["chat_history"])
+        channel_values["chat_history"] = [m for m in messages if m is not None]
+    return checkpoint
+
+
+def _encode_json(checkpoint: Dict[str, Any]) -> bytes:
+    """旧格式：完整的 msg.dict() JSON，CHECKPOINT_CODEC=json 时使用（便于回滚）。"""
+    channel_values = checkpoint.get("channel_values") or {}
+    if "chat_history" in channel_values:
+        checkpoint = {**checkpoint, "channel_values": {
+            **channel_values, "chat_history": [m.dict() for m in channel_values["chat_history"]]
+        }}
+    return orjson.dumps(checkpoint)
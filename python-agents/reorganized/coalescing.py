@@ -0,0 +1,169 @@
+# coalescing.py
+"""
+下游请求合并，状态按事件循环隔离。
+
+- SingleFlight：相同 key 的并发请求共享同一个进行中的任务，只发出一次下游调用；
+- BatchLoader：DataLoader 风格，在 BATCH_WINDOW_MS 窗口内把同类的按键查询合并为一次批量调用，
+  同一 key 已在等待或进行中时直接复用其 future。
+
+共享的下游调用可能服务于多个请求，因此在清除了截止时间的上下文中启动（deadline.detached_context），
+只受下游自身的超时限制；每个调用方按自己的剩余预算等待，超时只影响该调用方，不会取消共享的调用。
+
+future 不能跨事件循环等待，工具同步包装器里 asyncio.run 起的临时循环因此各自持有独立状态。
+COALESCE_ENABLED=false 时两者都直接透传到下游。
+"""
+import asyncio
+import weakref
+from typing import Dict, Any, List, Callable, Awaitable, Hashable, Optional, TypeVar, Generic, Iterable
+
+from config import Config
+from deadline import detached_context, with_deadline
+from metrics import COALESCED_REQUESTS, BATCH_SIZE
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _PerLoop:
+    """为每个事件循环惰性创建一份状态，循环被回收后状态随之释放。"""
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    def get(self) -> Any:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = self._factory()
+        return state
+
+
+def _mark_retrieved(task: asyncio.Future) -> None:
+    # 所有等待方都被取消时，避免 "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """相同 key 的并发调用共享一次执行；返回值为共享对象，调用方不应原地修改。"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stage = f"downstream.{name}"
+        self._calls = _PerLoop(dict)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[V]]) -> V:
+        if not Config.COALESCE_ENABLED:
+            return await fn()
+        calls: Dict[Hashable, asyncio.Task] = self._calls.get()
+        task = calls.get(key)
+        if task is not None:
+            COALESCED_REQUESTS.labels(self.name).inc()
+        else:
+            task = asyncio.get_running_loop().create_task(fn(), context=detached_context())
+            calls[key] = task
+
+            def _done(finished: asyncio.Task, key=key) -> None:
+                if calls.get(key) is finished:
+                    del calls[key]
+                _mark_retrieved(finished)
+
+            task.add_done_callback(_done)
+        # shield：单个等待方被取消或超时不影响其他共享该任务的调用
+        return await with_deadline(asyncio.shield(task), self._stage)
+
+
+class _BatchState:
+    __slots__ = ("pending", "inflight", "handle", "tasks")
+
+    def __init__(self):
+        self.pending: Dict[Hashable, asyncio.Future] = {}
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.tasks: set = set()
+
+
+class BatchLoader(Generic[K, V]):
+    """
+    batch_fn(keys) -> {key: value}，结果中缺失的 key 视为不存在。
+    load_many 返回 {key: value}，不存在的 key 不出现在结果中。
+    """
+
+    def __init__(self, name: str, batch_fn: Callable[[List[K]], Awaitable[Dict[K, V]]],
+                 window: Optional[float] = None, max_batch_size: Optional[int] = None):
+        self.name = name
+        self._stage = f"downstream.{name}"
+        self._batch_fn = batch_fn
+        self._window = Config.BATCH_WINDOW_MS / 1000 if window is None else window
+        self._max_batch_size = max_batch_size or Config.BATCH_MAX_SIZE
+        self._states = _PerLoop(_BatchState)
+
+    async def load_many(self, keys: Iterable[K]) -> Dict[K, V]:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        if not Config.COALESCE_ENABLED:
+            BATCH_SIZE.labels(self.name).observe(len(keys))
+            return await self._batch_fn(keys)
+
+        loop = asyncio.get_running_loop()
+        state: _BatchState = self._states.get()
+        futures: Dict[K, asyncio.Future] = {}
+        for key in keys:
+            future = state.inflight.get(key) or state.pending.get(key)
+            if future is not None:
+                COALESCED_REQUESTS.labels(self.name).inc()
+            else:
+                future = state.pending[key] = loop.create_future()
+            futures[key] = future
+
+        if len(state.pending) >= self._max_batch_size:
+            self._dispatch(state)
+        elif state.pending and state.handle is None:
+            state.handle = loop.call_later(self._window, self._dispatch, state)
+
+        values = await with_deadline(asyncio.gather(*(asyncio.shield(f) for f in futures.values())), self._stage)
+        return {key: value for key, value in zip(futures, values) if value is not None}
+
+    async def load(self, key: K) -> Optional[V]:
+        return (await self.load_many([key])).get(key)
+
+    def _dispatch(self, state: _BatchState) -> None:
+        if state.handle is not None:
+            state.handle.cancel()
+            state.handle = None
+        batch, state.pending = state.pending, {}
+        if not batch:
+            return
+        state.inflight.update(batch)
+        keys = list(batch)
+        for start in range(0, len(keys), self._max_batch_size):
+            chunk = {key: batch[key] for key in keys[start:start + self._max_batch_size]}
+            task = asyncio.get_running_loop().create_task(self._run(state, chunk), context=detached_context())
+            state.tasks.add(task)
+            task.add_done_callback(state.tasks.discard)
+
+    async def _run(self, state: _BatchState, batch: Dict[K, asyncio.Future]) -> None:
+        BATCH_SIZE.labels(self.name).observe(len(batch))
+        try:
+            results = await self._batch_fn(list(batch))
+        except BaseException as e:
+            for future in batch.values():
+                if future.done():
+                    continue
+                if isinstance(e, asyncio.CancelledError):
+                    future.cancel()
+                else:
+                    future.set_exception(e)
+                    _mark_retrieved(future)
+            if not isinstance(e, Exception):
+                raise
+        else:
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(results.get(key))
+        finally:
+            for key, future in batch.items():
+                if state.inflight.get(key) is future:
+                    del state.inflight[key]
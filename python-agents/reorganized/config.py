@@ -1,6 +1,6 @@
 # config.py
 import os
-from typing import Optional
+from typing import Optional, List
 from dotenv import load_dotenv
 
 load_dotenv() # 加载 .env 文件
@@ -8,6 +8,10 @@ load_dotenv() # 加载 .env 文件
 class Config:
     # LangChain LLM 配置
     LLM_MODEL_NAME: str = os.environ.get("LLM_MODEL_NAME", "deepseek-ai/DeepSeek-R1")
+    # 路由、闲聊、地址解析等短任务使用的快速模型；各阶段的模型配置见 model_profiles.py
+    LLM_FAST_MODEL_NAME: str = os.environ.get("LLM_FAST_MODEL_NAME", "Qwen/Qwen2.5-7B-Instruct")
+    # 按阶段覆盖模型配置（JSON 字符串或 JSON 文件路径）
+    MODEL_PROFILES: str = os.environ.get("MODEL_PROFILES", "")
     LLM_TEMPERATURE: float = float(os.environ.get("LLM_TEMPERATURE", 0.1))
     SILICONFLOW_API_KEY: str = os.environ.get("SILICONFLOW_API_KEY")
     SILICONFLOW_API_BASE: str = os.environ.get("SILICONFLOW_API_BASE", "https://api.siliconflow.cn/v1" )
@@ -17,11 +21,150 @@ class Config:
 
     # LangChain API 配置
     LANGCHAIN_API_KEY: str = os.environ.get("LANGCHAIN_API_KEY")
+    # 是否从 LangChain Hub 拉取 Prompt（离线压测时关闭，直接使用本地备用 Prompt）
+    PROMPT_HUB_ENABLED: bool = os.environ.get("PROMPT_HUB_ENABLED", "true").lower() == "true"
+
+    # 录制 / 回放配置：off 关闭；record 录制 LLM 与下游 HTTP 交互；replay 从 cassette 回放
+    CASSETTE_MODE: str = os.environ.get("CASSETTE_MODE", "off").lower()
+    CASSETTE_PATH: str = os.environ.get("CASSETTE_PATH", "cassettes/session.jsonl.gz")
+    # 回放延迟倍率：1.0 为原始耗时，0 为不等待
+    CASSETTE_LATENCY_SCALE: float = float(os.environ.get("CASSETTE_LATENCY_SCALE", 1.0))
+
+    # 日志配置
+    LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO").upper()
+    # 按组件设置级别，逗号分隔，如 "agents=WARNING,httpx=WARNING"
+    LOG_LEVELS: str = os.environ.get("LOG_LEVELS", "httpx=WARNING")
+    # 输出格式：json 或 text
+    LOG_FORMAT: str = os.environ.get("LOG_FORMAT", "json").lower()
+    # 负载型事件（工具结果、回复全文等）的采样比例
+    LOG_PAYLOAD_SAMPLE_RATE: float = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0.01))
+    # 单条消息 / 字段的最大长度，超出部分截断
+    LOG_MAX_FIELD_LENGTH: int = int(os.environ.get("LOG_MAX_FIELD_LENGTH", 512))
+    # AgentExecutor 是否打印完整推理链（同步写 stdout，仅用于本地调试）
+    AGENT_VERBOSE: bool = os.environ.get("AGENT_VERBOSE", "false").lower() == "true"
+
+    # 启动模式：eager 启动时构建所有子代理；lazy 延迟导入重量级依赖，子代理在首次使用时构建
+    STARTUP_MODE: str = os.environ.get("STARTUP_MODE", "eager").lower()
+    # lazy 模式下是否在开始接收请求后于后台预热子代理
+    STARTUP_WARMUP: bool = os.environ.get("STARTUP_WARMUP", "true").lower() == "true"
+
+    # 路由期间是否投机预取用户的订单 / 支付记录
+    PREFETCH_ENABLED: bool = os.environ.get("PREFETCH_ENABLED", "true").lower() == "true"
+
+    # 本地地址解析的置信度阈值，低于该值时回退到 LLM 解析
+    ADDRESS_PARSER_MIN_CONFIDENCE: float = float(os.environ.get("ADDRESS_PARSER_MIN_CONFIDENCE", 0.8))
+
+    # 检查点编码：msgpack（紧凑二进制，默认）或 json（旧格式）；读取时两种格式均兼容
+    CHECKPOINT_CODEC: str = os.environ.get("CHECKPOINT_CODEC", "msgpack").lower()
+    # msgpack 编码后是否再做 zstd 压缩（需安装 zstandard），字典路径逗号分隔，第一个用于写入
+    CHECKPOINT_ZSTD_ENABLED: bool = os.environ.get("CHECKPOINT_ZSTD_ENABLED", "false").lower() == "true"
+    CHECKPOINT_ZSTD_LEVEL: int = int(os.environ.get("CHECKPOINT_ZSTD_LEVEL", 3))
+    CHECKPOINT_ZSTD_DICTS: str = os.environ.get("CHECKPOINT_ZSTD_DICTS", "")
+
+    # 会话分层存储：Redis 中的检查点按滑动过期时间保留，空闲超过 SESSION_IDLE_SECONDS 的会话
+    # 由后台任务降级到本地 SQLite 归档，下次访问时自动提升回 Redis
+    SESSION_TTL_SECONDS: int = int(os.environ.get("SESSION_TTL_SECONDS", 3600))
+    SESSION_ARCHIVE_ENABLED: bool = os.environ.get("SESSION_ARCHIVE_ENABLED", "true").lower() == "true"
+    SESSION_ARCHIVE_PATH: str = os.environ.get("SESSION_ARCHIVE_PATH", "archive/sessions.db")
+    SESSION_IDLE_SECONDS: int = int(os.environ.get("SESSION_IDLE_SECONDS", 1800))
+    SESSION_DEMOTE_INTERVAL_SECONDS: float = float(os.environ.get("SESSION_DEMOTE_INTERVAL_SECONDS", 60))
+    SESSION_DEMOTE_BATCH: int = int(os.environ.get("SESSION_DEMOTE_BATCH", 200))
+    SESSION_ARCHIVE_RETENTION_DAYS: float = float(os.environ.get("SESSION_ARCHIVE_RETENTION_DAYS", 90))
+    # 按会话索引列出会话（alist）时每页的会话数
+    SESSION_LIST_PAGE_SIZE: int = int(os.environ.get("SESSION_LIST_PAGE_SIZE", 500))
+
+    # 单轮 /chat 请求的总时间预算（秒），路由、子代理、工具与下游调用共享剩余预算
+    REQUEST_DEADLINE_SECONDS: float = float(os.environ.get("REQUEST_DEADLINE_SECONDS", 60))
+    # 各类单次调用的超时上限（秒），实际超时取上限与剩余预算的较小值
+    LLM_TIMEOUT_SECONDS: float = float(os.environ.get("LLM_TIMEOUT_SECONDS", 60))
+    DOWNSTREAM_TIMEOUT_SECONDS: float = float(os.environ.get("DOWNSTREAM_TIMEOUT_SECONDS", 10))
+    REDIS_TIMEOUT_SECONDS: float = float(os.environ.get("REDIS_TIMEOUT_SECONDS", 2))
+    # LLM 调用的进程内并发上限，超过后排队等待（0 表示不限，只统计排队时间）
+    LLM_MAX_CONCURRENCY: int = int(os.environ.get("LLM_MAX_CONCURRENCY", 32))
+    # 排队压力下的模型降级（见 model_degradation.py）：按顺序最先降级的阶段，逗号分隔
+    DEGRADE_ENABLED: bool = os.environ.get("DEGRADE_ENABLED", "true").lower() == "true"
+    DEGRADE_STAGES: List[str] = [s.strip() for s in os.environ.get("DEGRADE_STAGES", "chitchat,guide").split(",") if s.strip()]
+    # 排队时间 EWMA 达到该值，或主模型延迟 EWMA 达到超时 × DEGRADE_LATENCY_RATIO 时压力为 1
+    DEGRADE_QUEUE_WAIT_SECONDS: float = float(os.environ.get("DEGRADE_QUEUE_WAIT_SECONDS", 1.0))
+    DEGRADE_LATENCY_RATIO: float = float(os.environ.get("DEGRADE_LATENCY_RATIO", 0.5))
+    # 排在后面的阶段每个多需要的压力；恢复阈值为进入阈值 × DEGRADE_RECOVER_RATIO，且至少降级这么久
+    DEGRADE_STAGE_STEP: float = float(os.environ.get("DEGRADE_STAGE_STEP", 0.25))
+    DEGRADE_RECOVER_RATIO: float = float(os.environ.get("DEGRADE_RECOVER_RATIO", 0.6))
+    DEGRADE_MIN_HOLD_SECONDS: float = float(os.environ.get("DEGRADE_MIN_HOLD_SECONDS", 30))
+    DEGRADE_EWMA_DECAY_SECONDS: float = float(os.environ.get("DEGRADE_EWMA_DECAY_SECONDS", 15))
+    # 降级配置默认保留的最近历史消息条数
+    DEGRADE_MAX_HISTORY: int = int(os.environ.get("DEGRADE_MAX_HISTORY", 6))
+    # 按会话 / 用户的用量统计（见 accounting.py），计数器在 Redis 中保留的天数
+    ACCOUNTING_ENABLED: bool = os.environ.get("ACCOUNTING_ENABLED", "true").lower() == "true"
+    ACCOUNTING_RETENTION_DAYS: float = float(os.environ.get("ACCOUNTING_RETENTION_DAYS", 7))
+    # 单个会话累计、单个用户每天（UTC）的 token 预算，超出后后续轮次使用降级配置；0 表示不限
+    SESSION_TOKEN_BUDGET: int = int(os.environ.get("SESSION_TOKEN_BUDGET", 0))
+    USER_DAILY_TOKEN_BUDGET: int = int(os.environ.get("USER_DAILY_TOKEN_BUDGET", 0))
+    BUDGET_DEGRADE_STAGES: List[str] = [
+        s.strip() for s in os.environ.get("BUDGET_DEGRADE_STAGES", "router,chitchat,guide,parsing").split(",") if s.strip()
+    ]
+    # 子代理执行循环的最大迭代次数（LLM 调用次数）
+    AGENT_MAX_ITERATIONS: int = int(os.environ.get("AGENT_MAX_ITERATIONS", 8))
 
     # 外部商品 API 配置 (可选)
     PRODUCT_API_BASE_URL: Optional[str] = os.environ.get("PRODUCT_API_BASE_URL")
     # 根据 PRODUCT_API_BASE_URL 是否设置来决定是否使用外部API
     USE_EXTERNAL_PRODUCT_API: bool = bool(PRODUCT_API_BASE_URL)
+    # 下游请求合并：相同的进行中请求共享结果，同类按键查询在窗口内合并为批量调用
+    COALESCE_ENABLED: bool = os.environ.get("COALESCE_ENABLED", "true").lower() == "true"
+    BATCH_WINDOW_MS: float = float(os.environ.get("BATCH_WINDOW_MS", 2))
+    BATCH_MAX_SIZE: int = int(os.environ.get("BATCH_MAX_SIZE", 50))
+    # 商品按ID查询结果的缓存时间（秒）与最大条目数
+    PRODUCT_CACHE_TTL: float = float(os.environ.get("PRODUCT_CACHE_TTL", 300))
+    PRODUCT_CACHE_MAX_ENTRIES: int = int(os.environ.get("PRODUCT_CACHE_MAX_ENTRIES", 2048))
+
+    # 服务监听端口，同时作为注册到 Nacos 的实例端口
+    SERVICE_PORT: int = int(os.environ.get("SERVICE_PORT", 8085))
+    # 注册到 Nacos 的实例地址，不设置时取连接 Nacos 所用的本机地址
+    SERVICE_IP: str = os.environ.get("SERVICE_IP", "")
+
+    # Nacos 服务注册 (可选)：NACOS_SERVER_ADDR 可配置多个地址（逗号分隔），不设置时不注册
+    NACOS_SERVER_ADDR: Optional[str] = os.environ.get("NACOS_SERVER_ADDR")
+    NACOS_ENABLED: bool = bool(NACOS_SERVER_ADDR)
+    NACOS_NAMESPACE: str = os.environ.get("NACOS_NAMESPACE", "public")
+    NACOS_GROUP: str = os.environ.get("NACOS_GROUP", "DEFAULT_GROUP")
+    NACOS_CLUSTER: str = os.environ.get("NACOS_CLUSTER", "DEFAULT")
+    NACOS_USERNAME: Optional[str] = os.environ.get("NACOS_USERNAME")
+    NACOS_PASSWORD: Optional[str] = os.environ.get("NACOS_PASSWORD")
+    NACOS_SERVICE_NAME: str = os.environ.get("NACOS_SERVICE_NAME", "agents-service")
+    NACOS_HEARTBEAT_INTERVAL: float = float(os.environ.get("NACOS_HEARTBEAT_INTERVAL", 5))
+    # 实例权重按负载在 [NACOS_MIN_WEIGHT, NACOS_BASE_WEIGHT] 之间调整；
+    # 处理中请求数或线程池排队数达到下列上限时视为满载
+    NACOS_BASE_WEIGHT: float = float(os.environ.get("NACOS_BASE_WEIGHT", 1.0))
+    NACOS_MIN_WEIGHT: float = float(os.environ.get("NACOS_MIN_WEIGHT", 0.1))
+    INSTANCE_MAX_INFLIGHT: int = int(os.environ.get("INSTANCE_MAX_INFLIGHT", 32))
+    INSTANCE_MAX_QUEUE: int = int(os.environ.get("INSTANCE_MAX_QUEUE", 16))
+
+    # 订单 / 支付服务的客户端服务发现：启用 Nacos 时默认开启，直连实例而不经过网关
+    DISCOVERY_ENABLED: bool = NACOS_ENABLED and os.environ.get("DISCOVERY_ENABLED", "true").lower() == "true"
+    DISCOVERY_REFRESH_SECONDS: float = float(os.environ.get("DISCOVERY_REFRESH_SECONDS", 10))
+    # 负载均衡策略：ewma（处理中请求数 × 延迟 EWMA）或 least_outstanding（处理中请求数）
+    LB_POLICY: str = os.environ.get("LB_POLICY", "ewma").lower()
+    LB_EWMA_DECAY_SECONDS: float = float(os.environ.get("LB_EWMA_DECAY_SECONDS", 10))
+    # 被动健康检查：连续失败次数达到阈值后摘除实例，摘除时长随次数翻倍，被摘除实例占比不超过上限
+    EJECT_CONSECUTIVE_FAILURES: int = int(os.environ.get("EJECT_CONSECUTIVE_FAILURES", 5))
+    EJECT_BASE_SECONDS: float = float(os.environ.get("EJECT_BASE_SECONDS", 30))
+    EJECT_MAX_PERCENT: float = float(os.environ.get("EJECT_MAX_PERCENT", 50))
+
+    # 下游调用弹性策略（订单 / 支付 / 商品）：按接口熔断，幂等 GET 抖动重试与对冲
+    RESILIENCE_ENABLED: bool = os.environ.get("RESILIENCE_ENABLED", "true").lower() == "true"
+    CB_WINDOW: int = int(os.environ.get("CB_WINDOW", 20))
+    CB_MIN_REQUESTS: int = int(os.environ.get("CB_MIN_REQUESTS", 10))
+    CB_FAILURE_RATIO: float = float(os.environ.get("CB_FAILURE_RATIO", 0.5))
+    CB_OPEN_SECONDS: float = float(os.environ.get("CB_OPEN_SECONDS", 10))
+    CB_HALF_OPEN_PROBES: int = int(os.environ.get("CB_HALF_OPEN_PROBES", 1))
+    # 重试总次数（含首次）与退避基础时长
+    RETRY_MAX_ATTEMPTS: int = int(os.environ.get("RETRY_MAX_ATTEMPTS", 2))
+    RETRY_BASE_DELAY_MS: float = float(os.environ.get("RETRY_BASE_DELAY_MS", 100))
+    # 对冲：在接口 p95 延迟（不低于 HEDGE_MIN_DELAY_MS）后发出，对冲请求数约为总请求数的 HEDGE_MAX_RATIO
+    HEDGE_ENABLED: bool = os.environ.get("HEDGE_ENABLED", "true").lower() == "true"
+    HEDGE_MIN_DELAY_MS: float = float(os.environ.get("HEDGE_MIN_DELAY_MS", 50))
+    HEDGE_MAX_RATIO: float = float(os.environ.get("HEDGE_MAX_RATIO", 0.1))
 
     # ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "").split(",")
 
@@ -35,6 +178,31 @@ class Config:
         # 如果使用外部API，则 PRODUCT_API_BASE_URL 必须设置
         if cls.USE_EXTERNAL_PRODUCT_API and not cls.PRODUCT_API_BASE_URL:
             raise ValueError("PRODUCT_API_BASE_URL 环境变量未设置，但 USE_EXTERNAL_PRODUCT_API 为 True。")
+        if cls.STARTUP_MODE not in ("eager", "lazy"):
+            raise ValueError("STARTUP_MODE 只能是 eager 或 lazy。")
+        if cls.REQUEST_DEADLINE_SECONDS <= 0:
+            raise ValueError("REQUEST_DEADLINE_SECONDS 必须大于 0。")
+        if cls.CHECKPOINT_CODEC not in ("msgpack", "json"):
+            raise ValueError("CHECKPOINT_CODEC 只能是 msgpack 或 json。")
+        if cls.SESSION_ARCHIVE_ENABLED and cls.SESSION_IDLE_SECONDS >= cls.SESSION_TTL_SECONDS:
+            raise ValueError("SESSION_IDLE_SECONDS 必须小于 SESSION_TTL_SECONDS，否则会话会在降级前过期。")
+        if cls.CASSETTE_MODE not in ("off", "record", "replay"):
+            raise ValueError("CASSETTE_MODE 只能是 off、record 或 replay。")
+        if cls.NACOS_ENABLED and not 0 < cls.NACOS_MIN_WEIGHT <= cls.NACOS_BASE_WEIGHT:
+            raise ValueError("NACOS_MIN_WEIGHT 必须大于 0 且不超过 NACOS_BASE_WEIGHT。")
+        if cls.LB_POLICY not in ("ewma", "least_outstanding"):
+            raise ValueError("LB_POLICY 只能是 ewma 或 least_outstanding。")
+        if cls.RETRY_MAX_ATTEMPTS < 1:
+            raise ValueError("RETRY_MAX_ATTEMPTS 至少为 1。")
+        if cls.LLM_MAX_CONCURRENCY < 0:
+            raise ValueError("LLM_MAX_CONCURRENCY 不能为负数。")
+        # 订单 / 支付代理在初始化时绑定模型，不支持运行中切换
+        for name, stages in (("DEGRADE_STAGES", cls.DEGRADE_STAGES), ("BUDGET_DEGRADE_STAGES", cls.BUDGET_DEGRADE_STAGES)):
+            unsupported = set(stages) - {"router", "chitchat", "guide", "parsing"}
+            if unsupported:
+                raise ValueError(f"{name} 只能包含 router、chitchat、guide、parsing，不支持: {', '.join(sorted(unsupported))}")
+        if not 0 < cls.DEGRADE_RECOVER_RATIO < 1:
+            raise ValueError("DEGRADE_RECOVER_RATIO 必须在 0 与 1 之间。")
 
 # 在应用启动时调用验证
 Config.validate()
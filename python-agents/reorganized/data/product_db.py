@@ -34,6 +34,15 @@ PRODUCT_DATABASE: List[Dict[str, Any]] = [
     {"id": 19, "name": "高保真智能音箱", "price": 899, "brand": "MusicMaster", "features": "3D环绕声", "category": "speaker"},
 ]
 
+# 按商品ID建立的索引，用于下单时批量查询权威价格 / 名称
+PRODUCT_INDEX: Dict[str, Dict[str, Any]] = {str(p["id"]): p for p in PRODUCT_DATABASE}
+
+
+def get_products_by_ids(product_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """按商品ID批量查询，返回 {商品ID: 商品}；不存在的ID不出现在结果中。"""
+    return {str(pid): PRODUCT_INDEX[str(pid)] for pid in product_ids if str(pid) in PRODUCT_INDEX}
+
+
 def get_products_from_db(
     name: Optional[str] = None,
     category: Optional[str] = None,
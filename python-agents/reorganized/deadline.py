@@ -0,0 +1,98 @@
+# deadline.py
+"""
+端到端请求截止时间。
+
+chat_endpoint 在请求开始时用 request_deadline() 设定本轮的截止时间（事件循环单调时钟），
+通过 contextvar 随调用链传递：asyncio.create_task / asyncio.to_thread 会复制上下文，
+因此路由、子代理、工具、预取任务与下游 HTTP / Redis 调用都能读到同一个截止时间。
+
+- 各阶段用 with_deadline() 包裹，只获得剩余预算，预算耗尽时取消并抛出 DeadlineExceeded；
+- 线程中执行的阻塞调用无法取消，用 timeout_for() 把剩余预算折算为 requests / redis 的超时参数；
+- 未设定截止时间时（如脚本、基准直接调用）两者退化为只使用各自的上限；
+- 被多个请求共享的任务（见 coalescing）用 detached_context() 启动，不继承发起方的截止时间，
+  各等待方用 with_deadline() 按自己的剩余预算等待。
+"""
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+from metrics import DEADLINE_EXCEEDED
+
+T = TypeVar("T")
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """本轮请求的时间预算已耗尽；stage 为放弃处理时所在的阶段。"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"请求处理超时（阶段: {stage}）")
+        self.stage = stage
+
+
+@contextmanager
+def request_deadline(budget: float) -> Iterator[float]:
+    """为当前上下文设定 budget 秒后的截止时间；已存在更早的截止时间时沿用之。"""
+    deadline = time.monotonic() + budget
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def detached_context() -> contextvars.Context:
+    """复制当前上下文并清除截止时间，用于启动被多个请求共享的任务。"""
+    ctx = contextvars.copy_context()
+    ctx.run(_deadline.set, None)
+    return ctx
+
+
+def remaining() -> Optional[float]:
+    """剩余预算（秒），未设定截止时间时返回 None。"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(stage: str) -> None:
+    """预算已耗尽时抛出 DeadlineExceeded，在开始新的工作前调用。"""
+    left = remaining()
+    if left is not None and left <= 0:
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        raise DeadlineExceeded(stage)
+
+
+def timeout_for(stage: str, cap: Optional[float] = None) -> Optional[float]:
+    """单次调用的超时：剩余预算与 cap 取较小值；预算已耗尽时抛出 DeadlineExceeded。"""
+    check_deadline(stage)
+    left = remaining()
+    if left is None:
+        return cap
+    return left if cap is None else min(cap, left)
+
+
+async def with_deadline(awaitable: Awaitable[T], stage: str) -> T:
+    """在剩余预算内等待 awaitable，超时则取消它并抛出 DeadlineExceeded。"""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        raise DeadlineExceeded(stage)
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError as e:
+        if isinstance(e, DeadlineExceeded):
+            raise
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        raise DeadlineExceeded(stage) from None
@@ -0,0 +1,154 @@
+# logging_setup.py
+"""
+结构化日志子系统。
+
+- 请求路径上只做入队（QueueHandler），格式化与写出由后台 QueueListener 线程完成；
+- 输出为单行 JSON（LOG_FORMAT=text 时为普通文本），extra 中的字段作为 JSON 字段输出；
+- LOG_LEVELS 按组件（logger 名称前缀）设置级别，如 "agents=WARNING,httpx=WARNING"；
+- 标记为 sampled 的负载型事件（工具结果、回复全文等）按 LOG_PAYLOAD_SAMPLE_RATE 采样；
+- 消息与字段超过 LOG_MAX_FIELD_LENGTH 时截断，日志量不再随对话历史增长。
+
+用法:
+    logger.info("工具调用完成", extra={"tool": name, "session_id": sid})
+    logger.info("工具返回: %s", result, extra=SAMPLED)
+"""
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+import orjson
+
+from config import Config
+
+# 负载型事件标记：logger.info(..., extra=SAMPLED)
+SAMPLED: Dict[str, Any] = {"sampled": True}
+
+# LogRecord 的标准属性，其余属性视为 extra 字段
+_RESERVED_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _truncate(value: str, limit: int) -> str:
+    if limit > 0 and len(value) > limit:
+        return f"{value[:limit]}...<truncated {len(value) - limit} chars>"
+    return value
+
+
+class PayloadFilter(logging.Filter):
+    """对负载型事件采样，并截断过长的消息与字段。挂在 QueueHandler 上，在入队前执行。"""
+
+    def __init__(self, sample_rate: float, max_length: int):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.max_length = max_length
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "sampled", False) and random.random() >= self.sample_rate:
+            return False
+        # 过滤器在调用 logger 的线程上执行，异常不会交给 handleError：格式错误等一律回退，绝不抛出
+        try:
+            message = record.getMessage()
+        except Exception:
+            message = str(record.msg) if not record.args else f"{record.msg} {record.args!r}"
+        record.msg = _truncate(message, self.max_length)
+        record.args = None
+        for key, value in list(vars(record).items()):
+            if key in _RESERVED_ATTRS or value is None or isinstance(value, (bool, int, float)):
+                continue
+            if isinstance(value, str):
+                setattr(record, key, _truncate(value, self.max_length))
+                continue
+            # dict / list 等按序列化后的长度判断，超限时替换为截断后的 JSON 文本，未超限的保持原结构
+            try:
+                serialized = orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+            except Exception:
+                serialized = repr(value)
+                setattr(record, key, _truncate(serialized, self.max_length))
+                continue
+            if self.max_length > 0 and len(serialized) > self.max_length:
+                setattr(record, key, _truncate(serialized, self.max_length))
+        return True
+
+
+class _StructuredQueueHandler(logging.handlers.QueueHandler):
+    """入队前只做最小处理：合并消息参数、把异常栈转为文本，保留 extra 字段供 JSON 输出。"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """单行 JSON 格式：ts / level / logger / msg 以及 extra 字段。"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and key != "sampled":
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return orjson.dumps(entry, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+
+
+def _parse_levels(spec: str) -> Dict[str, int]:
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        if level:
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return levels
+
+
+def setup_logging() -> None:
+    """配置根 logger（幂等）。"""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if Config.LOG_FORMAT == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(PayloadFilter(Config.LOG_PAYLOAD_SAMPLE_RATE, Config.LOG_MAX_FIELD_LENGTH))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(Config.LOG_LEVEL)
+    for name, level in _parse_levels(Config.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """停止后台写出线程并刷新剩余日志。"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
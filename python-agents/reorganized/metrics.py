@@ -0,0 +1,271 @@
+# metrics.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterator
+from uuid import UUID
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+# 延迟分桶：覆盖从 Redis 的毫秒级到推理模型的分钟级
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# --- 指标定义 ---
+STAGE_LATENCY = Histogram(
+    "agent_stage_latency_seconds", "各处理阶段耗时（秒）", ["stage"], buckets=LATENCY_BUCKETS
+)
+TOOL_LATENCY = Histogram(
+    "agent_tool_latency_seconds", "Agent 工具调用耗时（秒）", ["tool", "status"], buckets=LATENCY_BUCKETS
+)
+DOWNSTREAM_LATENCY = Histogram(
+    "agent_downstream_latency_seconds", "下游服务 HTTP 调用耗时（秒）",
+    ["service", "endpoint", "method", "status"], buckets=LATENCY_BUCKETS
+)
+LLM_LATENCY = Histogram(
+    "agent_llm_latency_seconds", "单次 LLM 调用耗时（秒）", ["stage"], buckets=LATENCY_BUCKETS
+)
+LLM_CALLS = Counter("agent_llm_calls_total", "LLM 调用次数", ["stage", "status"])
+LLM_TOKENS = Counter("agent_llm_tokens_total", "LLM token 用量", ["stage", "kind"])
+LLM_PROMPT_CACHE_TOKENS = Counter(
+    "agent_llm_prompt_cache_tokens_total", "prompt token 中命中 / 未命中服务商前缀缓存的数量", ["stage", "result"]
+)
+AGENT_ITERATIONS = Counter("agent_iterations_total", "子代理执行循环中的 LLM 迭代次数", ["agent"])
+LLM_CALLS_SAVED = Counter("agent_llm_calls_saved_total", "被短路省去的 LLM 调用次数", ["agent", "reason"])
+AGENT_TURN_ITERATIONS = Histogram(
+    "agent_turn_iterations", "每轮对话子代理的 LLM 迭代次数", ["agent"], buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15)
+)
+AGENT_TURN_TOKENS = Histogram(
+    "agent_turn_tokens", "每轮对话子代理消耗的 token 数（prompt + completion）", ["agent"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+)
+TOOL_ARG_ERRORS = Counter(
+    "agent_tool_arg_errors_total", "工具参数校验失败次数（每次都会多消耗一次 LLM 迭代）", ["tool"]
+)
+PREFETCH_RESULTS = Counter(
+    "agent_prefetch_total", "投机预取结果（hit/unused/discarded/cancelled/error）", ["kind", "outcome"]
+)
+ADDRESS_PARSE_RESULTS = Counter(
+    "agent_address_parse_total", "下单信息解析来源（local/llm_fallback/failed）", ["source"]
+)
+PRODUCT_LOOKUPS = Counter(
+    "agent_product_lookup_total", "按ID查询商品的结果（cache_hit/fetched/not_found）", ["outcome"]
+)
+COALESCED_REQUESTS = Counter(
+    "agent_coalesced_requests_total", "合并到进行中 / 待发送请求、未单独访问下游的调用次数", ["loader"]
+)
+BATCH_SIZE = Histogram(
+    "agent_batch_size", "合并后每次批量调用包含的键数", ["loader"], buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+DEADLINE_EXCEEDED = Counter(
+    "agent_deadline_exceeded_total", "请求预算耗尽、在该阶段放弃处理的次数", ["stage"]
+)
+SESSION_TIER_MOVES = Counter(
+    "agent_session_tier_moves_total", "会话在 Redis 与冷归档之间的迁移次数（demoted/promoted）", ["direction"]
+)
+MODEL_PROFILE = Gauge("agent_model_profile", "各阶段当前使用的模型（值为 1）", ["stage", "model"])
+MODEL_DEGRADATIONS = Counter(
+    "agent_model_degradations_total", "阶段在主配置与降级配置之间的切换次数", ["stage", "direction"]
+)
+MODEL_DEGRADED = Gauge("agent_model_degraded", "阶段当前是否使用降级配置（1 为降级）", ["stage"])
+LLM_PRESSURE = Gauge("agent_llm_pressure", "降级判断使用的压力值（达到阶段阈值时降级）", ["stage"])
+LLM_QUEUE_WAIT = Histogram(
+    "agent_llm_queue_wait_seconds", "LLM 调用等待并发空位的时间", buckets=LATENCY_BUCKETS
+)
+CIRCUIT_STATE = Gauge(
+    "agent_circuit_state", "下游接口熔断器状态（0 关闭 / 1 半开 / 2 打开）", ["service", "endpoint"]
+)
+CIRCUIT_REJECTED = Counter("agent_circuit_rejected_total", "熔断期间被直接拒绝的下游调用次数", ["service"])
+DOWNSTREAM_RETRIES = Counter("agent_downstream_retries_total", "幂等 GET 的重试次数", ["service"])
+HEDGED_REQUESTS = Counter("agent_hedged_requests_total", "对冲请求（sent 发出 / won 先于原请求成功）", ["service", "outcome"])
+DISCOVERY_INSTANCES = Gauge("agent_discovery_instances", "服务发现得到的下游实例数", ["service"])
+ENDPOINT_EJECTIONS = Counter("agent_endpoint_ejections_total", "下游实例因连续失败被摘除的次数", ["service"])
+BUDGET_DOWNGRADES = Counter(
+    "agent_budget_downgrades_total", "因会话 / 用户 token 预算超限而使用降级配置的轮次", ["scope"]
+)
+INFLIGHT_REQUESTS = Gauge("agent_inflight_requests", "正在处理的 /chat 请求数")
+INSTANCE_WEIGHT = Gauge("agent_instance_weight", "当前注册到 Nacos 的实例权重（随负载调整）")
+POOL_IN_USE = Gauge("agent_pool_in_use", "连接池 / 下游客户端当前占用数", ["pool"])
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """记录一个处理阶段的耗时，异常同样计入。"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def track_redis_pool(pool_name: str, redis_client) -> None:
+    """将 redis-py 连接池的占用连接数注册为 Gauge。"""
+    pool = redis_client.connection_pool
+    POOL_IN_USE.labels(pool_name).set_function(lambda: len(getattr(pool, "_in_use_connections", ())))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """生成 Prometheus 文本格式的指标数据。"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def _extract_token_usage(response: LLMResult) -> Dict[str, int]:
+    """从 LLMResult 中提取 prompt / completion token 数。"""
+    prompt_tokens = completion_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+    if not prompt_tokens and not completion_tokens:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = token_usage.get("prompt_tokens", 0) or 0
+        completion_tokens = token_usage.get("completion_tokens", 0) or 0
+    return {"prompt": prompt_tokens, "completion": completion_tokens}
+
+
+def _extract_cached_tokens(response: LLMResult) -> int:
+    """
+    从 LLMResult 中提取命中服务商前缀缓存的 prompt token 数：优先读取 usage_metadata 的
+    input_token_details.cache_read（OpenAI 的 prompt_tokens_details.cached_tokens），
+    否则读取原始 usage 中的 cached_tokens 或 DeepSeek 风格的 prompt_cache_hit_tokens。
+    """
+    cached = 0
+    found = False
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            details = (usage or {}).get("input_token_details") or {}
+            if "cache_read" in details:
+                found = True
+                cached += details["cache_read"] or 0
+    if found:
+        return cached
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    details = token_usage.get("prompt_tokens_details") or {}
+    return details.get("cached_tokens") or token_usage.get("prompt_cache_hit_tokens") or 0
+
+
+@dataclass
+class TurnUsage:
+    """一轮 /chat 内路由与子代理各阶段的 LLM / 工具用量之和，由 MetricsCallbackHandler 累加（见 accounting.py）。"""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    llm_calls: int = 0
+    tool_calls: int = 0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+_turn_usage: ContextVar[Optional[TurnUsage]] = ContextVar("turn_usage", default=None)
+
+
+@contextmanager
+def track_turn_usage() -> Iterator[TurnUsage]:
+    """在当前上下文中收集本轮用量；子任务复制上下文后共享同一个 TurnUsage。"""
+    usage = TurnUsage()
+    token = _turn_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _turn_usage.reset(token)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain 回调：按阶段记录 LLM 耗时、token（含 prompt 前缀缓存命中数）与调用次数，以及每个工具的耗时；
+    处于 track_turn_usage() 中时同时累加到本轮用量。
+    每轮对话创建一个实例，llm_calls 即本轮的迭代次数。
+    """
+    run_inline = True
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.llm_calls = 0
+        self.tokens = 0
+        self._llm_starts: Dict[UUID, float] = {}
+        self._tool_starts: Dict[UUID, Tuple[str, float]] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], *, run_id: UUID,
+                            **kwargs: Any) -> None:
+        self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self.llm_calls += 1
+        start = self._llm_starts.pop(run_id, None)
+        if start is not None:
+            LLM_LATENCY.labels(self.stage).observe(time.perf_counter() - start)
+        LLM_CALLS.labels(self.stage, "ok").inc()
+        usage = _extract_token_usage(response)
+        for kind, count in usage.items():
+            self.tokens += count
+            if count:
+                LLM_TOKENS.labels(self.stage, kind).inc(count)
+        cached = 0
+        if usage["prompt"]:
+            cached = min(_extract_cached_tokens(response), usage["prompt"])
+            LLM_PROMPT_CACHE_TOKENS.labels(self.stage, "cached").inc(cached)
+            LLM_PROMPT_CACHE_TOKENS.labels(self.stage, "uncached").inc(usage["prompt"] - cached)
+        turn = _turn_usage.get()
+        if turn is not None:
+            turn.llm_calls += 1
+            turn.prompt_tokens += usage["prompt"]
+            turn.completion_tokens += usage["completion"]
+            turn.cached_tokens += cached
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_starts.pop(run_id, None)
+        LLM_CALLS.labels(self.stage, "error").inc()
+        turn = _turn_usage.get()
+        if turn is not None:
+            turn.llm_calls += 1
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: UUID, **kwargs: Any) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "unknown"
+        self._tool_starts[run_id] = (name, time.perf_counter())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe_tool(run_id, "ok")
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._observe_tool(run_id, "error")
+
+    def _observe_tool(self, run_id: UUID, status: str) -> None:
+        turn = _turn_usage.get()
+        if turn is not None:
+            turn.tool_calls += 1
+        started = self._tool_starts.pop(run_id, None)
+        if started is not None:
+            name, start = started
+            TOOL_LATENCY.labels(name, status).observe(time.perf_counter() - start)
+
+    def record_iterations(self, agent: Optional[str] = None) -> None:
+        """在子代理执行结束后记录本轮迭代次数。"""
+        agent = agent or self.stage
+        AGENT_ITERATIONS.labels(agent).inc(self.llm_calls)
+        AGENT_TURN_ITERATIONS.labels(agent).observe(self.llm_calls)
+        AGENT_TURN_TOKENS.labels(agent).observe(self.tokens)
+
+
+def tool_arg_error_handler(tool_name: str) -> Callable[[Exception], str]:
+    """StructuredTool 的 handle_validation_error：计数并把精简的校验错误返回给模型以便修正参数。"""
+
+    def _handle(error: Exception) -> str:
+        TOOL_ARG_ERRORS.labels(tool_name).inc()
+        errors = getattr(error, "errors", None)
+        if callable(errors):
+            detail = "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in errors())
+        else:
+            detail = str(error)
+        return f"参数校验失败（{detail}），请按工具参数说明修正后重新调用。"
+
+    return _handle
@@ -0,0 +1,188 @@
+# model_degradation.py
+"""
+排队压力下的模型降级：LLM 调用的排队时间或服务商延迟超过阈值时，按 DEGRADE_STAGES 的顺序
+把阶段切换到降级配置（快速模型、更短的历史窗口，见 model_profiles），压力回落后再切回。
+
+- 排队时间：所有 LLM 调用经过 llm_slot()，进程内并发上限为 LLM_MAX_CONCURRENCY（0 表示不限，只计时），
+  等待空位的时间计入 EWMA；
+- 服务商延迟：按模型统计取得空位后到返回的耗时 EWMA，与阶段主配置的超时相比；
+- 压力 = max(排队 EWMA / DEGRADE_QUEUE_WAIT_SECONDS, 主模型延迟 EWMA / (超时 × DEGRADE_LATENCY_RATIO))。
+
+DEGRADE_STAGES 中第 i 个阶段在压力达到 1 + i × DEGRADE_STAGE_STEP 时降级（默认闲聊、导购依次最先）；
+压力降到进入阈值的 DEGRADE_RECOVER_RATIO 以下、且已降级 DEGRADE_MIN_HOLD_SECONDS 后才恢复，
+两个阈值之间保持当前状态，避免在临界负载下来回切换。
+
+EWMA 按时间衰减：没有新样本时逐渐回落到 0，因此主模型在降级期间不再被调用时，延迟信号不会停留在高位。
+每次切换计入 agent_model_degradations_total，并更新 agent_model_degraded 与 agent_model_profile。
+
+force_degraded() 在当前上下文（一轮请求）内强制指定阶段使用降级配置，不影响上述全局状态，
+用于 token 预算超限的会话（见 accounting.py）。
+"""
+import asyncio
+import logging
+import math
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, Iterator, Optional
+
+from config import Config
+from coalescing import _PerLoop
+from metrics import MODEL_DEGRADATIONS, MODEL_DEGRADED, MODEL_PROFILE, LLM_PRESSURE, LLM_QUEUE_WAIT
+
+logger = logging.getLogger(__name__)
+
+# 信号至少需要的样本数，避免冷启动时单次慢调用触发降级
+MIN_SAMPLES = 5
+
+_forced: ContextVar[FrozenSet[str]] = ContextVar("forced_degradation", default=frozenset())
+
+
+@contextmanager
+def force_degraded(stages: Iterable[str]) -> Iterator[None]:
+    """当前上下文内 stages 中的阶段一律使用降级配置。"""
+    token = _forced.set(frozenset(stages))
+    try:
+        yield
+    finally:
+        _forced.reset(token)
+
+
+class _DecayingEwma:
+    """按时间衰减的 EWMA：新样本的权重随距上次观测的时间增大，读取时按空闲时间向 0 衰减。"""
+
+    def __init__(self):
+        self.value = 0.0
+        self.samples = 0
+        self.last_observed = time.monotonic()
+
+    def observe(self, sample: float, now: float) -> None:
+        decay = math.exp(-max(0.0, now - self.last_observed) / Config.DEGRADE_EWMA_DECAY_SECONDS)
+        self.value = self.value * decay + sample * (1 - decay)
+        self.samples += 1
+        self.last_observed = now
+
+    def read(self, now: float) -> float:
+        if self.samples < MIN_SAMPLES:
+            return 0.0
+        return self.value * math.exp(-max(0.0, now - self.last_observed) / Config.DEGRADE_EWMA_DECAY_SECONDS)
+
+
+class _StageState:
+    def __init__(self, rank: int):
+        self.rank = rank
+        self.degraded = False
+        self.since = 0.0
+
+    @property
+    def threshold(self) -> float:
+        return 1.0 + self.rank * Config.DEGRADE_STAGE_STEP
+
+
+class DegradationMonitor:
+    def __init__(self):
+        self.queue_wait = _DecayingEwma()
+        self.latency: Dict[str, _DecayingEwma] = {}
+        self.stages: Dict[str, _StageState] = {
+            stage: _StageState(rank) for rank, stage in enumerate(Config.DEGRADE_STAGES)
+        }
+
+    def observe_queue_wait(self, seconds: float) -> None:
+        self.queue_wait.observe(seconds, time.monotonic())
+
+    def observe_latency(self, model: str, seconds: float) -> None:
+        ewma = self.latency.get(model)
+        if ewma is None:
+            ewma = self.latency[model] = _DecayingEwma()
+        ewma.observe(seconds, time.monotonic())
+
+    def pressure(self, primary, now: float) -> float:
+        """primary 为阶段的主配置（ModelProfile）。"""
+        queue = self.queue_wait.read(now) / Config.DEGRADE_QUEUE_WAIT_SECONDS
+        ewma = self.latency.get(primary.model)
+        latency = ewma.read(now) / (primary.timeout * Config.DEGRADE_LATENCY_RATIO) if ewma else 0.0
+        return max(queue, latency)
+
+    def is_degraded(self, stage: str, primary, degraded) -> bool:
+        """按当前压力更新并返回阶段是否使用降级配置；不在 DEGRADE_STAGES 中（且未被强制降级）的阶段始终为 False。"""
+        if stage in _forced.get():
+            return True
+        state = self.stages.get(stage)
+        if state is None or not Config.DEGRADE_ENABLED:
+            return False
+        now = time.monotonic()
+        pressure = self.pressure(primary, now)
+        LLM_PRESSURE.labels(stage).set(pressure)
+        if not state.degraded and pressure >= state.threshold:
+            self._switch(stage, state, True, pressure, primary, degraded, now)
+        elif (state.degraded and pressure < state.threshold * Config.DEGRADE_RECOVER_RATIO
+              and now - state.since >= Config.DEGRADE_MIN_HOLD_SECONDS):
+            self._switch(stage, state, False, pressure, primary, degraded, now)
+        return state.degraded
+
+    def _switch(self, stage: str, state: _StageState, degrade: bool, pressure: float,
+                primary, degraded, now: float) -> None:
+        state.degraded = degrade
+        state.since = now
+        MODEL_DEGRADATIONS.labels(stage, "degrade" if degrade else "recover").inc()
+        MODEL_DEGRADED.labels(stage).set(1 if degrade else 0)
+        before, after = (primary, degraded) if degrade else (degraded, primary)
+        MODEL_PROFILE.labels(stage, before.model).set(0)
+        MODEL_PROFILE.labels(stage, after.model).set(1)
+        logger.warning("阶段 %s %s：压力 %.2f（阈值 %.2f），模型 %s -> %s", stage,
+                       "降级" if degrade else "恢复", pressure, state.threshold, before.model, after.model,
+                       extra={"stage": stage, "pressure": round(pressure, 3)})
+
+
+_monitor: Optional[DegradationMonitor] = None
+
+
+def get_monitor() -> DegradationMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = DegradationMonitor()
+    return _monitor
+
+
+# ----------------------------------------------------------------------
+# LLM 调用并发控制与计时
+# ----------------------------------------------------------------------
+_slots = _PerLoop(lambda: asyncio.Semaphore(Config.LLM_MAX_CONCURRENCY))
+
+
+@asynccontextmanager
+async def llm_slot(model: str):
+    """占用一个 LLM 并发空位；等待时间计入排队信号，持有期间的耗时计入该模型的延迟信号。"""
+    monitor = get_monitor()
+    semaphore = _slots.get() if Config.LLM_MAX_CONCURRENCY > 0 else None
+    start = time.perf_counter()
+    if semaphore is not None:
+        await semaphore.acquire()
+    acquired = time.perf_counter()
+    LLM_QUEUE_WAIT.observe(acquired - start)
+    monitor.observe_queue_wait(acquired - start)
+    try:
+        yield
+    finally:
+        if semaphore is not None:
+            semaphore.release()
+        monitor.observe_latency(model, time.perf_counter() - acquired)
+
+
+@lru_cache(maxsize=1)
+def gated_chat_model():
+    """返回经过 llm_slot() 的 ChatOpenAI 子类；langchain_openai 在首次调用时才导入。"""
+    from langchain_openai import ChatOpenAI
+
+    class GatedChatOpenAI(ChatOpenAI):
+        async def _agenerate(self, *args, **kwargs):
+            async with llm_slot(self.model_name):
+                return await super()._agenerate(*args, **kwargs)
+
+        async def _astream(self, *args, **kwargs):
+            async with llm_slot(self.model_name):
+                async for chunk in super()._astream(*args, **kwargs):
+                    yield chunk
+
+    return GatedChatOpenAI
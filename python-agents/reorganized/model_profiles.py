@@ -0,0 +1,144 @@
+# model_profiles.py
+"""
+按处理阶段选择模型：router / chitchat / guide / order / payment / parsing 各自对应一个模型配置
+（模型名、temperature、max_tokens、超时）。
+
+默认值：
+- 路由、闲聊与地址解析是分类 / 短文本任务，使用非推理的快速模型 LLM_FAST_MODEL_NAME；
+- 导购、订单、支付子代理需要多步工具调用，沿用 LLM_MODEL_NAME。
+
+部署时可通过 MODEL_PROFILES 覆盖任意阶段的任意字段，取值为 JSON 字符串或 JSON 文件路径，例如:
+    MODEL_PROFILES='{"router": {"model": "Qwen/Qwen2.5-14B-Instruct", "max_tokens": 32}, "guide": {"timeout": 45}}'
+
+每个阶段另有一份降级配置（"<stage>:degraded"，默认为快速模型并只保留最近 DEGRADE_MAX_HISTORY 条历史），
+排队或服务商延迟压力升高时由 model_degradation 切换，同样可通过 MODEL_PROFILES 覆盖，例如:
+    MODEL_PROFILES='{"guide:degraded": {"max_history": 4, "max_tokens": 800}}'
+
+get_llm(stage) 按当前生效的配置缓存 ChatOpenAI 实例，配置相同的阶段共用一个实例；langchain_openai 在首次调用时才导入。
+"""
+import json
+import os
+from dataclasses import dataclass, replace, fields
+from typing import Dict, Any, Optional, List
+
+from langchain_core.messages import BaseMessage
+
+from config import Config
+from cassette import async_http_client
+from metrics import MODEL_PROFILE
+from model_degradation import get_monitor, gated_chat_model
+
+STAGES = ("router", "chitchat", "guide", "order", "payment", "parsing")
+DEGRADED_SUFFIX = ":degraded"
+
+
+@dataclass(frozen=True)
+class ModelProfile:
+    model: str
+    temperature: float
+    max_tokens: Optional[int]
+    timeout: float
+    # 传给模型的最近历史消息条数上限，None 表示不截断
+    max_history: Optional[int] = None
+
+
+def _default_profiles() -> Dict[str, ModelProfile]:
+    fast = Config.LLM_FAST_MODEL_NAME
+    main = Config.LLM_MODEL_NAME
+    return {
+        "router": ModelProfile(fast, 0.0, 32, min(10.0, Config.LLM_TIMEOUT_SECONDS)),
+        "chitchat": ModelProfile(fast, 0.7, 300, min(20.0, Config.LLM_TIMEOUT_SECONDS)),
+        "guide": ModelProfile(main, Config.LLM_TEMPERATURE, None, Config.LLM_TIMEOUT_SECONDS),
+        "order": ModelProfile(main, Config.LLM_TEMPERATURE, 500, Config.LLM_TIMEOUT_SECONDS),
+        "payment": ModelProfile(main, Config.LLM_TEMPERATURE, 500, Config.LLM_TIMEOUT_SECONDS),
+        "parsing": ModelProfile(fast, 0.0, 200, min(15.0, Config.LLM_TIMEOUT_SECONDS)),
+    }
+
+
+def _degraded_profile(primary: ModelProfile) -> ModelProfile:
+    return replace(primary, model=Config.LLM_FAST_MODEL_NAME, max_history=Config.DEGRADE_MAX_HISTORY)
+
+
+def _load_overrides(value: str) -> Dict[str, Dict[str, Any]]:
+    if not value:
+        return {}
+    if os.path.isfile(value):
+        with open(value, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return json.loads(value)
+
+
+def build_profiles(overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, ModelProfile]:
+    """
+    默认配置叠加覆盖项，返回值同时包含 "<stage>:degraded" 降级配置；未知的阶段或字段抛出 ValueError。
+    降级配置以覆盖后的主配置为基础，再叠加其自身的覆盖项。
+    """
+    overrides = overrides or {}
+    profiles = _default_profiles()
+    allowed = {f.name for f in fields(ModelProfile)}
+    for stage, values in overrides.items():
+        if stage.removesuffix(DEGRADED_SUFFIX) not in profiles:
+            raise ValueError(f"MODEL_PROFILES 中的未知阶段: {stage}（可选 {', '.join(STAGES)}，可加后缀 {DEGRADED_SUFFIX}）")
+        unknown = set(values) - allowed
+        if unknown:
+            raise ValueError(f"MODEL_PROFILES.{stage} 中的未知字段: {', '.join(sorted(unknown))}")
+    for stage in STAGES:
+        profiles[stage] = replace(profiles[stage], **overrides.get(stage, {}))
+        degraded = stage + DEGRADED_SUFFIX
+        profiles[degraded] = replace(_degraded_profile(profiles[stage]), **overrides.get(degraded, {}))
+    return profiles
+
+
+_profiles: Optional[Dict[str, ModelProfile]] = None
+_llms: Dict[ModelProfile, Any] = {}
+
+
+def get_profile(stage: str) -> ModelProfile:
+    """阶段的主配置；get_profile("guide:degraded") 返回其降级配置。"""
+    global _profiles
+    if _profiles is None:
+        _profiles = build_profiles(_load_overrides(Config.MODEL_PROFILES))
+        for name in STAGES:
+            MODEL_PROFILE.labels(name, _profiles[name].model).set(1)
+    return _profiles[stage]
+
+
+def active_profile(stage: str) -> ModelProfile:
+    """阶段当前生效的配置：排队压力下为降级配置，否则为主配置。"""
+    primary = get_profile(stage)
+    degraded = get_profile(stage + DEGRADED_SUFFIX)
+    return degraded if get_monitor().is_degraded(stage, primary, degraded) else primary
+
+
+def trim_history(profile: ModelProfile, messages: List[BaseMessage]) -> List[BaseMessage]:
+    """按配置的 max_history 只保留最近的历史消息。"""
+    if profile.max_history is None or len(messages) <= profile.max_history:
+        return messages
+    return messages[-profile.max_history:] if profile.max_history > 0 else []
+
+
+def create_llm(profile: ModelProfile):
+    return gated_chat_model()(
+        model=profile.model,
+        temperature=profile.temperature,
+        max_tokens=profile.max_tokens,
+        api_key=Config.SILICONFLOW_API_KEY,
+        base_url=Config.SILICONFLOW_API_BASE,
+        timeout=profile.timeout,
+        # 执行循环以流式调用模型，需显式请求 usage 才能统计 token 与前缀缓存命中
+        stream_usage=True,
+        http_async_client=async_http_client()
+    )
+
+
+def llm_for(profile: ModelProfile):
+    """返回该配置对应的共享 ChatOpenAI 实例。"""
+    llm = _llms.get(profile)
+    if llm is None:
+        llm = _llms[profile] = create_llm(profile)
+    return llm
+
+
+def get_llm(stage: str):
+    """返回该阶段当前生效配置对应的共享 ChatOpenAI 实例。"""
+    return llm_for(active_profile(stage))
@@ -1,11 +1,13 @@
 # models.py
-from typing import List, Optional, Dict, Any, TypedDict
-from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, TypedDict, Union, Literal
+from pydantic import BaseModel, Field, AliasChoices
 from langchain_core.messages import BaseMessage
 
 # --- Agent 内部数据结构 ---
 class Recommendation(BaseModel):
     product_name: str = Field(..., description="推荐的商品名称")
+    product_id: Optional[str] = Field(None, description="商品ID，取自 search_products 的返回结果")
+    price: Optional[float] = Field(None, description="商品价格（元），取自 search_products 的返回结果")
     reasons: List[str] = Field(..., description="2-3条推荐理由，需突出商品与用户需求的匹配点，并包含关键信息")
 
 class FinalResponse(BaseModel):
@@ -21,18 +23,47 @@ class AddressInfo(BaseModel):
 
 class ProductOrderItem(BaseModel):
     product_id: str = Field(..., description="商品ID")
-    quantity: int = Field(..., description="购买数量")
+    quantity: int = Field(1, ge=1, description="购买数量")
+    unit_price: Optional[float] = Field(None, ge=0, description="单价（元），可选；下单时以商品目录价格为准")
+    product_name: Optional[str] = Field(None, description="商品名称")
 
 class CreateOrderInput(BaseModel):
     """用于 create_order 工具的输入模型"""
     user_id: str = Field(..., description="用户唯一标识符")
-    address: AddressInfo = Field(..., description="收货地址信息")
-    products: List[ProductOrderItem] = Field(..., description="要购买的商品列表")
+    address: Union[AddressInfo, str] = Field(
+        ..., description="收货地址信息，优先使用 {name, phone, detail}；也可以是包含姓名、电话、地址的一段文本"
+    )
+    products: List[ProductOrderItem] = Field(..., min_length=1, description="要购买的商品列表")
+    total_amount: Optional[float] = Field(None, gt=0, description="订单总金额（元），不提供时按商品单价计算")
+
+# --- 订单 / 支付工具的输入模型 ---
+class OrderIdInput(BaseModel):
+    order_id: str = Field(..., description="订单ID")
+
+class UserIdInput(BaseModel):
+    user_id: str = Field(..., description="用户唯一标识符")
+
+class UpdateOrderStatusInput(BaseModel):
+    order_id: str = Field(..., description="订单ID")
+    status: Literal["PAID", "DELIVERED", "FINISHED", "CANCELLED"] = Field(..., description="目标订单状态")
+
+class CreatePaymentInput(BaseModel):
+    order_id: str = Field(..., description="订单ID（orderId 或 id）")
+    user_id: str = Field(..., description="用户唯一标识符")
+    amount: float = Field(..., gt=0, description="支付金额（元），取自订单金额")
+
+class PaymentQueryInput(BaseModel):
+    payment_id: Optional[str] = Field(None, description="支付ID，与 order_id 二选一")
+    order_id: Optional[str] = Field(None, description="订单ID，与 payment_id 二选一")
+
+class RefundInput(BaseModel):
+    payment_id: str = Field(..., description="支付ID")
+    reason: str = Field("用户申请退款", description="退款原因")
 
 # --- 外部商品 API 返回的数据结构 (示例) ---
 # 如果使用外部API，这个模型用于解析API返回的单个商品数据
 class Product(BaseModel):
-    _id: str
+    id: Optional[str] = Field(None, validation_alias=AliasChoices("id", "_id"))
     sku: str
     name: str
     description: str
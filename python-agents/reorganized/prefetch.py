@@ -0,0 +1,130 @@
+# prefetch.py
+"""
+投机预取：监管者路由的 LLM 调用期间，若用户输入看起来与订单 / 支付相关，
+提前并发拉取该用户的订单和支付记录。
+
+预取结果通过 contextvar 挂在当前请求上，OrderServiceAPI.get_orders_by_user /
+PaymentServiceAPI.get_payments_by_user 命中时直接复用（仍在进行中则等待其完成）；
+路由结果确定后取消不再需要的预取，本轮结束时取消所有未被使用的预取。
+"""
+import asyncio
+import contextvars
+import logging
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from config import Config
+from metrics import PREFETCH_RESULTS
+
+logger = logging.getLogger(__name__)
+
+ORDER_KEYWORDS = ("订单", "下单", "购买", "买了", "发货", "物流", "快递", "到货", "取消", "退货", "收货")
+PAYMENT_KEYWORDS = ("支付", "付款", "付钱", "退款", "扣款", "账单", "付了")
+
+_current: contextvars.ContextVar[Optional["SpeculativePrefetch"]] = contextvars.ContextVar(
+    "speculative_prefetch", default=None
+)
+
+
+def predict_targets(user_input: str) -> set:
+    """根据关键词判断需要预取的数据：{"order", "payment"} 的子集。"""
+    targets = set()
+    if any(k in user_input for k in ORDER_KEYWORDS):
+        targets.add("order")
+    if any(k in user_input for k in PAYMENT_KEYWORDS):
+        targets.add("payment")
+    return targets
+
+
+class SpeculativePrefetch:
+    """一轮对话内的预取任务集合，按 (数据类型, 用户ID) 索引。"""
+
+    def __init__(self, user_id: str):
+        self.user_id = str(user_id).strip()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._consumed: set = set()
+
+    def start(self, kind: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> None:
+        # 预取任务在注册 contextvar 之前的上下文中运行，避免读到自身
+        self._tasks[kind] = asyncio.create_task(fetch(), context=contextvars.copy_context())
+
+    async def consume(self, kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """取出预取结果；未预取、用户不匹配或预取失败时返回 None，调用方回退到实时请求。"""
+        task = self._tasks.get(kind)
+        if task is None or kind in self._consumed or str(user_id).strip() != self.user_id:
+            return None
+        self._consumed.add(kind)
+        try:
+            # shield：调用方被取消时取消只作用于本次等待，据此区分“预取被取消”与“调用方被取消”
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if task.cancelled() and not asyncio.current_task().cancelling():
+                PREFETCH_RESULTS.labels(kind, "cancelled").inc()
+                return None
+            # 调用方自身被取消：继续传播，预取结果不会再被使用，一并取消
+            task.cancel()
+            raise
+        except Exception as e:
+            logger.warning(f"预取 {kind} 失败，回退到实时请求: {e}")
+            PREFETCH_RESULTS.labels(kind, "error").inc()
+            return None
+        if not result.get("success"):
+            PREFETCH_RESULTS.labels(kind, "error").inc()
+            return None
+        PREFETCH_RESULTS.labels(kind, "hit").inc()
+        return result
+
+    def discard(self, kind: str) -> None:
+        """写操作之后预取数据可能已过期，不再提供给后续读取。"""
+        task = self._tasks.get(kind)
+        if task is not None and kind not in self._consumed:
+            self._consumed.add(kind)
+            PREFETCH_RESULTS.labels(kind, "discarded").inc()
+            task.cancel()
+
+    def cancel_except(self, keep: Optional[str] = None) -> None:
+        """取消除 keep 以外、尚未被使用的预取任务。"""
+        for kind, task in self._tasks.items():
+            if kind == keep or kind in self._consumed:
+                continue
+            self._consumed.add(kind)
+            PREFETCH_RESULTS.labels(kind, "unused").inc()
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # 标记异常已读取，避免 "exception was never retrieved"
+
+    def activate(self) -> contextvars.Token:
+        return _current.set(self)
+
+    @staticmethod
+    def deactivate(token: contextvars.Token) -> None:
+        _current.reset(token)
+
+
+def start_prefetch(user_input: str, user_id: str,
+                   fetchers: Dict[str, Callable[[], Awaitable[Dict[str, Any]]]]) -> Optional[SpeculativePrefetch]:
+    """按输入启动预取；fetchers 为 {数据类型: 拉取协程工厂}。未命中关键词时返回 None。"""
+    if not Config.PREFETCH_ENABLED or not user_id:
+        return None
+    targets = predict_targets(user_input)
+    if not targets:
+        return None
+    prefetch = SpeculativePrefetch(user_id)
+    for kind in sorted(targets):
+        prefetch.start(kind, fetchers[kind])
+    logger.debug("已启动投机预取", extra={"targets": sorted(targets)})
+    return prefetch
+
+
+async def consume_prefetched(kind: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """供服务 API 调用：当前请求存在对应预取时返回其结果。"""
+    prefetch = _current.get()
+    if prefetch is None:
+        return None
+    return await prefetch.consume(kind, user_id)
+
+
+def discard_prefetched(kind: str) -> None:
+    prefetch = _current.get()
+    if prefetch is not None:
+        prefetch.discard(kind)
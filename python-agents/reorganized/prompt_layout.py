@@ -0,0 +1,37 @@
+# prompt_layout.py
+"""
+对服务商前缀缓存友好的 Prompt 组装。
+
+OpenAI 兼容服务（DeepSeek、SiliconFlow 等）按请求开头的字节前缀复用已计算的 KV 缓存，
+前缀中任何一处不同，其后的内容都要重新计算。因此消息按“越稳定越靠前”排列：
+
+1. 静态指令（system）：进程内不变、所有用户共享，不允许含模板变量；
+2. 会话级上下文（system，可选）：如 User ID，同一会话内不变；
+3. 对话历史：只追加，本轮请求的前缀与上一轮一致；
+4. 本轮输入（human）：只含 {input}，与写入历史的 HumanMessage 内容相同，下一轮仍能命中；
+5. agent_scratchpad（可选）：本轮的工具调用过程。
+
+工具 schema 由 bind_tools 放在请求的 tools 字段，排在所有消息之前；工具列表在代理初始化时固定，
+顺序与内容不随请求变化。
+"""
+from typing import Optional, Sequence, Tuple
+
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+
+
+def layered_prompt(instructions: str, *, static: Sequence[Tuple[str, str]] = (),
+                   session_context: Optional[str] = None, scratchpad: bool = False) -> ChatPromptTemplate:
+    """
+    按上述顺序组装 Prompt。instructions 与 static（额外的静态消息，如示例回复）构成共享前缀，
+    其中出现模板变量时抛出 ValueError，以免请求级的值混入前缀。
+    """
+    prefix = ChatPromptTemplate.from_messages([("system", instructions), *static])
+    if prefix.input_variables:
+        raise ValueError(f"Prompt 的静态前缀不能包含模板变量: {', '.join(prefix.input_variables)}")
+    messages = list(prefix.messages)
+    if session_context:
+        messages.append(("system", session_context))
+    messages += [MessagesPlaceholder(variable_name="chat_history"), ("human", "{input}")]
+    if scratchpad:
+        messages.append(MessagesPlaceholder(variable_name="agent_scratchpad"))
+    return ChatPromptTemplate.from_messages(messages)
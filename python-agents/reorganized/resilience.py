@@ -0,0 +1,228 @@
+# resilience.py
+"""
+下游调用的弹性策略：按接口熔断、幂等 GET 的抖动重试与对冲请求。
+
+- CircuitBreaker：按“服务 + 路由模板”统计最近 CB_WINDOW 次调用，失败率达到 CB_FAILURE_RATIO
+  （且样本数不少于 CB_MIN_REQUESTS）时熔断 CB_OPEN_SECONDS；到期后进入半开状态，
+  只放行 CB_HALF_OPEN_PROBES 个探测请求，探测成功则恢复，失败则重新熔断。
+  熔断期间直接抛出 CircuitOpenError，错误信息可由代理原样转告用户，避免 LLM 反复重试工具；
+- 重试：仅用于幂等 GET，最多 RETRY_MAX_ATTEMPTS 次，退避为 full jitter（0 ~ 基础时长 × 2^n），
+  剩余预算不足以完成退避时不再重试；
+- 对冲：GET 在该接口 p95 延迟（不低于 HEDGE_MIN_DELAY_MS）后仍未返回时，再发一个相同请求，
+  取先成功的结果并取消另一个；对冲次数受令牌桶限制（约为请求数的 HEDGE_MAX_RATIO），避免放大故障。
+
+只有 DownstreamUnavailable（连接失败、超时、5xx）计为失败并触发重试；业务错误（4xx 等）视为接口正常。
+DeadlineExceeded 与取消直接向上传播，不计入熔断统计。
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Dict, Callable, Awaitable, Deque, Optional, TypeVar
+
+from config import Config
+from deadline import remaining
+from metrics import CIRCUIT_STATE, CIRCUIT_REJECTED, DOWNSTREAM_RETRIES, HEDGED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, HALF_OPEN, OPEN = 0, 1, 2
+_STATE_NAMES = {CLOSED: "closed", HALF_OPEN: "half_open", OPEN: "open"}
+# p95 至少需要的延迟样本数，样本不足时不对冲
+MIN_LATENCY_SAMPLES = 20
+LATENCY_WINDOW = 200
+# 对冲令牌桶容量
+HEDGE_BURST = 5.0
+
+
+class DownstreamUnavailable(ValueError):
+    """下游不可用（连接失败、超时、5xx），可重试并计入熔断统计。"""
+
+
+class CircuitOpenError(DownstreamUnavailable):
+    """接口处于熔断状态，请求未发出。"""
+
+    def __init__(self, display_name: str, retry_after: float):
+        super().__init__(f"{display_name}暂时不可用，请约 {max(1, round(retry_after))} 秒后再试。"
+                         f"请直接告知用户稍后重试，不要重复调用该工具。")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(self, service: str, endpoint: str):
+        self.service = service
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.outcomes: Deque[bool] = deque(maxlen=Config.CB_WINDOW)
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + Config.CB_OPEN_SECONDS - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if self.retry_after() > 0:
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.probes >= Config.CB_HALF_OPEN_PROBES:
+                return False
+            self.probes += 1
+        return True
+
+    def record(self, ok: bool) -> None:
+        if self.state == HALF_OPEN:
+            self.probes = max(0, self.probes - 1)
+            if ok:
+                self.outcomes.clear()
+                self._transition(CLOSED)
+            else:
+                self._open()
+            return
+        self.outcomes.append(ok)
+        failures = self.outcomes.count(False)
+        if (self.state == CLOSED and len(self.outcomes) >= Config.CB_MIN_REQUESTS
+                and failures / len(self.outcomes) >= Config.CB_FAILURE_RATIO):
+            self._open()
+
+    def release(self) -> None:
+        """探测请求被取消或预算耗尽、没有结果时归还名额。"""
+        if self.state == HALF_OPEN:
+            self.probes = max(0, self.probes - 1)
+
+    def _open(self) -> None:
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self._transition(OPEN)
+
+    def _transition(self, state: int) -> None:
+        if state != self.state:
+            logger.warning(f"熔断器 {self.service} {self.endpoint}: "
+                           f"{_STATE_NAMES[self.state]} -> {_STATE_NAMES[state]}")
+        self.state = state
+        self.probes = 0
+        CIRCUIT_STATE.labels(self.service, self.endpoint).set(state)
+
+
+class _EndpointStats:
+    """接口的熔断器与最近成功调用的延迟样本。"""
+
+    def __init__(self, service: str, endpoint: str):
+        self.breaker = CircuitBreaker(service, endpoint)
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def hedge_delay(self) -> Optional[float]:
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        p95 = ordered[int(len(ordered) * 0.95) - 1]
+        return max(p95, Config.HEDGE_MIN_DELAY_MS / 1000.0)
+
+
+class ResiliencePolicy:
+    """一个下游服务的弹性策略，按路由模板维护熔断器与延迟统计。"""
+
+    def __init__(self, service: str, display_name: str):
+        self.service = service
+        self.display_name = display_name
+        self._endpoints: Dict[str, _EndpointStats] = {}
+        self._hedge_tokens = HEDGE_BURST
+
+    def _stats(self, endpoint: str) -> _EndpointStats:
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = _EndpointStats(self.service, endpoint)
+        return stats
+
+    async def call(self, endpoint: str, fn: Callable[[], Awaitable[T]], idempotent: bool) -> T:
+        """
+        执行一次下游调用。idempotent 为 True 时允许重试与对冲。
+        熔断时抛出 CircuitOpenError；重试耗尽后抛出最后一次的 DownstreamUnavailable。
+        """
+        if not Config.RESILIENCE_ENABLED:
+            return await fn()
+        stats = self._stats(endpoint)
+        attempts = Config.RETRY_MAX_ATTEMPTS if idempotent else 1
+        for attempt in range(attempts):
+            try:
+                if idempotent and Config.HEDGE_ENABLED:
+                    return await self._hedged(stats, fn)
+                return await self._guarded(stats, fn)
+            except CircuitOpenError:
+                raise
+            except DownstreamUnavailable:
+                if attempt + 1 >= attempts:
+                    raise
+                backoff = random.uniform(0, Config.RETRY_BASE_DELAY_MS / 1000.0 * 2 ** attempt)
+                budget = remaining()
+                if budget is not None and budget <= backoff:
+                    raise
+                DOWNSTREAM_RETRIES.labels(self.service).inc()
+                await asyncio.sleep(backoff)
+
+    async def _guarded(self, stats: _EndpointStats, fn: Callable[[], Awaitable[T]]) -> T:
+        """经熔断器放行后执行单次调用并记录结果。"""
+        breaker = stats.breaker
+        if not breaker.allow():
+            CIRCUIT_REJECTED.labels(self.service).inc()
+            raise CircuitOpenError(self.display_name, breaker.retry_after())
+        start = time.monotonic()
+        try:
+            result = await fn()
+        except DownstreamUnavailable:
+            breaker.record(False)
+            raise
+        except BaseException:
+            # 取消、预算耗尽等不代表接口状态
+            breaker.release()
+            raise
+        breaker.record(True)
+        stats.latencies.append(time.monotonic() - start)
+        return result
+
+    async def _hedged(self, stats: _EndpointStats, fn: Callable[[], Awaitable[T]]) -> T:
+        delay = stats.hedge_delay()
+        self._hedge_tokens = min(HEDGE_BURST, self._hedge_tokens + Config.HEDGE_MAX_RATIO)
+        if delay is None:
+            return await self._guarded(stats, fn)
+
+        primary = asyncio.ensure_future(self._guarded(stats, fn))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self._hedge_tokens >= 1 and stats.breaker.state == CLOSED:
+                self._hedge_tokens -= 1
+                HEDGED_REQUESTS.labels(self.service, "sent").inc()
+                hedge = asyncio.ensure_future(self._guarded(stats, fn))
+                tasks.add(hedge)
+            # 取第一个成功的结果；都失败时抛出先完成者的异常
+            first_error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            HEDGED_REQUESTS.labels(self.service, "won").inc()
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+_policies: Dict[str, ResiliencePolicy] = {}
+
+
+def get_policy(service: str, display_name: str) -> ResiliencePolicy:
+    """按服务共享弹性策略，同一服务的多个客户端实例共用熔断状态。"""
+    policy = _policies.get(service)
+    if policy is None:
+        policy = _policies[service] = ResiliencePolicy(service, display_name)
+    return policy
@@ -0,0 +1,174 @@
+# services/endpoint_pool.py
+"""
+基于 Nacos 服务发现的下游实例池：客户端直连订单 / 支付服务实例，不再经过网关转发。
+
+- 实例列表缓存在进程内，由 lifespan 中的 run_discovery_refresh() 每 DISCOVERY_REFRESH_SECONDS 刷新；
+  刷新失败或返回空列表时保留上次的列表，从未解析成功时回退到配置的网关地址；
+- 负载均衡采用“二选一”（power of two choices）：随机取两个可用实例，选得分较低者，
+  LB_POLICY=least_outstanding 时得分为处理中请求数，ewma 时为 (处理中请求数 + 1) × 延迟 EWMA，均除以实例权重；
+- 被动健康检查：实例连续失败（连接错误、超时、5xx）EJECT_CONSECUTIVE_FAILURES 次后摘除一段时间，
+  摘除时长随摘除次数翻倍；被摘除实例不超过 EJECT_MAX_PERCENT，全部不可用时仍在所有实例中选择。
+
+实例的 metadata 中可用 context-path 声明路径前缀（如离线替身的 /order），Spring 服务默认为空。
+"""
+import asyncio
+import logging
+import math
+import random
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional
+
+from config import Config
+from metrics import DISCOVERY_INSTANCES, ENDPOINT_EJECTIONS
+
+logger = logging.getLogger(__name__)
+
+# 未观测到延迟时的初始 EWMA（毫秒），新实例因此会先得到少量流量
+INITIAL_EWMA_MS = 50.0
+# 摘除时长上限为基础时长的倍数
+MAX_EJECTION_MULTIPLIER = 8
+
+
+@dataclass
+class Endpoint:
+    """单个下游实例及其负载均衡统计。"""
+    ip: str
+    port: int
+    base_url: str
+    weight: float = 1.0
+    outstanding: int = 0
+    ewma_ms: float = INITIAL_EWMA_MS
+    last_observed: float = 0.0
+    consecutive_failures: int = 0
+    ejections: int = 0
+    ejected_until: float = 0.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.ip}:{self.port}"
+
+    def available(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self) -> float:
+        if Config.LB_POLICY == "least_outstanding":
+            load = float(self.outstanding)
+        else:
+            load = (self.outstanding + 1) * self.ewma_ms
+        return load / max(self.weight, 0.01)
+
+    def observe(self, latency_ms: float, now: float) -> None:
+        """按时间衰减的 EWMA：距上次观测越久，旧值权重越低。"""
+        if self.last_observed:
+            decay = math.exp(-(now - self.last_observed) / Config.LB_EWMA_DECAY_SECONDS)
+            self.ewma_ms = self.ewma_ms * decay + latency_ms * (1 - decay)
+        else:
+            self.ewma_ms = latency_ms
+        self.last_observed = now
+
+
+class EndpointPool:
+    def __init__(self, service_name: str, fallback_url: str):
+        self.service_name = service_name
+        self.fallback_url = fallback_url
+        self.endpoints: List[Endpoint] = []
+        self.next_refresh = 0.0
+
+    # ------------------------------------------------------------------
+    # 选择与反馈
+    # ------------------------------------------------------------------
+    def pick(self) -> Optional[Endpoint]:
+        """选择一个实例；尚无发现结果时返回 None，调用方使用 fallback_url。"""
+        endpoints = self.endpoints
+        if not endpoints:
+            return None
+        now = time.monotonic()
+        candidates = [e for e in endpoints if e.available(now)] or endpoints
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if first.score() <= second.score() else second
+
+    def report(self, endpoint: Endpoint, latency_ms: float, ok: bool) -> None:
+        now = time.monotonic()
+        endpoint.observe(latency_ms, now)
+        if ok:
+            endpoint.consecutive_failures = 0
+            if endpoint.available(now):
+                endpoint.ejections = 0
+            return
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= Config.EJECT_CONSECUTIVE_FAILURES and endpoint.available(now):
+            self._eject(endpoint, now)
+
+    def _eject(self, endpoint: Endpoint, now: float) -> None:
+        ejected = sum(1 for e in self.endpoints if not e.available(now))
+        if (ejected + 1) * 100 > len(self.endpoints) * Config.EJECT_MAX_PERCENT:
+            return
+        multiplier = min(2 ** endpoint.ejections, MAX_EJECTION_MULTIPLIER)
+        endpoint.ejected_until = now + Config.EJECT_BASE_SECONDS * multiplier
+        endpoint.ejections += 1
+        endpoint.consecutive_failures = 0
+        ENDPOINT_EJECTIONS.labels(self.service_name).inc()
+        logger.warning(f"{self.service_name} 实例 {endpoint.key} 连续失败，摘除 "
+                       f"{Config.EJECT_BASE_SECONDS * multiplier:.0f} 秒")
+
+    # ------------------------------------------------------------------
+    # 实例列表
+    # ------------------------------------------------------------------
+    def update(self, hosts: List[Dict[str, Any]]) -> None:
+        """用 Nacos 返回的实例列表替换缓存，保留已有实例的统计；空列表不覆盖缓存。"""
+        hosts = [h for h in hosts if h.get("enabled", True) and h.get("healthy", True) and h.get("weight", 1) > 0]
+        if not hosts:
+            if self.endpoints:
+                logger.warning(f"{self.service_name} 未发现可用实例，继续使用缓存的 {len(self.endpoints)} 个实例")
+            return
+        current = {e.key: e for e in self.endpoints}
+        endpoints = []
+        for host in hosts:
+            key = f"{host['ip']}:{host['port']}"
+            endpoint = current.get(key)
+            if endpoint is None:
+                context_path = (host.get("metadata") or {}).get("context-path", "").rstrip("/")
+                endpoint = Endpoint(ip=host["ip"], port=int(host["port"]),
+                                    base_url=f"http://{host['ip']}:{host['port']}{context_path}")
+            endpoint.weight = float(host.get("weight", 1.0))
+            endpoints.append(endpoint)
+        self.endpoints = endpoints
+        DISCOVERY_INSTANCES.labels(self.service_name).set(len(endpoints))
+
+
+# ----------------------------------------------------------------------
+# 实例池注册与后台刷新
+# ----------------------------------------------------------------------
+_pools: Dict[str, EndpointPool] = {}
+
+
+def get_endpoint_pool(service_name: str, fallback_url: str) -> EndpointPool:
+    """按服务名共享实例池；新建的池在下一次刷新循环中立即解析。"""
+    pool = _pools.get(service_name)
+    if pool is None:
+        pool = _pools[service_name] = EndpointPool(service_name, fallback_url)
+    return pool
+
+
+async def run_discovery_refresh(tick: float = 1.0) -> None:
+    """后台刷新所有实例池（由 FastAPI lifespan 启动）；单个服务刷新失败时保留缓存，下一周期重试。"""
+    from services.nacos_client import NacosClient, NacosError
+
+    client = NacosClient()
+    try:
+        while True:
+            now = time.monotonic()
+            for pool in list(_pools.values()):
+                if now < pool.next_refresh:
+                    continue
+                pool.next_refresh = now + Config.DISCOVERY_REFRESH_SECONDS
+                try:
+                    pool.update(await client.list_instances(pool.service_name))
+                except NacosError as e:
+                    logger.warning(f"刷新 {pool.service_name} 实例列表失败，使用缓存: {e}")
+            await asyncio.sleep(tick)
+    finally:
+        await client.close()
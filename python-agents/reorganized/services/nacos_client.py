@@ -0,0 +1,135 @@
+# services/nacos_client.py
+"""
+Nacos 命名服务的异步客户端（基于 Open API v1 + httpx），供服务注册（nacos_registry.py）与服务发现使用。
+
+- NACOS_SERVER_ADDR 可配置多个地址（逗号分隔），请求失败时依次切换；
+- 配置了 NACOS_USERNAME / NACOS_PASSWORD 时先登录获取 accessToken，过期前自动刷新；
+- 所有方法只做协议转换，失败时抛出 NacosError，由调用方决定重试策略。
+"""
+import json
+import logging
+import time
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 心跳返回码：实例不存在（如 Nacos 重启或实例已被摘除），需要重新注册
+BEAT_CODE_NOT_FOUND = 20404
+
+
+class NacosError(RuntimeError):
+    """Nacos 请求失败（所有服务端地址均不可用或返回错误）。"""
+
+
+class NacosClient:
+    def __init__(self, server_addr: Optional[str] = None, namespace: Optional[str] = None,
+                 group: Optional[str] = None, timeout: float = 3.0):
+        addresses = server_addr or Config.NACOS_SERVER_ADDR or ""
+        self.servers = [a.strip() if a.strip().startswith("http") else f"http://{a.strip()}"
+                        for a in addresses.split(",") if a.strip()]
+        if not self.servers:
+            raise ValueError("未配置 NACOS_SERVER_ADDR")
+        self.namespace = namespace if namespace is not None else Config.NACOS_NAMESPACE
+        self.group = group or Config.NACOS_GROUP
+        self.client = httpx.AsyncClient(timeout=timeout)
+        self._current = 0
+        self._token: Optional[str] = None
+        self._token_expires = 0.0
+
+    # ------------------------------------------------------------------
+    # 底层请求
+    # ------------------------------------------------------------------
+    async def _login(self, base: str) -> None:
+        response = await self.client.post(f"{base}/nacos/v1/auth/login", data={
+            "username": Config.NACOS_USERNAME, "password": Config.NACOS_PASSWORD})
+        response.raise_for_status()
+        body = response.json()
+        self._token = body["accessToken"]
+        # 提前 10% 刷新
+        self._token_expires = time.monotonic() + float(body.get("tokenTtl", 18000)) * 0.9
+
+    async def _request(self, method: str, path: str, params: Dict[str, Any]) -> httpx.Response:
+        params = {k: v for k, v in params.items() if v is not None}
+        if self.namespace:
+            params.setdefault("namespaceId", self.namespace)
+        last_error: Optional[Exception] = None
+        # 从上次成功的地址开始，依次尝试所有服务端
+        for offset in range(len(self.servers)):
+            index = (self._current + offset) % len(self.servers)
+            base = self.servers[index]
+            try:
+                if Config.NACOS_USERNAME and (self._token is None or time.monotonic() > self._token_expires):
+                    await self._login(base)
+                if self._token:
+                    params["accessToken"] = self._token
+                response = await self.client.request(method, f"{base}{path}", params=params)
+                if response.status_code == 403 and Config.NACOS_USERNAME:
+                    # token 失效，下次请求重新登录
+                    self._token = None
+                response.raise_for_status()
+                self._current = index
+                return response
+            except httpx.HTTPError as e:
+                last_error = e
+                logger.warning(f"Nacos 请求失败 {method} {base}{path}: {e}")
+        raise NacosError(f"Nacos 请求失败: {last_error}")
+
+    def _instance_params(self, service: str, ip: str, port: int, cluster: Optional[str] = None,
+                         weight: Optional[float] = None, metadata: Optional[Dict[str, str]] = None,
+                         ephemeral: bool = True) -> Dict[str, Any]:
+        return {
+            "serviceName": service, "groupName": self.group, "ip": ip, "port": port,
+            "clusterName": cluster or Config.NACOS_CLUSTER, "weight": weight,
+            "metadata": json.dumps(metadata, ensure_ascii=False) if metadata is not None else None,
+            "ephemeral": str(ephemeral).lower(),
+        }
+
+    # ------------------------------------------------------------------
+    # 实例注册
+    # ------------------------------------------------------------------
+    async def register_instance(self, service: str, ip: str, port: int, weight: float = 1.0,
+                                metadata: Optional[Dict[str, str]] = None, cluster: Optional[str] = None) -> None:
+        await self._request("POST", "/nacos/v1/ns/instance",
+                            self._instance_params(service, ip, port, cluster, weight, metadata or {}))
+
+    async def update_instance(self, service: str, ip: str, port: int, weight: float,
+                              metadata: Optional[Dict[str, str]] = None, cluster: Optional[str] = None) -> None:
+        await self._request("PUT", "/nacos/v1/ns/instance",
+                            self._instance_params(service, ip, port, cluster, weight, metadata))
+
+    async def deregister_instance(self, service: str, ip: str, port: int, cluster: Optional[str] = None) -> None:
+        await self._request("DELETE", "/nacos/v1/ns/instance", self._instance_params(service, ip, port, cluster))
+
+    async def send_beat(self, service: str, ip: str, port: int, weight: float,
+                        metadata: Optional[Dict[str, str]] = None, cluster: Optional[str] = None) -> Dict[str, Any]:
+        """发送临时实例心跳，返回服务端结果（含 code 与 clientBeatInterval）。"""
+        beat = {"serviceName": f"{self.group}@@{service}", "ip": ip, "port": port,
+                "cluster": cluster or Config.NACOS_CLUSTER, "weight": weight,
+                "metadata": metadata or {}, "scheduled": True}
+        response = await self._request("PUT", "/nacos/v1/ns/instance/beat", {
+            "serviceName": service, "groupName": self.group, "ephemeral": "true",
+            "beat": json.dumps(beat, ensure_ascii=False),
+        })
+        try:
+            return response.json()
+        except ValueError:
+            return {}
+
+    # ------------------------------------------------------------------
+    # 服务发现
+    # ------------------------------------------------------------------
+    async def list_instances(self, service: str, healthy_only: bool = True,
+                             clusters: Optional[str] = None) -> List[Dict[str, Any]]:
+        """返回服务的实例列表（ip、port、weight、healthy、enabled、metadata 等字段）。"""
+        response = await self._request("GET", "/nacos/v1/ns/instance/list", {
+            "serviceName": service, "groupName": self.group, "clusters": clusters,
+            "healthyOnly": str(healthy_only).lower(),
+        })
+        return response.json().get("hosts", [])
+
+    async def close(self) -> None:
+        await self.client.aclose()
@@ -0,0 +1,132 @@
+# services/nacos_registry.py
+"""
+在 FastAPI lifespan 内运行的 Nacos 服务注册：启动时注册，按心跳间隔上报负载，关闭时注销。
+
+实例权重随负载调整，网关按权重分配流量，从而避开已饱和的副本：
+    负载率 = max(处理中请求 / INSTANCE_MAX_INFLIGHT, 线程池排队 / INSTANCE_MAX_QUEUE, 事件循环延迟 / 预算)
+    权重   = max(NACOS_MIN_WEIGHT, NACOS_BASE_WEIGHT × (1 - 负载率))，按 0.1 取整以避免频繁更新
+负载明细同时写入实例 metadata（inflight / queue / loop_lag_ms / load），便于排查。
+"""
+import asyncio
+import logging
+import socket
+import time
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+from config import Config
+from metrics import INSTANCE_WEIGHT
+from services.nacos_client import NacosClient, NacosError, BEAT_CODE_NOT_FOUND
+
+logger = logging.getLogger(__name__)
+
+# 事件循环延迟达到该值（毫秒）时视为满载
+LOOP_LAG_BUDGET_MS = 200.0
+
+
+def resolve_service_ip() -> str:
+    """SERVICE_IP 未配置时，取连接 Nacos 所用的本机出口地址（不实际发送数据）。"""
+    if Config.SERVICE_IP:
+        return Config.SERVICE_IP
+    server = Config.NACOS_SERVER_ADDR.split(",")[0].strip()
+    parsed = urlparse(server if "://" in server else f"http://{server}")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        try:
+            sock.connect((parsed.hostname, parsed.port or 8848))
+            return sock.getsockname()[0]
+        except OSError:
+            return socket.gethostbyname(socket.gethostname())
+
+
+def load_snapshot(loop_lag_ms: float, inflight: int, queue: int) -> Dict[str, float]:
+    """当前进程的负载：处理中请求数、线程池（asyncio.to_thread）排队数与事件循环延迟。"""
+    load = max(inflight / Config.INSTANCE_MAX_INFLIGHT, queue / Config.INSTANCE_MAX_QUEUE,
+               loop_lag_ms / LOOP_LAG_BUDGET_MS)
+    return {"inflight": inflight, "queue": queue, "loop_lag_ms": round(loop_lag_ms, 1), "load": min(load, 1.0)}
+
+
+def weight_for(load: float) -> float:
+    weight = Config.NACOS_BASE_WEIGHT * (1.0 - min(load, 1.0))
+    return round(max(Config.NACOS_MIN_WEIGHT, weight), 1)
+
+
+class NacosRegistration:
+    def __init__(self, client: Optional[NacosClient] = None, service_name: Optional[str] = None,
+                 ip: Optional[str] = None, port: Optional[int] = None,
+                 load_probe: Callable[[], Tuple[int, int]] = lambda: (0, 0)):
+        """load_probe 返回（处理中请求数，线程池排队数），由 api_service.load_counters 提供。"""
+        self.client = client or NacosClient()
+        self.service_name = service_name or Config.NACOS_SERVICE_NAME
+        self.ip = ip or resolve_service_ip()
+        self.port = port or Config.SERVICE_PORT
+        self.load_probe = load_probe
+        self.weight = Config.NACOS_BASE_WEIGHT
+        self.metadata: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._registered = False
+
+    async def start(self) -> None:
+        """注册实例并启动心跳任务；Nacos 不可用时不阻止服务启动，由心跳任务继续重试注册。"""
+        try:
+            await self._register()
+        except NacosError as e:
+            logger.error(f"Nacos 注册失败，将在心跳中重试: {e}")
+        self._task = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._registered:
+            try:
+                await self.client.deregister_instance(self.service_name, self.ip, self.port)
+                logger.info(f"服务 {self.service_name} 已从 Nacos 注销 ({self.ip}:{self.port})")
+            except NacosError as e:
+                logger.error(f"Nacos 注销失败: {e}")
+            self._registered = False
+        await self.client.close()
+
+    async def _register(self) -> None:
+        await self.client.register_instance(self.service_name, self.ip, self.port, self.weight,
+                                            self._metadata(load_snapshot(0.0, *self.load_probe())))
+        self._registered = True
+        logger.info(f"服务 {self.service_name} 已注册到 Nacos ({self.ip}:{self.port}, 权重 {self.weight})")
+
+    def _metadata(self, snapshot: Dict[str, float]) -> Dict[str, str]:
+        return {"version": "1.0.0", "startup_mode": Config.STARTUP_MODE,
+                **{key: str(value) for key, value in snapshot.items()}}
+
+    async def _heartbeat_loop(self) -> None:
+        interval = Config.NACOS_HEARTBEAT_INTERVAL
+        while True:
+            # sleep 的实际超时部分即事件循环延迟
+            start = time.monotonic()
+            await asyncio.sleep(interval)
+            lag_ms = max(0.0, (time.monotonic() - start - interval) * 1000)
+            try:
+                await self._report(load_snapshot(lag_ms, *self.load_probe()))
+            except NacosError as e:
+                logger.warning(f"Nacos 心跳失败: {e}")
+            except Exception as e:
+                logger.exception(f"Nacos 心跳任务异常: {e}")
+
+    async def _report(self, snapshot: Dict[str, float]) -> None:
+        if not self._registered:
+            await self._register()
+        weight = weight_for(snapshot["load"])
+        metadata = self._metadata(snapshot)
+        result = await self.client.send_beat(self.service_name, self.ip, self.port, weight, metadata)
+        if result.get("code") == BEAT_CODE_NOT_FOUND:
+            logger.warning("Nacos 中实例不存在，重新注册")
+            self.weight = weight
+            await self._register()
+        elif weight != self.weight:
+            # 心跳不会修改已注册实例的权重，权重变化时显式更新
+            await self.client.update_instance(self.service_name, self.ip, self.port, weight, metadata)
+            logger.info(f"实例权重 {self.weight} -> {weight}（负载 {snapshot['load']:.2f}）")
+            self.weight = weight
+        self.metadata = metadata
+        INSTANCE_WEIGHT.set(self.weight)
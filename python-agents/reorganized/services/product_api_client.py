@@ -1,26 +1,73 @@
 # services/product_api_client.py
 import httpx
 import json
+import logging
 import asyncio  # 【新增】用于异步化 requests
-from typing import List, Dict, Any, Optional
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from urllib.parse import urljoin  # 用于拼接URL
 
 from config import Config
 from models import Product  # 导入Product模型
+from metrics import DOWNSTREAM_LATENCY, POOL_IN_USE, PRODUCT_LOOKUPS
+from cassette import async_transport
+from coalescing import BatchLoader, SingleFlight
+from deadline import DeadlineExceeded, check_deadline, timeout_for
+from resilience import DownstreamUnavailable, get_policy
+
+logger = logging.getLogger(__name__)
+
+
+class ProductAPIError(ValueError):
+    """商品 API 返回错误状态码；status_code 供调用方区分“接口不存在”等情况。"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
 
 
 class ProductAPIClient:
     def __init__(self, base_url: str):
         self.base_url = base_url
-        self.client = httpx.AsyncClient()
-
-    async def _request(self, method: str, endpoint: str, params: Optional[Dict] = None) -> List[Product]:
-        """通用请求方法"""
+        self.client = httpx.AsyncClient(transport=async_transport())
+        # 按ID查询的缓存 {商品ID: (过期时间, 商品)}，按插入顺序淘汰
+        self._cache: "OrderedDict[str, Tuple[float, Product]]" = OrderedDict()
+        # 并发的按ID查询在窗口内合并为一次批量请求；相同的搜索请求共享一次调用
+        self._loader: BatchLoader[str, Product] = BatchLoader("product", self._load_batch)
+        self._singleflight = SingleFlight("product_search")
+        # 批量接口是否可用：None 未知，False 时退化为并发逐个查询
+        self._batch_supported: Optional[bool] = None
+        # 熔断 / 重试 / 对冲；熔断时抛出的 CircuitOpenError 为 ValueError，由工具转为错误信息返回
+        self._policy = get_policy("product", "商品服务")
+
+    async def _request(self, method: str, endpoint: str, params: Optional[Dict] = None,
+                       route: Optional[str] = None) -> List[Product]:
+        """通用请求方法，route 为用于指标标签与熔断分组的路由模板；并发的相同 GET 请求共享一次调用"""
+        idempotent = method.upper() == "GET"
+
+        def call():
+            return self._policy.call(f"{method.upper()} {route or endpoint}",
+                                     lambda: self._send(method, endpoint, params, route), idempotent)
+
+        if idempotent:
+            key = (endpoint, tuple(sorted((params or {}).items())))
+            return await self._singleflight.do(key, call)
+        return await call()
+
+    async def _send(self, method: str, endpoint: str, params: Optional[Dict] = None,
+                    route: Optional[str] = None) -> List[Product]:
         full_url = urljoin(self.base_url, endpoint)
-        print(f"--- Calling Product API: {method.upper()} {full_url} with params: {params} ---")
-        print(f"Actual request URL: {self.client.build_request(method, full_url, params=params).url}")
+        logger.debug("Calling Product API", extra={"method": method.upper(), "url": full_url, "params": params})
+        # 超时取 DOWNSTREAM_TIMEOUT_SECONDS 与本轮剩余预算的较小值
+        timeout = timeout_for("downstream.product", Config.DOWNSTREAM_TIMEOUT_SECONDS)
+        status = "error"
+        start = time.perf_counter()
+        in_use = POOL_IN_USE.labels("product")
+        in_use.inc()
         try:
-            response = await self.client.request(method, full_url, params=params, timeout=10)
+            response = await self.client.request(method, full_url, params=params, timeout=timeout)
+            status = str(response.status_code)
             response.raise_for_status()  # 检查HTTP错误状态码
             data = response.json()
 
@@ -35,26 +82,46 @@ class ProductAPIClient:
             return [Product(**item) for item in data]
 
         except httpx.HTTPStatusError as e:
-            print(f"Product API HTTP Error: {e.response.status_code} - {e.response.text}")
-            raise ValueError(f"商品API请求失败: {e.response.status_code} - {e.response.text}")
+            logger.error(f"Product API HTTP Error: {e.response.status_code}", extra={"body": e.response.text})
+            if e.response.status_code >= 500:
+                raise DownstreamUnavailable(f"商品API请求失败: {e.response.status_code}")
+            raise ProductAPIError(f"商品API请求失败: {e.response.status_code} - {e.response.text}",
+                                  e.response.status_code)
+        except httpx.TimeoutException as e:
+            status = "timeout"
+            check_deadline("downstream.product")
+            logger.error(f"Product API Timeout: {e}")
+            raise DownstreamUnavailable(f"商品API请求超时: {e}")
         except httpx.RequestError as e:
-            print(f"Product API Request Error: {e}")
-            raise ValueError(f"商品API请求失败: {e}")
+            logger.error(f"Product API Request Error: {e}")
+            raise DownstreamUnavailable(f"商品API请求失败: {e}")
         except json.JSONDecodeError:
-            print(f"Product API returned invalid JSON: {response.text}")
+            logger.error("Product API returned invalid JSON", extra={"body": response.text})
             raise ValueError("商品API返回数据格式错误")
+        except DeadlineExceeded:
+            raise
+        except asyncio.CancelledError:
+            # 对冲请求中落后的一方被取消
+            status = "cancelled"
+            raise
         except Exception as e:
-            print(f"Product API Unknown Error: {e}")
+            logger.exception(f"Product API Unknown Error: {e}")
             raise ValueError(f"商品API未知错误: {e}")
+        finally:
+            in_use.dec()
+            DOWNSTREAM_LATENCY.labels("product", route or endpoint, method.upper(), status).observe(
+                time.perf_counter() - start)
 
     async def search_by_name(self, name: str) -> List[Product]:
         return await self._request("GET", "/product/api/products/search", {"name": name})
 
     async def search_by_category(self, category: str) -> List[Product]:
-        return await self._request("GET", f"/product/api/products/category/{category}")
+        return await self._request("GET", f"/product/api/products/category/{category}",
+                                   route="/product/api/products/category/{category}")
 
     async def search_by_brand(self, brand: str) -> List[Product]:
-        return await self._request("GET", f"/product/api/products/brand/{brand}")
+        return await self._request("GET", f"/product/api/products/brand/{brand}",
+                                   route="/product/api/products/brand/{brand}")
 
     async def search_by_price_range(self, min_price: Optional[float] = None, max_price: Optional[float] = None) -> List[
         Product]:
@@ -66,11 +133,80 @@ class ProductAPIClient:
         return await self._request("GET", "/product/api/products/price-range", params)
 
     async def search_by_tag(self, tag: str) -> List[Product]:
-        return await self._request("GET", f"/product/api/products/tag/{tag}")
+        return await self._request("GET", f"/product/api/products/tag/{tag}",
+                                   route="/product/api/products/tag/{tag}")
 
     async def search_available_products(self) -> List[Product]:
         return await self._request("GET", "/product/api/products/available")
 
+    # ------------------------------------------------------------------
+    # 按ID批量查询（缓存 + 请求合并）
+    # ------------------------------------------------------------------
+    async def get_products_by_ids(self, product_ids: List[str]) -> Dict[str, Product]:
+        """
+        按商品ID批量查询，返回 {商品ID: 商品}，不存在的ID不出现在结果中。
+        命中缓存的直接返回；其余ID交给 BatchLoader，与其他协程同时发起的查询合并为一次批量请求。
+        """
+        ids = list(dict.fromkeys(str(pid) for pid in product_ids))
+        result: Dict[str, Product] = {}
+        missing: List[str] = []
+        now = time.monotonic()
+        for pid in ids:
+            cached = self._cache.get(pid)
+            if cached is not None and cached[0] > now:
+                PRODUCT_LOOKUPS.labels("cache_hit").inc()
+                result[pid] = cached[1]
+            else:
+                missing.append(pid)
+        if missing:
+            result.update(await self._loader.load_many(missing))
+        return result
+
+    async def _load_batch(self, ids: List[str]) -> Dict[str, Product]:
+        """BatchLoader 的批量函数：查询并写入缓存。"""
+        fetched = await self._fetch_products(ids)
+        expires = time.monotonic() + Config.PRODUCT_CACHE_TTL
+        for pid in ids:
+            product = fetched.get(pid)
+            if product is None:
+                PRODUCT_LOOKUPS.labels("not_found").inc()
+                continue
+            PRODUCT_LOOKUPS.labels("fetched").inc()
+            self._cache[pid] = (expires, product)
+            self._cache.move_to_end(pid)
+        while len(self._cache) > Config.PRODUCT_CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+        return fetched
+
+    async def _fetch_products(self, ids: List[str]) -> Dict[str, Product]:
+        """
+        优先使用 product-service 的批量接口 GET /api/products/batch?ids=；
+        未部署该接口的旧版本会把 batch 当作商品ID返回 404，此时退化为并发逐个查询，之后不再尝试批量接口。
+        """
+        if self._batch_supported is not False:
+            try:
+                products = await self._request("GET", "/product/api/products/batch", {"ids": ",".join(ids)})
+                self._batch_supported = True
+                return {p.id: p for p in products if p.id}
+            except ProductAPIError as e:
+                if self._batch_supported or e.status_code not in (404, 405):
+                    raise
+                logger.info("商品 API 不支持批量查询，改为并发逐个查询")
+                self._batch_supported = False
+
+        async def _fetch_one(pid: str) -> Optional[Product]:
+            try:
+                products = await self._request("GET", f"/product/api/products/{pid}",
+                                               route="/product/api/products/{product_id}")
+            except ProductAPIError as e:
+                if e.status_code == 404:
+                    return None
+                raise
+            return products[0] if products else None
+
+        products = await asyncio.gather(*(_fetch_one(pid) for pid in ids))
+        return {pid: product for pid, product in zip(ids, products) if product is not None}
+
     async def close(self):
         """关闭 httpx 客户端会话"""
         await self.client.aclose()
@@ -0,0 +1,115 @@
+# services/rest_client.py
+import asyncio
+import copy
+import logging
+import time
+from typing import Dict, Any, Optional
+
+import requests
+
+from cassette import mount_session
+from coalescing import SingleFlight
+from config import Config
+from deadline import DeadlineExceeded, check_deadline, timeout_for, with_deadline
+from metrics import DOWNSTREAM_LATENCY, POOL_IN_USE
+from prefetch import discard_prefetched
+from resilience import DownstreamUnavailable, get_policy
+from services.endpoint_pool import EndpointPool, get_endpoint_pool
+
+
+class RestServiceAPI:
+    """
+    下游 REST 服务（订单 / 支付）封装基类。
+    统一请求发送、耗时统计与错误处理，返回 {"success": ..., "data"/"error": ...} 结构。
+    启用服务发现（DISCOVERY_ENABLED）且指定了 discovery_service 时直连发现的实例，base_url 仅作回退地址。
+    调用经过 resilience 的熔断 / 重试 / 对冲策略，下游不可用时返回可直接转告用户的错误信息。
+    """
+    service_name: str = "downstream"
+    display_name: str = "下游服务"
+
+    def __init__(self, base_url: str, discovery_service: Optional[str] = None):
+        self.base_url = base_url
+        self.pool: Optional[EndpointPool] = None
+        if Config.DISCOVERY_ENABLED and discovery_service:
+            self.pool = get_endpoint_pool(discovery_service, base_url)
+        self.session = mount_session(requests.Session())
+        self.logger = logging.getLogger(type(self).__module__)
+        self._singleflight = SingleFlight(self.service_name)
+        self._policy = get_policy(self.service_name, self.display_name)
+
+    async def _request(self, method: str, path: str, endpoint: str, error_message: str,
+                       json_body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        发送请求并记录耗时。
+        endpoint 为路由模板（如 /api/orders/{order_id}），用作指标标签以避免高基数。
+        并发的相同 GET 请求共享一次下游调用，各调用方拿到结果的独立副本。
+        """
+        if method == "GET":
+            result = await self._singleflight.do(path, lambda: self._call(method, path, endpoint, error_message))
+            return copy.deepcopy(result)
+        # 写操作后本轮的预取数据可能已过期
+        discard_prefetched(self.service_name)
+        return await self._call(method, path, endpoint, error_message, json_body)
+
+    async def _call(self, method: str, path: str, endpoint: str, error_message: str,
+                    json_body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """只有 GET 视为幂等、允许重试与对冲；熔断或重试耗尽时转换为失败结果。"""
+        try:
+            return await self._policy.call(
+                f"{method} {endpoint}", lambda: self._send(method, path, endpoint, error_message, json_body),
+                idempotent=method == "GET")
+        except DownstreamUnavailable as e:
+            return {"success": False, "error": str(e)}
+
+    async def _send(self, method: str, path: str, endpoint: str, error_message: str,
+                    json_body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        发送单次请求。requests 在线程中执行、无法取消，超时取 DOWNSTREAM_TIMEOUT_SECONDS 与本轮剩余预算的较小值；
+        预算耗尽时抛出 DeadlineExceeded，而不是返回失败结果；连接失败、超时与 5xx 抛出 DownstreamUnavailable。
+        """
+        stage = f"downstream.{self.service_name}"
+        timeout = timeout_for(stage, Config.DOWNSTREAM_TIMEOUT_SECONDS)
+        instance = self.pool.pick() if self.pool is not None else None
+        url = f"{instance.base_url if instance else self.base_url}{path}"
+        status = "error"
+        start = time.perf_counter()
+        in_use = POOL_IN_USE.labels(self.service_name)
+        in_use.inc()
+        if instance is not None:
+            instance.outstanding += 1
+        try:
+            response = await with_deadline(
+                asyncio.to_thread(self.session.request, method, url, json=json_body, timeout=timeout), stage)
+            status = str(response.status_code)
+            if response.status_code >= 500:
+                self.logger.error(f"{error_message}: HTTP {response.status_code}")
+                raise DownstreamUnavailable(f"{error_message}: {self.display_name}返回 {response.status_code}")
+            response.raise_for_status()
+            return {"success": True, "data": response.json() if response.content else {}}
+        except DeadlineExceeded:
+            status = "deadline"
+            raise
+        except asyncio.CancelledError:
+            # 对冲请求中落后的一方被取消
+            status = "cancelled"
+            raise
+        except DownstreamUnavailable:
+            raise
+        except (requests.Timeout, requests.ConnectionError) as e:
+            # 超时由剩余预算决定时，按预算耗尽处理
+            status = "timeout" if isinstance(e, requests.Timeout) else "error"
+            check_deadline(stage)
+            self.logger.error(f"{error_message}: {str(e)}")
+            raise DownstreamUnavailable(f"{error_message}: {self.display_name}连接失败或超时")
+        except Exception as e:
+            self.logger.error(f"{error_message}: {str(e)}")
+            return {"success": False, "error": str(e)}
+        finally:
+            in_use.dec()
+            elapsed = time.perf_counter() - start
+            DOWNSTREAM_LATENCY.labels(self.service_name, endpoint, method, status).observe(elapsed)
+            if instance is not None:
+                instance.outstanding -= 1
+                # 预算耗尽与取消不是实例的问题，不计入健康统计；4xx 为业务错误，实例视为正常
+                if status not in ("deadline", "cancelled"):
+                    self.pool.report(instance, elapsed * 1000, ok=status.isdigit() and int(status) < 500)
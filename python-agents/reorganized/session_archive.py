@@ -0,0 +1,87 @@
+# session_archive.py
+"""
+会话冷存储：空闲会话的检查点从 Redis 降级到本地 SQLite 归档，下次访问时再提升回 Redis。
+
+- 每次降级插入一行（会话ID, 用户ID, 降级时间, 检查点原始字节），同时按索引删除该会话的旧行，读取时取该会话最新一行；
+  存储的是 checkpoint_codec 编码后的字节，不做转换；
+- 超过 SESSION_ARCHIVE_RETENTION_DAYS 的行由 prune() 分批清理，批次之间释放锁，不阻塞会话的读取与提升；
+- sqlite3 为阻塞调用，调用方通过 asyncio.to_thread 执行；WAL 模式允许多个进程同时读写同一文件。
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+# prune() 每批删除的行数
+PRUNE_BATCH_SIZE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_archive (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    thread_id TEXT NOT NULL,
+    user_id TEXT,
+    archived_at REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_session_archive_thread ON session_archive (thread_id, id);
+"""
+
+
+class SessionArchive:
+    """基于 SQLite 的只追加会话归档，线程安全。"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def append(self, thread_id: str, data: bytes, user_id: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row_id = self._conn.execute(
+                    "INSERT INTO session_archive (thread_id, user_id, archived_at, data) VALUES (?, ?, ?, ?)",
+                    (thread_id, user_id, time.time(), data)).lastrowid
+                # 新行覆盖该会话之前的归档
+                self._conn.execute("DELETE FROM session_archive WHERE thread_id = ? AND id < ?", (thread_id, row_id))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, thread_id: str) -> Optional[Tuple[bytes, Optional[str]]]:
+        """返回会话最近一次归档的 (检查点, 用户ID)，不存在时返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, user_id FROM session_archive WHERE thread_id = ? ORDER BY id DESC LIMIT 1",
+                (thread_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def prune(self, retention_seconds: float, batch_size: int = PRUNE_BATCH_SIZE) -> int:
+        """
+        分批删除超过保留期的行，返回删除行数。
+        id 随归档时间递增，过期行集中在表头，每批只扫描到凑满 batch_size 行为止。
+        """
+        cutoff = time.time() - retention_seconds
+        total = 0
+        while True:
+            with self._lock:
+                deleted = self._conn.execute(
+                    "DELETE FROM session_archive WHERE id IN "
+                    "(SELECT id FROM session_archive WHERE archived_at < ? ORDER BY id LIMIT ?)",
+                    (cutoff, batch_size)
+                ).rowcount
+            total += deleted
+            if deleted < batch_size:
+                return total
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
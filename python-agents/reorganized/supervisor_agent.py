@@ -1,36 +1,71 @@
 import logging
 import asyncio
-import orjson
+import importlib
+import time
 from typing import Dict, Any, List, Optional, AsyncIterator, Literal
 from datetime import datetime, timezone
 
 import redis
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
 from pydantic import BaseModel, Field
-from langsmith import Client
-from langchain import hub # <-- 新增导入
 
-from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.base import BaseCheckpointSaver, Checkpoint, CheckpointTuple
 
 from config import Config
+from model_profiles import get_llm, active_profile, llm_for, trim_history
 from models import AgentState
-from agents.guide_agent import get_guide_agent, GuideAgent
-from agents.order_agent import get_order_agent, OrderAgent
-from agents.payment_agent import get_payment_agent, PaymentAgent
+from metrics import MetricsCallbackHandler, timed_stage, track_redis_pool, track_turn_usage, SESSION_TIER_MOVES
+from logging_setup import SAMPLED
+from prefetch import SpeculativePrefetch, start_prefetch
+from session_archive import SessionArchive
+from checkpoint_codec import CheckpointCodecError, encode_checkpoint, decode_checkpoint
+from deadline import DeadlineExceeded, with_deadline
+from model_degradation import force_degraded
+from accounting import budget_degraded_stages, record_turn
 
 logger = logging.getLogger(__name__)
 
+# 子代理按需加载：名称 -> (模块, 工厂函数)。
+# 子代理模块会引入 langchain.agents / langchain_openai 等重量级依赖，延迟到首次使用（或后台预热）时再导入。
+AGENT_FACTORIES: Dict[str, tuple] = {
+    "guide": ("agents.guide_agent", "get_guide_agent"),
+    "order": ("agents.order_agent", "get_order_agent"),
+    "payment": ("agents.payment_agent", "get_payment_agent"),
+}
+
+# 本轮请求超出时间预算时返回给用户的提示
+DEADLINE_EXCEEDED_RESPONSE = "抱歉，本次请求处理超时，请稍后重试。"
+
 
 # --- 自定义 Redis Checkpointer 实现 (已修改) ---
 class RedisCheckpointer(BaseCheckpointSaver):
+    """
+    热数据在 Redis：检查点按 SESSION_TTL_SECONDS 滑动过期，读写都会续期；
+    后台任务（run_maintenance）把空闲会话降级到 SQLite 冷归档，aget_tuple 在 Redis 未命中时从归档读取并提升回 Redis。
+
+    会话索引与检查点在同一事务中更新，读取时也刷新活跃时间（见 _read）：
+    - ACTIVITY_KEY：全部热会话，按最近活跃时间排序（ZSET，member 为会话ID）；
+    - USER_INDEX_PREFIX + 用户ID：该用户的热会话（ZSET）；
+    - OWNER_KEY：会话ID -> 用户ID（HASH），降级 / 过期清理时据此维护用户索引。
+    alist 按索引分页，每页用流水线化的 MGET 批量读取检查点，不再 SCAN 整个键空间。
+    """
+    ACTIVITY_KEY = "langgraph:session_activity"
+    USER_INDEX_PREFIX = "langgraph:session_activity:user:"
+    OWNER_KEY = "langgraph:session_owner"
+    MGET_CHUNK = 100
+
     def __init__(self):
         super().__init__()
+        self.archive: Optional[SessionArchive] = None
+        if Config.SESSION_ARCHIVE_ENABLED:
+            self.archive = SessionArchive(Config.SESSION_ARCHIVE_PATH)
         try:
-            self.redis = redis.Redis.from_url(Config.REDIS_URL, decode_responses=False)
+            self.redis = redis.Redis.from_url(
+                Config.REDIS_URL, decode_responses=False,
+                socket_timeout=Config.REDIS_TIMEOUT_SECONDS, socket_connect_timeout=Config.REDIS_TIMEOUT_SECONDS
+            )
             self.redis.ping()
+            track_redis_pool("redis_checkpoint", self.redis)
             logger.info(f"✅ RedisCheckpointer: 成功连接到 Redis 服务器: {Config.REDIS_URL}")
         except redis.ConnectionError as e:
             logger.error(f"❌ RedisCheckpointer: 无法连接到 Redis 服务器: {Config.REDIS_URL}. 错误详情: {e}")
@@ -43,30 +78,64 @@ class RedisCheckpointer(BaseCheckpointSaver):
         return f"langgraph:checkpoint:{thread_id}"
 
     def _serialize_checkpoint(self, checkpoint: Checkpoint) -> bytes:
-        # 使用 .dict() 方法进行序列化，以兼容 Pydantic V1/V2
-        serializable_checkpoint = checkpoint.copy()
-        if 'channel_values' in serializable_checkpoint and 'chat_history' in serializable_checkpoint['channel_values']:
-            serializable_checkpoint['channel_values']['chat_history'] = [
-                msg.dict() for msg in serializable_checkpoint['channel_values']['chat_history']
-            ]
-        return orjson.dumps(serializable_checkpoint)
+        # 紧凑编码（版本字节 + msgpack，可选 zstd），见 checkpoint_codec.py
+        return encode_checkpoint(checkpoint)
+
+    def _user_index_key(self, user_id: str) -> str:
+        return f"{self.USER_INDEX_PREFIX}{user_id}"
+
+    def _write(self, thread_id: str, data: bytes, user_id: Optional[str] = None, nx: bool = False) -> None:
+        """写入检查点并更新会话索引（同一事务）；nx=True 时不覆盖已存在的检查点。"""
+        now = time.time()
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._get_key(thread_id), data, ex=Config.SESSION_TTL_SECONDS, nx=nx)
+            pipe.zadd(self.ACTIVITY_KEY, {thread_id: now})
+            if user_id:
+                user_key = self._user_index_key(user_id)
+                pipe.zadd(user_key, {thread_id: now})
+                # 顺带清理该用户已过期的会话，并让长期不活跃用户的索引自行过期
+                pipe.zremrangebyscore(user_key, "-inf", now - Config.SESSION_TTL_SECONDS)
+                pipe.expire(user_key, Config.SESSION_TTL_SECONDS)
+                pipe.hset(self.OWNER_KEY, thread_id, user_id)
+            pipe.execute()
+
+    def _read(self, thread_id: str) -> Optional[bytes]:
+        """
+        读取检查点并记为一次活动：GETEX 续期，同一往返中以 ZADD XX 刷新活跃索引（_demote_idle 按此挑选空闲会话），
+        并取回会话所属用户；会话有所属用户时再刷新该用户的索引。
+        """
+        now = time.time()
+        with self.redis.pipeline(transaction=False) as pipe:
+            pipe.getex(self._get_key(thread_id), ex=Config.SESSION_TTL_SECONDS)
+            pipe.zadd(self.ACTIVITY_KEY, {thread_id: now}, xx=True)
+            pipe.hget(self.OWNER_KEY, thread_id)
+            data, _, owner = pipe.execute()
+        if data and owner:
+            self.redis.zadd(self._user_index_key(owner.decode("utf-8")), {thread_id: now}, xx=True)
+        return data
+
+    async def _promote(self, thread_id: str) -> Optional[bytes]:
+        """从冷归档读取会话并写回 Redis；归档中也不存在时返回 None。"""
+        archived = await asyncio.to_thread(self.archive.get, thread_id)
+        if archived is None:
+            return None
+        data, user_id = archived
+        await asyncio.to_thread(self._write, thread_id, data, user_id, True)
+        SESSION_TIER_MOVES.labels("promoted").inc()
+        logger.info("会话已从冷归档提升", extra={"session_id": thread_id})
+        return data
 
     async def aget_tuple(self, config: Dict[str, Any]) -> Optional[CheckpointTuple]:
         thread_id = config["configurable"]["thread_id"]
         key = self._get_key(thread_id)
         try:
-            data = await asyncio.to_thread(self.redis.get, key)
+            with timed_stage("checkpoint_load"):
+                data = await with_deadline(
+                    asyncio.to_thread(self._read, thread_id), "checkpoint_load")
+                if not data and self.archive is not None:
+                    data = await with_deadline(self._promote(thread_id), "checkpoint_promote")
             if data:
-                checkpoint_dict = orjson.loads(data)
-                if 'channel_values' in checkpoint_dict and 'chat_history' in checkpoint_dict['channel_values']:
-                    history_dicts = checkpoint_dict['channel_values']['chat_history']
-                    rehydrated_history = []
-                    for msg_dict in history_dicts:
-                        if msg_dict.get('type') == 'ai':
-                            rehydrated_history.append(AIMessage(**msg_dict))
-                        elif msg_dict.get('type') == 'human':
-                            rehydrated_history.append(HumanMessage(**msg_dict))
-                    checkpoint_dict['channel_values']['chat_history'] = rehydrated_history
+                checkpoint_dict = decode_checkpoint(data)
 
                 # 【修正 1】为 CheckpointTuple 提供所有必需的参数
                 return CheckpointTuple(
@@ -76,19 +145,108 @@ class RedisCheckpointer(BaseCheckpointSaver):
                     parent_config=checkpoint_dict.get('parent_config')
                 )
             return None
+        except DeadlineExceeded:
+            raise
+        except (redis.RedisError, CheckpointCodecError) as e:
+            # 连接 / 超时错误、缺少 zstd 字典等不代表检查点损坏，不删除
+            logger.error(f"从 Redis aget_tuple 失败: {e}")
+            return None
         except Exception as e:
             logger.error(f"从 Redis aget_tuple 失败: {e}")
             await asyncio.to_thread(self.redis.delete, key)
             return None
 
-    async def alist(self, config: Optional[Dict[str, Any]] = None) -> AsyncIterator[CheckpointTuple]:
-        thread_id_prefix = "langgraph:checkpoint:"
-        keys_iterator = asyncio.to_thread(self.redis.scan_iter, f"{thread_id_prefix}*")
-        async for key_bytes in keys_iterator:
-            key = key_bytes.decode('utf-8')
-            thread_id = key[len(thread_id_prefix):]
-            if tuple_data := await self.aget_tuple({"configurable": {"thread_id": thread_id}}):
+    async def alist(
+            self,
+            config: Optional[Dict[str, Any]] = None,
+            *,
+            filter: Optional[Dict[str, Any]] = None,
+            before: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """
+        按最近活跃时间倒序列出 Redis 中的热会话（已降级到冷归档的会话不在其中）。
+        - config 指定 thread_id 时只返回该会话；
+        - filter 支持 user_id、active_since / active_until（Unix 时间戳，闭区间）；
+        - before 为某个会话的 config，只返回比它更早活跃的会话，用于翻页。
+        """
+        if config and config.get("configurable", {}).get("thread_id"):
+            if tuple_data := await self.aget_tuple(config):
                 yield tuple_data
+            return
+
+        filter = filter or {}
+        index_key = self._user_index_key(filter["user_id"]) if filter.get("user_id") else self.ACTIVITY_KEY
+        max_score = filter.get("active_until", "+inf")
+        seen_at_max: set = set()
+        if before:
+            cursor = before["configurable"]["thread_id"]
+            before_score = await asyncio.to_thread(self.redis.zscore, index_key, cursor)
+            if before_score is None:
+                return
+            if max_score == "+inf" or before_score <= float(max_score):
+                # 与 _index_pages 相同的并列处理：上界含游标分数，跳过该分数上排在游标及其之前的会话
+                # （倒序时同分成员按成员名逆字典序排列）
+                max_score = before_score
+                ties = await asyncio.to_thread(self.redis.zrevrangebyscore, index_key, before_score, before_score)
+                seen_at_max = {m for m in (t.decode("utf-8") for t in ties) if m >= cursor}
+        min_score = filter.get("active_since", "-inf")
+
+        remaining = limit
+        async for thread_ids in self._index_pages(index_key, min_score, max_score, seen_at_max):
+            if remaining is not None:
+                thread_ids = thread_ids[:remaining]
+            values = await asyncio.to_thread(self._mget, thread_ids)
+            for thread_id, data in zip(thread_ids, values):
+                # 索引条目可能已过期或刚被降级，跳过
+                if not data:
+                    continue
+                try:
+                    checkpoint_dict = decode_checkpoint(data)
+                except Exception as e:
+                    logger.warning(f"解码检查点失败，跳过会话 {thread_id}: {e}")
+                    continue
+                yield CheckpointTuple(
+                    config={"configurable": {"thread_id": thread_id}},
+                    checkpoint=checkpoint_dict,
+                    metadata=checkpoint_dict.get('metadata', {}),
+                    parent_config=checkpoint_dict.get('parent_config')
+                )
+                if remaining is not None:
+                    remaining -= 1
+                    if remaining <= 0:
+                        return
+
+    async def _index_pages(self, index_key: str, min_score: Any, max_score: Any,
+                           seen_at_max: Optional[set] = None) -> AsyncIterator[List[str]]:
+        """
+        按分数游标倒序翻页（避免 LIMIT offset 在深翻页时的开销），每页 SESSION_LIST_PAGE_SIZE 个会话ID。
+        下一页以上一页最后的分数为上界（含），并跳过该分数上已返回的会话，分数相同也不会遗漏或重复。
+        seen_at_max 为 max_score 分数上需要跳过的会话（alist 的 before 游标）。
+        """
+        page_size = Config.SESSION_LIST_PAGE_SIZE
+        seen_at_max = set(seen_at_max or ())
+        while True:
+            rows = await asyncio.to_thread(
+                self.redis.zrevrangebyscore, index_key, max_score, min_score,
+                start=0, num=page_size + len(seen_at_max), withscores=True)
+            page = [(member.decode("utf-8"), score) for member, score in rows]
+            fresh = [(m, sc) for m, sc in page if m not in seen_at_max]
+            if fresh:
+                yield [m for m, _ in fresh]
+            if len(rows) < page_size + len(seen_at_max) or not fresh:
+                return
+            last_score = fresh[-1][1]
+            seen_at_max = {m for m, sc in page if sc == last_score}
+            max_score = last_score
+
+    def _mget(self, thread_ids: List[str]) -> List[Optional[bytes]]:
+        """一次往返中按块发送多个 MGET，避免单条命令过大阻塞 Redis。"""
+        keys = [self._get_key(t) for t in thread_ids]
+        with self.redis.pipeline(transaction=False) as pipe:
+            for start in range(0, len(keys), self.MGET_CHUNK):
+                pipe.mget(keys[start:start + self.MGET_CHUNK])
+            return [value for chunk in pipe.execute() for value in chunk]
 
     async def aput(
             self,
@@ -97,16 +255,113 @@ class RedisCheckpointer(BaseCheckpointSaver):
             metadata: Optional[Dict[str, Any]] = None,
     ) -> Dict[str, Any]:
         thread_id = config["configurable"]["thread_id"]
-        key = self._get_key(thread_id)
         # 在保存前确保 metadata 存在
         if metadata:
             checkpoint['metadata'] = metadata
-        serialized_checkpoint = self._serialize_checkpoint(checkpoint)
-        await asyncio.to_thread(
-            self.redis.set, key, serialized_checkpoint, ex=3600
-        )
+        user_id = (metadata or {}).get("user_id")
+        # 保存发生在回复已生成之后，不受本轮截止时间约束，只由 Redis 套接字超时兜底
+        with timed_stage("checkpoint_save"):
+            serialized_checkpoint = self._serialize_checkpoint(checkpoint)
+            await asyncio.to_thread(self._write, thread_id, serialized_checkpoint, user_id)
         return {"configurable": {"thread_id": thread_id}}
 
+    # ------------------------------------------------------------------
+    # 后台维护：空闲会话降级、清理
+    # ------------------------------------------------------------------
+    def _demote_idle(self, idle_seconds: float, batch: int) -> int:
+        """把空闲超过 idle_seconds 的会话归档后从 Redis 删除（含索引），返回降级的会话数。"""
+        cutoff = time.time() - idle_seconds
+        demoted = 0
+        for raw in self.redis.zrangebyscore(self.ACTIVITY_KEY, "-inf", cutoff, start=0, num=batch):
+            thread_id = raw.decode("utf-8")
+            key = self._get_key(thread_id)
+            with self.redis.pipeline() as pipe:
+                try:
+                    # WATCH 检查点：降级期间会话被读写（续期 / 覆盖）时放弃本次降级
+                    pipe.watch(key)
+                    score = pipe.zscore(self.ACTIVITY_KEY, thread_id)
+                    if score is None or score > cutoff:
+                        continue
+                    data = pipe.get(key)
+                    owner = pipe.hget(self.OWNER_KEY, thread_id)
+                    user_id = owner.decode("utf-8") if owner else None
+                    if data is not None:
+                        self.archive.append(thread_id, data, user_id)
+                    pipe.multi()
+                    pipe.delete(key)
+                    self._unindex(pipe, thread_id, user_id)
+                    pipe.execute()
+                except redis.WatchError:
+                    continue
+            if data is not None:
+                demoted += 1
+        return demoted
+
+    def _unindex(self, pipe, thread_id: str, user_id: Optional[str]) -> None:
+        pipe.zrem(self.ACTIVITY_KEY, thread_id)
+        pipe.hdel(self.OWNER_KEY, thread_id)
+        if user_id:
+            pipe.zrem(self._user_index_key(user_id), thread_id)
+
+    def _sweep_expired(self, batch: int) -> int:
+        """未启用冷归档时，从索引中移除检查点已按 TTL 过期的会话，返回移除数。"""
+        cutoff = time.time() - Config.SESSION_TTL_SECONDS
+        thread_ids = [raw.decode("utf-8") for raw in
+                      self.redis.zrangebyscore(self.ACTIVITY_KEY, "-inf", cutoff, start=0, num=batch)]
+        if not thread_ids:
+            return 0
+        owners = self.redis.hmget(self.OWNER_KEY, thread_ids)
+        with self.redis.pipeline(transaction=True) as pipe:
+            for thread_id, owner in zip(thread_ids, owners):
+                self._unindex(pipe, thread_id, owner.decode("utf-8") if owner else None)
+            pipe.execute()
+        return len(thread_ids)
+
+    @staticmethod
+    async def _in_thread(fn, *args):
+        """在线程中执行；任务被取消时先等线程中的调用结束再传播取消，保证 close() 之后不再有写入。"""
+        future = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            await asyncio.wait([future])
+            raise
+
+    async def run_maintenance(self) -> None:
+        """
+        后台循环：启用冷归档时每 SESSION_DEMOTE_INTERVAL_SECONDS 降级一批空闲会话；
+        未启用时只从会话索引中清理已过期的会话。由 api_service 的 lifespan 启动，关闭时取消并等待其结束后再 close()。
+        """
+        last_prune = time.monotonic()
+        while True:
+            await asyncio.sleep(Config.SESSION_DEMOTE_INTERVAL_SECONDS)
+            try:
+                if self.archive is None:
+                    while await self._in_thread(self._sweep_expired, Config.SESSION_DEMOTE_BATCH) \
+                            >= Config.SESSION_DEMOTE_BATCH:
+                        pass
+                    continue
+                while True:
+                    with timed_stage("session_demote"):
+                        demoted = await self._in_thread(
+                            self._demote_idle, Config.SESSION_IDLE_SECONDS, Config.SESSION_DEMOTE_BATCH)
+                    if demoted:
+                        SESSION_TIER_MOVES.labels("demoted").inc(demoted)
+                        logger.info(f"已降级 {demoted} 个空闲会话到冷归档")
+                    if demoted < Config.SESSION_DEMOTE_BATCH:
+                        break
+                if time.monotonic() - last_prune > 3600:
+                    pruned = await self._in_thread(
+                        self.archive.prune, Config.SESSION_ARCHIVE_RETENTION_DAYS * 86400)
+                    last_prune = time.monotonic()
+                    logger.info(f"冷归档清理完成，删除 {pruned} 行")
+            except Exception as e:
+                logger.warning(f"会话维护任务失败: {e}")
+
+    def close(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+
 
 # --- 监管者路由决策层 ---
 class Router(BaseModel):
@@ -116,60 +371,20 @@ class Router(BaseModel):
     )
 
 
-async def supervisor_router(state: AgentState) -> Dict[str, Any]:
-    """
-    这个函数是一个无状态的路由决策节点。
-    """
-    logger.info("---进入 Supervisor 路由决策---")
-    user_input = state["user_input"]
-    chat_history = state.get("chat_history", [])
+def get_supervisor_llm():
+    """路由决策使用的 LLM（router 阶段的模型配置），首次调用时才导入 langchain_openai。"""
+    return get_llm("router")
 
-    # 【核心修改】从 LangSmith Hub 拉取 Prompt，并提供本地备用方案
-    try:
-        # 从 LangChain Hub 拉取您已经创建好的 Prompt
-        prompt = hub.pull("ecomm-supervisor-next")
-        logger.info("✅ 成功从 LangChain Hub 拉取 Prompt: ecomm-supervisor-next")
-    except Exception as e:
-        logger.warning(f"⚠️ 从 LangChain Hub 拉取 Prompt 失败: {e}。将使用本地备用 Prompt。")
-        # 如果拉取失败（例如网络问题或Prompt不存在），则使用代码中定义的备用Prompt
-        prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", """你是一个顶级智能客服调度中心。你的职责是根据用户的最新请求和完整的对话历史，精准地将其分发给专门的子代理。
+
+# 路由与闲聊的本地 Prompt（PROMPT_HUB_ENABLED 时优先使用 Hub 上的同名版本）
+ROUTER_INSTRUCTIONS = """你是一个顶级智能客服调度中心。你的职责是根据用户的最新请求和完整的对话历史，精准地将其分发给专门的子代理。
                 - 如果请求与商品推荐、查询、对比相关，选择 'guide'。
                 - 如果请求与订单状态、创建、修改、取消相关，选择 'order'。
                 - 如果请求与支付、退款、付款状态相关，选择 'payment'。
                 - 如果用户只是打招呼、闲聊或意图不明确，选择 '__end__' 以直接回复。
-                当用户询问你的功能时，你应该对以上功能进行相应介绍。"""),
-                MessagesPlaceholder(variable_name="chat_history"),
-                ("user", "{input}"),
-            ]
-        )
-
-    llm = ChatOpenAI(
-        model=Config.LLM_MODEL_NAME,
-        temperature=0,
-        api_key=Config.SILICONFLOW_API_KEY,
-        base_url=Config.SILICONFLOW_API_BASE
-    )
-    structured_llm = llm.with_structured_output(Router)
-
-    try:
-        prompt_value = await prompt.ainvoke({"input": user_input, "chat_history": chat_history})
-        route_decision = await structured_llm.ainvoke(prompt_value)
-        logger.info(f"Supervisor 路由决策结果: {route_decision.next}")
-
-        updated_history = chat_history + [HumanMessage(content=user_input)]
-
-        if route_decision.next == "__end__":
-            try:
-                response_prompt = hub.pull("ecomm-supervisor-response")
-                logger.info("✅ 成功从 LangChain Hub 拉取响应 Prompt: ecomm-supervisor-response")
-            except Exception as e:
-                logger.warning(f"⚠️ 从 LangChain Hub 拉取响应 Prompt 失败: {e}。将使用本地备用响应 Prompt。")
-                # 如果拉取失败，则使用本地定义的响应 Prompt
-                response_prompt = ChatPromptTemplate.from_messages([
-                    ("system", "您当前是智能购物小助手【小购】，性格亲切活泼，用表情符号增加亲和力 🌸"),
-                    ("ai", """## 服务原则
+                当用户询问你的功能时，你应该对以上功能进行相应介绍。"""
+CHITCHAT_INSTRUCTIONS = "您当前是智能购物小助手【小购】，性格亲切活泼，用表情符号增加亲和力 🌸"
+CHITCHAT_GUIDELINES = """## 服务原则
 ✅ 我能做：
 - 温馨问候/告别 👋
 - 解答购物助手基础问题
@@ -192,12 +407,83 @@ async def supervisor_router(state: AgentState) -> Dict[str, Any]:
 
 ### 情形4：闲聊延续 → 购物场景化
 ("用户坚持闲聊")
-"聊购物小购超在行！最近很多人在买防晒新品 🌞 需要看看吗？"""),
-                    MessagesPlaceholder(variable_name="chat_history"),
-                    ("user", "{input}")
-                ])
-            response_chain = response_prompt | llm
-            response = await response_chain.ainvoke({"input": user_input, "chat_history": updated_history})
+"聊购物小购超在行！最近很多人在买防晒新品 🌞 需要看看吗？"""
+# Hub 拉取失败后改用本地 Prompt，间隔这么久再重试
+HUB_RETRY_SECONDS = 300
+
+_prompts: Dict[str, Any] = {}
+_hub_failed_at: Dict[str, float] = {}
+
+
+def _local_prompt(name: str):
+    # prompts 模块较重，延迟到首次路由时导入
+    from prompt_layout import layered_prompt
+
+    if name == "ecomm-supervisor-next":
+        return layered_prompt(ROUTER_INSTRUCTIONS)
+    return layered_prompt(CHITCHAT_INSTRUCTIONS, static=[("ai", CHITCHAT_GUIDELINES)])
+
+
+def get_prompt(name: str):
+    """
+    返回路由（ecomm-supervisor-next）或闲聊（ecomm-supervisor-response）Prompt，进程内只构建 / 拉取一次。
+    每轮重新拉取不仅多一次 Hub 往返，Hub 返回的内容一旦变化还会让服务商的前缀缓存整体失效。
+    Hub 拉取失败时使用本地版本，HUB_RETRY_SECONDS 后再尝试拉取。
+    """
+    prompt = _prompts.get(name)
+    if prompt is not None:
+        return prompt
+    if Config.PROMPT_HUB_ENABLED and time.monotonic() - _hub_failed_at.get(name, -HUB_RETRY_SECONDS) >= HUB_RETRY_SECONDS:
+        try:
+            from langchain import hub
+
+            with timed_stage("hub_pull"):
+                prompt = _prompts[name] = hub.pull(name)
+            logger.info(f"✅ 成功从 LangChain Hub 拉取 Prompt: {name}")
+            return prompt
+        except Exception as e:
+            _hub_failed_at[name] = time.monotonic()
+            logger.warning(f"⚠️ 从 LangChain Hub 拉取 Prompt {name} 失败: {e}。将使用本地备用 Prompt。")
+    local = _prompts.get(f"local:{name}")
+    if local is None:
+        local = _prompts[f"local:{name}"] = _local_prompt(name)
+    return local
+
+
+async def supervisor_router(state: AgentState) -> Dict[str, Any]:
+    """
+    这个函数是一个无状态的路由决策节点。
+    """
+    logger.info("---进入 Supervisor 路由决策---")
+    user_input = state["user_input"]
+    chat_history = state.get("chat_history", [])
+
+    prompt = get_prompt("ecomm-supervisor-next")
+    # 取一次当前生效的配置，模型与历史窗口保持一致（排队压力下可能为降级配置）
+    router_profile = active_profile("router")
+    structured_llm = llm_for(router_profile).with_structured_output(Router)
+
+    try:
+        prompt_value = await prompt.ainvoke({"input": user_input,
+                                             "chat_history": trim_history(router_profile, chat_history)})
+        with timed_stage("router"):
+            route_decision = await with_deadline(structured_llm.ainvoke(
+                prompt_value, config={"callbacks": [MetricsCallbackHandler(stage="router")]}
+            ), "router")
+        logger.info(f"Supervisor 路由决策结果: {route_decision.next}")
+
+        updated_history = chat_history + [HumanMessage(content=user_input)]
+
+        if route_decision.next == "__end__":
+            response_prompt = get_prompt("ecomm-supervisor-response")
+            chitchat_profile = active_profile("chitchat")
+            response_chain = response_prompt | llm_for(chitchat_profile)
+            with timed_stage("chitchat"):
+                # 本轮输入只由 Prompt 末尾的 {input} 给出，历史保持与上一轮一致的前缀
+                response = await with_deadline(response_chain.ainvoke(
+                    {"input": user_input, "chat_history": trim_history(chitchat_profile, chat_history)},
+                    config={"callbacks": [MetricsCallbackHandler(stage="chitchat")]}
+                ), "chitchat")
             response_content = response.content if hasattr(response,
                                                            'content') and response.content.strip() else "您好！很高兴为您服务。"
 
@@ -211,6 +497,8 @@ async def supervisor_router(state: AgentState) -> Dict[str, Any]:
                 "chat_history": updated_history,
                 "next_agent": route_decision.next
             }
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Supervisor 路由决策失败: {e}")
         return {"agent_response": f"抱歉，系统在分配任务时发生错误: {e}", "next_agent": "__end__"}
@@ -219,67 +507,130 @@ async def supervisor_router(state: AgentState) -> Dict[str, Any]:
 # --- LangGraph 工作流定义 ---
 class MultiAgentWorkflow:
     def __init__(self):
-        self.guide_agent: Optional[GuideAgent] = None
-        self.order_agent: Optional[OrderAgent] = None
-        self.payment_agent: Optional[PaymentAgent] = None
+        self.agents: Dict[str, Any] = {}
+        self._agent_locks: Dict[str, asyncio.Lock] = {name: asyncio.Lock() for name in AGENT_FACTORIES}
         self.checkpointer = RedisCheckpointer()
         self.is_initialized = False
 
+    async def get_agent(self, name: str):
+        """按需构建子代理。模块导入放到线程中执行，避免阻塞事件循环上的其他请求。"""
+        agent = self.agents.get(name)
+        if agent is not None:
+            return agent
+        async with self._agent_locks[name]:
+            if name not in self.agents:
+                module_name, factory_name = AGENT_FACTORIES[name]
+                with timed_stage(f"agent_init.{name}"):
+                    module = await asyncio.to_thread(importlib.import_module, module_name)
+                    self.agents[name] = await getattr(module, factory_name)()
+                logger.info(f"子代理 {name} 已加载。")
+        return self.agents[name]
+
     async def initialize(self):
-        """初始化所有 Agent 和工作流组件。"""
+        """初始化所有 Agent 和工作流组件（eager 模式）。"""
         if self.is_initialized:
             return
-        if not self.guide_agent: self.guide_agent = await get_guide_agent()
-        if not self.order_agent: self.order_agent = await get_order_agent()
-        if not self.payment_agent: self.payment_agent = await get_payment_agent()
+        for name in AGENT_FACTORIES:
+            await self.get_agent(name)
         logger.info("所有 Agent 初始化完成。")
         self.is_initialized = True
 
-    async def invoke_workflow(self, user_input: str, session_id: str, user_id: str) -> str:
-        """
-        重写整个调用流程，手动管理状态传递，不再使用 graph.ainvoke。
-        """
-        await self.initialize()
+    async def warm_up(self):
+        """后台预热：依次加载子代理与监管者 LLM，失败不影响服务，首次请求时会再次尝试。"""
+        try:
+            await self.initialize()
+            await asyncio.to_thread(get_supervisor_llm)
+            await asyncio.to_thread(get_llm, "chitchat")
+            logger.info("后台预热完成。")
+        except Exception as e:
+            logger.warning(f"后台预热失败: {e}")
 
-        thread_config = {"configurable": {"thread_id": session_id}}
+    def _prefetch_fetchers(self, user_id: str) -> Dict[str, Any]:
+        """预取使用子代理自身的服务客户端；子代理尚未加载时顺带触发加载。"""
 
-        # 1. 从 Redis 加载历史检查点
-        checkpoint_tuple = await self.checkpointer.aget_tuple(thread_config)
+        async def fetch_orders() -> Dict[str, Any]:
+            agent = await self.get_agent("order")
+            return await agent.order_api.get_orders_by_user(user_id)
 
-        # 2. 正确提取历史消息
-        chat_history = []
-        if checkpoint_tuple and checkpoint_tuple.checkpoint and "channel_values" in checkpoint_tuple.checkpoint and "chat_history" in \
-                checkpoint_tuple.checkpoint["channel_values"]:
-            chat_history = checkpoint_tuple.checkpoint["channel_values"]["chat_history"]
+        async def fetch_payments() -> Dict[str, Any]:
+            agent = await self.get_agent("payment")
+            return await agent.payment_api.get_payments_by_user(user_id)
 
-        # 3. 调用 supervisor 节点
-        supervisor_input_state = AgentState(user_input=user_input, session_id=session_id, user_id=user_id, chat_history=chat_history)
-        supervisor_output = await supervisor_router(supervisor_input_state)
+        return {"order": fetch_orders, "payment": fetch_payments}
 
-        next_agent_name = supervisor_output.get("next_agent")
-        updated_history = supervisor_output.get("chat_history", [])
-        final_response = ""
-        final_history_to_save = updated_history
+    async def invoke_workflow(self, user_input: str, session_id: str, user_id: str) -> str:
+        """
+        处理一轮对话，并统计本轮用量（见 accounting.py）：会话或用户的 token 预算已超限时，
+        本轮 BUDGET_DEGRADE_STAGES 中的阶段使用降级配置。
+        """
+        start = time.perf_counter()
+        with track_turn_usage() as usage:
+            try:
+                with force_degraded(await budget_degraded_stages(session_id, user_id)):
+                    return await self._invoke_workflow(user_input, session_id, user_id)
+            finally:
+                await record_turn(session_id, user_id, usage, time.perf_counter() - start)
 
-        # 4. 根据 supervisor 决策调用下一个节点
-        if next_agent_name == "__end__":
-            final_response = supervisor_output.get("agent_response", "系统未能生成回复。")
-            final_history_to_save = supervisor_output.get("chat_history", [])
+    async def _invoke_workflow(self, user_input: str, session_id: str, user_id: str) -> str:
+        """
+        重写整个调用流程，手动管理状态传递，不再使用 graph.ainvoke。
+        各阶段共享调用方设定的截止时间（见 deadline.py）；预算耗尽时放弃本轮处理，
+        不保存检查点（保留上一轮的会话状态，用户可直接重试），返回超时提示。
+        """
+        thread_config = {"configurable": {"thread_id": session_id}}
 
-        elif next_agent_name in ["guide", "order", "payment"]:
-            agent_map = {"guide": self.guide_agent, "order": self.order_agent, "payment": self.payment_agent}
-            target_agent = agent_map[next_agent_name]
+        # 0. 输入看起来与订单 / 支付相关时，在加载历史与路由期间投机预取用户数据
+        prefetch = start_prefetch(user_input, user_id, self._prefetch_fetchers(user_id))
+        prefetch_token = prefetch.activate() if prefetch is not None else None
 
-            agent_result = await target_agent.process_message(
-                user_input=user_input, session_id=session_id, user_id=user_id, chat_history=updated_history
-            )
+        try:
+            # 1. 从 Redis 加载历史检查点
+            checkpoint_tuple = await self.checkpointer.aget_tuple(thread_config)
+
+            # 2. 正确提取历史消息
+            chat_history = []
+            if checkpoint_tuple and checkpoint_tuple.checkpoint and "channel_values" in checkpoint_tuple.checkpoint and "chat_history" in \
+                    checkpoint_tuple.checkpoint["channel_values"]:
+                chat_history = checkpoint_tuple.checkpoint["channel_values"]["chat_history"]
+
+            # 3. 调用 supervisor 节点
+            supervisor_input_state = AgentState(user_input=user_input, session_id=session_id, user_id=user_id, chat_history=chat_history)
+            with timed_stage("supervisor"):
+                supervisor_output = await supervisor_router(supervisor_input_state)
+
+            next_agent_name = supervisor_output.get("next_agent")
+            if prefetch is not None:
+                # 路由已确定，取消与目标子代理无关的预取
+                prefetch.cancel_except(next_agent_name)
+            updated_history = supervisor_output.get("chat_history", [])
+            final_response = ""
+            final_history_to_save = updated_history
+
+            # 4. 根据 supervisor 决策调用下一个节点
+            if next_agent_name == "__end__":
+                final_response = supervisor_output.get("agent_response", "系统未能生成回复。")
+                final_history_to_save = supervisor_output.get("chat_history", [])
+
+            elif next_agent_name in ["guide", "order", "payment"]:
+                target_agent = await self.get_agent(next_agent_name)
+
+                agent_result = await target_agent.process_message(
+                    user_input=user_input, session_id=session_id, user_id=user_id, chat_history=updated_history
+                )
 
-            final_response = agent_result
-            final_history_to_save = updated_history + [AIMessage(content=agent_result)]
+                final_response = agent_result
+                final_history_to_save = updated_history + [AIMessage(content=agent_result)]
 
-        else:
-            final_response = "抱歉，系统路由出现未知错误。"
-            final_history_to_save = updated_history + [AIMessage(content=final_response)]
+            else:
+                final_response = "抱歉，系统路由出现未知错误。"
+                final_history_to_save = updated_history + [AIMessage(content=final_response)]
+        except DeadlineExceeded as e:
+            logger.warning("本轮请求超出时间预算，已放弃处理", extra={"session_id": session_id, "stage": e.stage})
+            return DEADLINE_EXCEEDED_RESPONSE
+        finally:
+            if prefetch is not None:
+                prefetch.cancel_except()
+                SpeculativePrefetch.deactivate(prefetch_token)
 
         # 5. 手动将最终的、完整的状态保存回 Redis
         final_checkpoint = Checkpoint(
@@ -291,10 +642,12 @@ class MultiAgentWorkflow:
             metadata={},
             parent_config=None
         )
-        await self.checkpointer.aput(thread_config, final_checkpoint)
+        await self.checkpointer.aput(thread_config, final_checkpoint, {"user_id": user_id})
 
-        logger.info(f"最终状态内容: {final_checkpoint['channel_values']}")
-        logger.info(f"从 {next_agent_name or 'supervisor'} 获取响应: {final_response}")
+        logger.info("会话状态已保存", extra={"session_id": session_id, "agent": next_agent_name or "supervisor",
+                                         "history_len": len(final_history_to_save)})
+        logger.info("从 %s 获取响应: %s", next_agent_name or "supervisor", final_response,
+                    extra={**SAMPLED, "session_id": session_id})
 
         return final_response
 
@@ -305,12 +658,13 @@ _workflow_lock = asyncio.Lock()
 
 
 async def get_multi_agent_workflow() -> MultiAgentWorkflow:
-    """获取并按需初始化全局工作流实例。"""
+    """获取全局工作流实例；eager 模式下同时初始化所有子代理，lazy 模式下子代理在首次使用时构建。"""
     global multi_agent_workflow_instance
     if multi_agent_workflow_instance is None:
         async with _workflow_lock:
             if multi_agent_workflow_instance is None:
                 multi_agent_workflow_instance = MultiAgentWorkflow()
 
-    await multi_agent_workflow_instance.initialize()
+    if Config.STARTUP_MODE == "eager":
+        await multi_agent_workflow_instance.initialize()
     return multi_agent_workflow_instance
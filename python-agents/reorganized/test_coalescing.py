@@ -0,0 +1,70 @@
+# test_coalescing.py
+"""
+请求合并与截止时间：共享的下游调用不继承发起方的截止时间，每个等待方只受自己的预算约束。
+
+用法:
+    python test_coalescing.py
+    python -m pytest test_coalescing.py
+"""
+import asyncio
+import os
+
+os.environ.setdefault("SILICONFLOW_API_KEY", "offline-test")
+
+from coalescing import BatchLoader, SingleFlight
+from config import Config
+from deadline import DeadlineExceeded, remaining, request_deadline
+
+DOWNSTREAM_SECONDS = 0.3
+
+
+async def _call_with_budget(budget: float, call):
+    with request_deadline(budget):
+        return await call()
+
+
+async def _two_callers(call):
+    """预算 0.1s 的调用方先发起，预算 10s 的调用方合并到同一次下游调用上。"""
+    short = asyncio.create_task(_call_with_budget(0.1, call))
+    await asyncio.sleep(0)
+    long = asyncio.create_task(_call_with_budget(10, call))
+    return await asyncio.gather(short, long, return_exceptions=True)
+
+
+def test_singleflight_waiters_keep_their_own_budget():
+    Config.COALESCE_ENABLED = True
+    flight = SingleFlight("t")
+    calls = []
+
+    async def fetch():
+        calls.append(remaining())
+        await asyncio.sleep(DOWNSTREAM_SECONDS)
+        return "ok"
+
+    short, long = asyncio.run(_two_callers(lambda: flight.do("key", fetch)))
+    assert isinstance(short, DeadlineExceeded), short
+    assert long == "ok", long
+    # 只发出一次下游调用，且该调用不带发起方的截止时间
+    assert calls == [None], calls
+
+
+def test_batchloader_waiters_keep_their_own_budget():
+    Config.COALESCE_ENABLED = True
+    batches = []
+
+    async def batch_fn(keys):
+        batches.append((list(keys), remaining()))
+        await asyncio.sleep(DOWNSTREAM_SECONDS)
+        return {key: f"value-{key}" for key in keys}
+
+    loader = BatchLoader("t", batch_fn, window=0.01)
+    short, long = asyncio.run(_two_callers(lambda: loader.load("a")))
+    assert isinstance(short, DeadlineExceeded), short
+    assert long == "value-a", long
+    assert batches == [(["a"], None)], batches
+
+
+if __name__ == "__main__":
+    test_singleflight_waiters_keep_their_own_budget()
+    test_batchloader_waiters_keep_their_own_budget()
+    print("✅ 合并调用的等待方各自按预算超时")
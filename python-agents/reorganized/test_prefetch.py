@@ -0,0 +1,70 @@
+# test_prefetch.py
+"""
+投机预取：等待预取结果的调用方被取消时，取消必须继续传播，不能回退到实时请求。
+
+用法:
+    python test_prefetch.py
+    python -m pytest test_prefetch.py
+"""
+import asyncio
+import os
+
+os.environ.setdefault("SILICONFLOW_API_KEY", "offline-test")
+
+from prefetch import SpeculativePrefetch
+
+
+async def _slow_fetch():
+    await asyncio.sleep(10)
+    return {"success": True, "data": []}
+
+
+async def _get_orders(prefetch: SpeculativePrefetch, events: list):
+    """模拟 OrderServiceAPI.get_orders_by_user：预取不可用时发送实时请求。"""
+    result = await prefetch.consume("order", "u1")
+    events.append("continued after consume")
+    if result is None:
+        events.append("live request")
+    return result
+
+
+def test_caller_cancelled_while_waiting_on_prefetch():
+    async def scenario():
+        prefetch = SpeculativePrefetch("u1")
+        prefetch.start("order", _slow_fetch)
+        events = []
+        caller = asyncio.create_task(_get_orders(prefetch, events))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        try:
+            await caller
+        except asyncio.CancelledError:
+            events.append("cancelled")
+        await asyncio.sleep(0)
+        return events, prefetch._tasks["order"]
+
+    events, task = asyncio.run(scenario())
+    assert events == ["cancelled"], events
+    assert task.cancelled()
+
+
+def test_prefetch_cancelled_falls_back_to_live_request():
+    async def scenario():
+        prefetch = SpeculativePrefetch("u1")
+        prefetch.start("order", _slow_fetch)
+        events = []
+        caller = asyncio.create_task(_get_orders(prefetch, events))
+        await asyncio.sleep(0.01)
+        prefetch._tasks["order"].cancel()
+        result = await caller
+        return events, result
+
+    events, result = asyncio.run(scenario())
+    assert result is None
+    assert events == ["continued after consume", "live request"], events
+
+
+if __name__ == "__main__":
+    test_caller_cancelled_while_waiting_on_prefetch()
+    test_prefetch_cancelled_falls_back_to_live_request()
+    print("✅ 调用方取消会继续传播，预取取消时回退到实时请求")
@@ -1,5 +1,6 @@
 # tools.py
 import json
+import logging
 from typing import List, Optional, Dict, Any
 
 from langchain_core.tools import tool
@@ -7,6 +8,9 @@ from langchain_core.tools import tool
 from config import Config
 from models import FinalResponse, Recommendation
 from data.product_db import get_products_from_db
+from deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
 
 if Config.USE_EXTERNAL_PRODUCT_API:
     from services.product_api_client import get_product_api_client
@@ -41,8 +45,7 @@ async def search_products(input_str: str) -> str:
     available_only = params.get("available_only", False)
     query = params.get("query")
 
-    print(
-        f"--- 调用工具: search_products(name={name}, category={category}, brand={brand}, min_price={min_price}, max_price={max_price}, tag={tag}, available_only={available_only}, query={query}) ---")
+    logger.info("调用工具: search_products", extra={"params": params})
 
     products = []
     try:
@@ -69,7 +72,7 @@ async def search_products(input_str: str) -> str:
             product_dicts = [p.dict() for p in products[:3]]
 
         else:
-            print("--- 使用硬编码商品数据库进行查询 ---")
+            logger.debug("使用硬编码商品数据库进行查询")
             if name:
                 products = get_products_from_db(name=name)
             elif category:
@@ -91,18 +94,39 @@ async def search_products(input_str: str) -> str:
 
         return json.dumps(product_dicts, ensure_ascii=False)
 
+    except DeadlineExceeded:
+        raise
     except ValueError as e:
         return json.dumps({"error": str(e)})
     except Exception as e:
         return json.dumps({"error": f"工具内部未知错误: {e}"})
 
 
-@tool(args_schema=FinalResponse)
+# 终结工具：return_direct=True 使 AgentExecutor 在该工具返回后立即结束，
+# 不再把 FinalResponse 回传给 LLM 做一次额外的复述调用，由 render_final_response 在本地渲染。
+@tool(args_schema=FinalResponse, return_direct=True)
 def format_final_response(demand_analysis: str, search_keyword: str,
                           recommendations: List[Recommendation]) -> FinalResponse:
-    print("--- 调用工具: format_final_response ---")
+    logger.info("调用工具: format_final_response")
     return FinalResponse(
         demand_analysis=demand_analysis,
         search_keyword=search_keyword,
         recommendations=recommendations
-    )
\ No newline at end of file
+    )
+
+
+def render_final_response(response: FinalResponse) -> str:
+    """将结构化推荐结果渲染为面向用户的回复文本。"""
+    if not response.recommendations:
+        return f"{response.demand_analysis}\n\n抱歉，没有找到相关商品。"
+
+    lines = [f"需求分析：{response.demand_analysis}", "", "为您推荐："]
+    for index, item in enumerate(response.recommendations, start=1):
+        title = f"{index}. {item.product_name}"
+        if item.product_id:
+            title += f"（product_id: {item.product_id}）"
+        if item.price is not None:
+            title += f" - ¥{item.price:.2f}"
+        lines.append(title)
+        lines.extend(f"   • {reason}" for reason in item.reasons)
+    return "\n".join(lines)
\ No newline at end of file